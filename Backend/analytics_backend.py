@@ -0,0 +1,447 @@
+"""
+10Q Notes AI - Analytics Backend
+HackRU 2025 Project by azrabano
+
+SQL engines behind SnowflakeService:
+- SQLiteBackend: embedded local engine using the same schema, translated from Snowflake DDL
+- SnowflakeBackend: real Snowflake warehouse when credentials and the connector are available
+- Parameterized queries (pyformat %(name)s) that run unchanged on either engine
+- Atomic bulk writes: executemany upserts on SQLite, staged COPY + MERGE on Snowflake
+- Bounded connection pool with health checks on reuse
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import snowflake.connector
+    from snowflake.connector.pandas_tools import write_pandas
+except ImportError:
+    snowflake = None
+    write_pandas = None
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+_PYFORMAT_PARAM = re.compile(r'%\((\w+)\)s')
+
+# Stay under SQLite's bound-parameter limit in DELETE ... IN (...)
+SQLITE_MAX_PARAMS = 900
+
+# Snowflake DDL -> SQLite DDL
+_DDL_TRANSLATIONS = [
+    (re.compile(r'CURRENT_TIMESTAMP\(\)', re.IGNORECASE), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bSTRING\b', re.IGNORECASE), 'TEXT'),
+    (re.compile(r'\bFLOAT\b', re.IGNORECASE), 'REAL'),
+]
+
+# Secondary indexes for the lookups SnowflakeService runs (Snowflake itself has no CREATE INDEX)
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_companies_ticker ON companies (ticker_symbol)",
+    "CREATE INDEX IF NOT EXISTS idx_companies_industry ON companies (industry)",
+    "CREATE INDEX IF NOT EXISTS idx_filings_company_period ON filings (company_id, year, quarter)",
+    "CREATE INDEX IF NOT EXISTS idx_filings_period ON filings (year, quarter)",
+    "CREATE INDEX IF NOT EXISTS idx_financial_metrics_filing ON financial_metrics (filing_id)",
+    "CREATE INDEX IF NOT EXISTS idx_smap_notes_filing ON smap_notes (filing_id)",
+    "CREATE INDEX IF NOT EXISTS idx_risk_factors_filing ON risk_factors (filing_id)",
+    "CREATE INDEX IF NOT EXISTS idx_business_segments_filing ON business_segments (filing_id)",
+    "CREATE INDEX IF NOT EXISTS idx_industry_benchmarks_lookup ON industry_benchmarks (industry, metric_name, period)"
+]
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections, health-checked when reused after sitting idle"""
+
+    def __init__(self, connect: Callable[[], Any], max_size: int, timeout: float = None,
+                 health_check: Optional[Callable[[Any], Any]] = None, validate_after: float = 30.0):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.timeout = timeout if timeout is not None else float(os.getenv('ANALYTICS_POOL_TIMEOUT_SECONDS', 30))
+        self.health_check = health_check
+        self.validate_after = validate_after
+
+        self._idle: List[Tuple[Any, float]] = []  # (connection, last used), most recent last
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0, 'timeouts': 0}
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; nested checkouts on the same thread share it"""
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            yield held
+            return
+
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats['timeouts'] += 1
+            raise TimeoutError(f"No analytics connection free within {self.timeout:.0f}s")
+
+        connection, healthy = None, True
+        try:
+            connection = self._checkout()
+            self._local.connection = connection
+            yield connection
+        except Exception:
+            healthy = connection is not None and self._healthy(connection)
+            raise
+        finally:
+            self._local.connection = None
+            if connection is not None:
+                if healthy:
+                    with self._lock:
+                        self._idle.append((connection, time.monotonic()))
+                else:
+                    self._discard(connection)
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.validate_after or self._healthy(connection):
+                self.stats['reused'] += 1
+                return connection
+            self._discard(connection)
+
+        self.stats['created'] += 1
+        return self._connect()
+
+    def _healthy(self, connection) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            self.health_check(connection)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        self.stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+@dataclass
+class WriteStep:
+    """One statement of an atomic bulk write"""
+    op: str  # 'upsert' rows keyed on key, or 'delete' rows whose key is in values
+    table: str
+    key: str
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    values: List[Any] = field(default_factory=list)
+
+
+class AnalyticsBackend:
+    """Interface shared by the embedded and Snowflake engines"""
+
+    name = "base"
+
+    def write_batch(self, steps: List[WriteStep]):
+        """Apply upserts and deletes in order as one transaction"""
+        raise NotImplementedError
+
+    def create_schema(self, schema_sql: Dict[str, str]):
+        raise NotImplementedError
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    def executemany(self, sql: str, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend(AnalyticsBackend):
+    """Embedded SQLite engine with the Snowflake schema"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = None, pool_size: int = None):
+        self.path = path or os.getenv('ANALYTICS_DB_PATH', ':memory:')
+        in_memory = self.path == ':memory:'
+        if in_memory and int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+            # Each worker would ingest into, and query, its own private database
+            raise RuntimeError("ANALYTICS_DB_PATH must be a file path when running more than one worker")
+        # Every connection to :memory: is a separate database, so it gets exactly one
+        self.pool = ConnectionPool(
+            self._connect,
+            1 if in_memory else pool_size or int(os.getenv('ANALYTICS_POOL_SIZE', 4)),
+            health_check=None if in_memory else (lambda connection: connection.execute("SELECT 1"))
+        )
+        # SQLite allows one writer at a time; WAL lets pooled readers run alongside it
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        connection.execute("PRAGMA foreign_keys = ON")
+        if self.path != ':memory:':
+            connection.execute("PRAGMA journal_mode = WAL")
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Reentrant write transaction; only the outermost block commits or rolls back"""
+        with self._write_lock, self.pool.connection() as connection:
+            depth = getattr(self._local, 'depth', 0)
+            self._local.depth = depth + 1
+            try:
+                yield connection
+                if depth == 0:
+                    connection.commit()
+            except Exception:
+                if depth == 0:
+                    connection.rollback()
+                raise
+            finally:
+                self._local.depth = depth
+
+    @staticmethod
+    def translate_ddl(sql: str) -> str:
+        for pattern, replacement in _DDL_TRANSLATIONS:
+            sql = pattern.sub(replacement, sql)
+        return sql
+
+    @staticmethod
+    def translate_params(sql: str) -> str:
+        """pyformat %(name)s placeholders -> SQLite :name placeholders"""
+        return _PYFORMAT_PARAM.sub(r':\1', sql)
+
+    def create_schema(self, schema_sql: Dict[str, str]):
+        with self.transaction() as connection:
+            for ddl in schema_sql.values():
+                connection.execute(self.translate_ddl(ddl))
+            for ddl in INDEX_SQL:
+                connection.execute(ddl)
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None):
+        with self.transaction() as connection:
+            connection.execute(self.translate_params(sql), params or {})
+
+    def executemany(self, sql: str, rows: List[Dict[str, Any]]):
+        with self.transaction() as connection:
+            connection.executemany(self.translate_params(sql), rows)
+
+    def write_batch(self, steps: List[WriteStep]):
+        with self.transaction() as connection:
+            for step in steps:
+                if step.op == 'delete':
+                    for start in range(0, len(step.values), SQLITE_MAX_PARAMS):
+                        chunk = step.values[start:start + SQLITE_MAX_PARAMS]
+                        connection.execute(
+                            f"DELETE FROM {step.table} WHERE {step.key} IN ({', '.join('?' * len(chunk))})", chunk)
+                elif step.rows:
+                    columns = list(step.rows[0])
+                    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != step.key)
+                    connection.executemany(
+                        f"INSERT INTO {step.table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join(':' + column for column in columns)}) "
+                        f"ON CONFLICT ({step.key}) DO UPDATE SET {updates}",
+                        step.rows
+                    )
+
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        with self.pool.connection() as connection:
+            cursor = connection.execute(self.translate_params(sql), params or {})
+            columns = [description[0] for description in cursor.description or []]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def close(self):
+        self.pool.close()
+
+
+class SnowflakeBackend(AnalyticsBackend):
+    """Snowflake warehouse via snowflake-connector-python"""
+
+    name = "snowflake"
+
+    def __init__(self, connection_config: Dict[str, str], pool_size: int = None):
+        if snowflake is None:
+            raise ImportError("snowflake-connector-python is not installed")
+        self.pool = ConnectionPool(
+            lambda: snowflake.connector.connect(**connection_config),
+            pool_size or int(os.getenv('ANALYTICS_POOL_SIZE', 4)),
+            health_check=self._ping
+        )
+        # Connect eagerly so bad credentials surface at startup
+        with self.pool.connection():
+            pass
+
+    @staticmethod
+    def _ping(connection):
+        if connection.is_closed():
+            raise ConnectionError("Snowflake connection closed")
+        connection.cursor().execute("SELECT 1").close()
+
+    def create_schema(self, schema_sql: Dict[str, str]):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for ddl in schema_sql.values():
+                    cursor.execute(ddl)
+            finally:
+                cursor.close()
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, params or {})
+            finally:
+                cursor.close()
+
+    def executemany(self, sql: str, rows: List[Dict[str, Any]]):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(sql, rows)
+            finally:
+                cursor.close()
+
+    def query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, params or {})
+                columns = [description[0].lower() for description in cursor.description or []]
+                return pd.DataFrame(cursor.fetchall(), columns=columns)
+            finally:
+                cursor.close()
+
+    def write_batch(self, steps: List[WriteStep]):
+        """
+        Load upsert rows into temporary tables through a staged file COPY
+        (write_pandas), then DELETE/MERGE into the targets in one transaction.
+        Staging happens first because Snowflake DDL commits implicitly.
+        """
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            staged = {}
+            try:
+                for index, step in enumerate(steps):
+                    if step.op != 'upsert' or not step.rows:
+                        continue
+                    stage_table = f"{step.table}_stage_{uuid.uuid4().hex[:8]}".upper()
+                    cursor.execute(f"CREATE TEMPORARY TABLE {stage_table} LIKE {step.table}")
+                    write_pandas(connection, pd.DataFrame(step.rows), stage_table, quote_identifiers=False)
+                    staged[index] = stage_table
+
+                cursor.execute("BEGIN")
+                try:
+                    for index, step in enumerate(steps):
+                        if step.op == 'delete' and step.values:
+                            cursor.execute(f"DELETE FROM {step.table} WHERE {step.key} IN "
+                                           f"({', '.join(['%s'] * len(step.values))})", step.values)
+                        elif index in staged:
+                            columns = list(step.rows[0])
+                            cursor.execute(
+                                f"MERGE INTO {step.table} t USING {staged[index]} s ON t.{step.key} = s.{step.key} "
+                                f"WHEN MATCHED THEN UPDATE SET "
+                                f"{', '.join(f't.{column} = s.{column}' for column in columns if column != step.key)} "
+                                f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+                                f"VALUES ({', '.join(f's.{column}' for column in columns)})"
+                            )
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            finally:
+                for stage_table in staged.values():
+                    cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+                cursor.close()
+
+    def close(self):
+        self.pool.close()
+
+
+def snowflake_configured() -> bool:
+    """True when real Snowflake credentials are present in the environment"""
+    return all(os.getenv(name) for name in ('SNOWFLAKE_ACCOUNT', 'SNOWFLAKE_USER', 'SNOWFLAKE_PASSWORD'))
+
+
+def create_analytics_backend(connection_config: Dict[str, str]) -> AnalyticsBackend:
+    """
+    Pick the analytics engine.
+
+    ANALYTICS_BACKEND=snowflake|sqlite forces one; the default (auto) uses
+    Snowflake when credentials and the connector are available and falls back
+    to the embedded SQLite engine otherwise.
+    """
+    choice = os.getenv('ANALYTICS_BACKEND', 'auto').lower()
+
+    if choice == 'snowflake' or (choice == 'auto' and snowflake is not None and snowflake_configured()):
+        try:
+            return SnowflakeBackend(connection_config)
+        except Exception as e:
+            if choice == 'snowflake':
+                raise
+            log.warning("snowflake_unavailable", fallback='sqlite', error=str(e))
+
+    return SQLiteBackend()
+
+
+def test_analytics_backend():
+    """Snowflake DDL and pyformat queries on the embedded engine; atomic bulk writes"""
+    print("🧪 Testing Analytics Backend")
+
+    backend = SQLiteBackend(':memory:')
+    backend.execute(SQLiteBackend.translate_ddl(
+        "CREATE TABLE companies (company_id STRING PRIMARY KEY, ticker_symbol STRING, revenue FLOAT, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP())"))
+
+    backend.write_batch([WriteStep('upsert', 'companies', 'company_id', rows=[
+        {'company_id': 'JPM', 'ticker_symbol': 'JPM', 'revenue': 42.5},
+        {'company_id': 'BAC', 'ticker_symbol': 'BAC', 'revenue': 25.3}])])
+    backend.write_batch([WriteStep('upsert', 'companies', 'company_id', rows=[
+        {'company_id': 'JPM', 'ticker_symbol': 'JPM', 'revenue': 43.1}])])
+    frame = backend.query("SELECT revenue FROM companies WHERE ticker_symbol = %(ticker)s", {'ticker': 'JPM'})
+    assert frame['revenue'].tolist() == [43.1]
+
+    # A failing step rolls back the steps before it
+    try:
+        backend.write_batch([WriteStep('delete', 'companies', 'company_id', values=['BAC']),
+                             WriteStep('upsert', 'no_such_table', 'id', rows=[{'id': 1}])])
+        raise AssertionError("write to a missing table succeeded")
+    except sqlite3.OperationalError:
+        pass
+    assert backend.query("SELECT COUNT(*) AS n FROM companies")['n'][0] == 2
+
+    with backend.pool.connection() as outer, backend.pool.connection() as inner:
+        assert outer is inner  # nested checkouts on one thread share the connection
+    backend.close()
+    print(f"   🔌 Pool: {backend.pool.stats}")
+    print("✅ Upserts, rollback and parameter translation work")
+
+
+if __name__ == "__main__":
+    test_analytics_backend()
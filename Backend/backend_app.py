@@ -10,22 +10,38 @@ Complete backend implementation with three main learning features:
 Integrates all existing services: EducationService, VoiceAgentService, GeminiService
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
+import os
+import hmac
 import uuid
 import io
 import json
+import time
 from datetime import datetime
 
 # Import our existing services
-from education_service import EducationService, StudentProfile, LearningSession
+from education_service import EducationService
 from voice_agent_service import VoiceAgentService
 from document_processor import DocumentProcessor
 from enhanced_gemini_service import EnhancedGeminiService
 from gemini_service import GeminiService
+from batch_grading import BatchGradingEngine, BatchSubmission
+from grading_service import GradingUnavailable
+import instrumentation
+import tracing
+import profiler
+from structured_logging import get_logger
+from usage_accounting import ledger as usage_ledger, usage_scope, DIMENSIONS
+from shared_state import SharedMapping, state_store
+from shm_cache import get_shm_cache, close_shm_cache
+
+log = get_logger(__name__)
 
 # Pydantic models for API requests/responses
 class StudentAuth(BaseModel):
@@ -46,6 +62,20 @@ class StudentSMAPSubmission(BaseModel):
     assessment: str = Field(..., description="Student's assessment")
     plan: str = Field(..., description="Student's plan/recommendations")
 
+class MetricsCheckRequest(BaseModel):
+    metrics: str = Field(..., description="Student's metrics text to verify")
+
+class BatchGradeSubmission(BaseModel):
+    session_id: str
+    submission_id: Optional[str] = None
+    subjective: Optional[str] = Field(None, description="Omit all four sections to grade the saved draft")
+    metrics: Optional[str] = None
+    assessment: Optional[str] = None
+    plan: Optional[str] = None
+
+class BatchGradeRequest(BaseModel):
+    submissions: List[BatchGradeSubmission]
+
 class VoiceGenerationRequest(BaseModel):
     session_id: str
     text: Optional[str] = None
@@ -67,23 +97,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin and instructor endpoints (profiling, batch grading, leaderboards, usage) are disabled unless a token is configured
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+def _is_admin(request: Request) -> bool:
+    token = request.headers.get("x-admin-token", "")
+    return bool(ADMIN_API_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode())
+
+def require_admin(request: Request):
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_TOKEN not set)")
+    if not _is_admin(request):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Sample stacks for the duration of a request sent with X-Profile: 1 and an admin token
+    
+    The profile id comes back in X-Profile-Id; download it from /api/admin/profiles/{profile_id}.
+    Streamed response bodies are produced after this returns and are not covered.
+    """
+    if request.headers.get("x-profile", "") not in ("1", "true") or not _is_admin(request):
+        return await call_next(request)
+    
+    sampler = profiler.SamplingProfiler().start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+    response.headers["X-Profile-Id"] = profiler.profiles.add(sampler)
+    return response
+
+def _match_route(request: Request):
+    """Route template and path parameters for a request, before routing has run"""
+    for route in app.router.routes:
+        match, child_scope = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path, child_scope.get("path_params", {})
+    return "unmatched", {}
+
+def _usage_attribution(route: str, path_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Session, student and filing a request's AI usage is charged to"""
+    attribution = {'endpoint': route, 'student_id': path_params.get("student_id")}
+    session = education_service.sessions.get(path_params.get("session_id", ""))
+    if session is not None:
+        attribution.update(session_id=session.session_id, student_id=session.student_id,
+                           filing=education_service.leaderboards.filing_key(session.ticker, session.filing_period))
+    return attribution
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Server span, usage scope, plus latency, status and in-flight count per route template"""
+    instrumentation.HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    route = "unmatched"
+    try:
+        # Label by route template, not raw path, so session ids do not explode the label set
+        route, path_params = _match_route(request)
+        # The session lookup reads the state store (SQLite or Redis); keep it off the event loop
+        if "session_id" in path_params:
+            attribution = await run_in_threadpool(_usage_attribution, route, path_params)
+        else:
+            attribution = _usage_attribution(route, path_params)
+        parent = tracing.parse_traceparent(request.headers.get("traceparent"))
+        with tracing.span(f"{request.method} {route}", kind='server', parent=parent, **{
+                'http.request.method': request.method, 'http.route': route, 'url.path': request.url.path}) as span, \
+                usage_scope(**attribution):
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                response.headers["traceparent"] = span.traceparent
+                return response
+            finally:
+                span.set_attribute('http.response.status_code', status)
+    finally:
+        instrumentation.HTTP_DURATION.observe(time.perf_counter() - started, method=request.method, route=route)
+        instrumentation.HTTP_TOTAL.inc(method=request.method, route=route, status=str(status))
+        instrumentation.HTTP_IN_FLIGHT.dec()
+
 # Initialize services
 education_service = EducationService()
 voice_agent = VoiceAgentService()
 document_processor = DocumentProcessor()
+batch_grader = BatchGradingEngine(education_service)
 
-# In-memory storage for demo (production would use database)
-active_sessions: Dict[str, LearningSession] = {}
-student_data: Dict[str, StudentProfile] = {}
+# Sessions not yet ended (session_id -> started_at) and students logged in through the API
+# (student_id -> last login); the records themselves live in education_service, shared by all workers
+active_sessions: Dict[str, str] = SharedMapping(state_store, 'active_sessions')
+student_data: Dict[str, str] = SharedMapping(state_store, 'authenticated_students')
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize backend services on startup"""
-    print("🚀 10Q Notes AI Backend Starting Up")
-    print("📚 Three Learning Modes: Learn, Practice, Feedback")
-    print("🎤 ElevenLabs Voice Integration Ready")
-    print("🤖 Gemini AI Analysis Engine Active")
-    print("=" * 60)
+    log.info("backend_started", modes=["learn", "practice", "feedback"],
+             voice="simulation" if voice_agent.simulation_mode else "elevenlabs")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detach from the host shared-memory cache; the last worker out removes its file"""
+    close_shm_cache()
 
 # =============================================================================
 # AUTHENTICATION & SESSION MANAGEMENT
@@ -94,7 +207,7 @@ async def authenticate_student(auth_data: StudentAuth):
     """Authenticate student with .edu email"""
     try:
         student = education_service.authenticate_student(auth_data.email, auth_data.name)
-        student_data[student.student_id] = student
+        student_data[student.student_id] = datetime.now().isoformat()
         
         return {
             "success": True,
@@ -155,7 +268,7 @@ async def upload_sec_filing(
                 tmp_file.flush()
                 
                 # Extract text from PDF
-                filing_text = document_processor.extract_text_from_pdf(tmp_file.name)
+                filing_text = await run_in_threadpool(document_processor.extract_text_from_pdf, tmp_file.name)
         else:
             # Assume text file
             filing_text = content.decode('utf-8')
@@ -180,8 +293,9 @@ async def upload_sec_filing(
                 ticker = "UNK"
         
         # Start learning session
-        student = student_data[student_id]
-        session = education_service.start_learning_session(
+        student = education_service.students[student_id]
+        session = await run_in_threadpool(
+            education_service.start_learning_session,
             student=student,
             company_name=company_name,
             ticker=ticker,
@@ -191,7 +305,7 @@ async def upload_sec_filing(
         )
         
         # Store session
-        active_sessions[session.session_id] = session
+        active_sessions[session.session_id] = session.started_at
         
         return {
             "success": True,
@@ -216,13 +330,14 @@ async def upload_text_filing(request: StartSessionRequest, filing_text: str = Fo
         if request.student_id not in student_data:
             raise HTTPException(status_code=404, detail="Student not authenticated")
         
-        student = student_data[request.student_id]
+        student = education_service.students[request.student_id]
         
         # Auto-detect company info if not provided
         company_name = request.company_name or "Unknown Company"
         ticker = request.ticker or "UNK"
         
-        session = education_service.start_learning_session(
+        session = await run_in_threadpool(
+            education_service.start_learning_session,
             student=student,
             company_name=company_name,
             ticker=ticker,
@@ -231,7 +346,7 @@ async def upload_text_filing(request: StartSessionRequest, filing_text: str = Fo
             filing_period=request.filing_period or "Recent Period"
         )
         
-        active_sessions[session.session_id] = session
+        active_sessions[session.session_id] = session.started_at
         
         return {
             "success": True,
@@ -247,6 +362,46 @@ async def upload_text_filing(request: StartSessionRequest, filing_text: str = Fo
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Text processing error: {str(e)}")
 
+@app.post("/api/upload/stream")
+async def upload_filing_stream(
+    student_id: str = Form(...),
+    filing_text: str = Form(...),
+    company_name: Optional[str] = Form(None),
+    ticker: Optional[str] = Form(None),
+    filing_type: str = Form("10-Q"),
+    filing_period: Optional[str] = Form(None)
+):
+    """Upload SEC filing text and stream Learn Mode sections (SSE) as Gemini writes them"""
+    if student_id not in student_data:
+        raise HTTPException(status_code=404, detail="Student not authenticated")
+    
+    student = education_service.students[student_id]
+    
+    def event_stream():
+        session_id = None
+        try:
+            for event in education_service.start_learning_session_stream(
+                student=student,
+                company_name=company_name or "Unknown Company",
+                ticker=ticker or "UNK",
+                filing_text=filing_text,
+                filing_type=filing_type,
+                filing_period=filing_period or "Recent Period"
+            ):
+                if event['event'] == 'session':
+                    session_id = event['data']['session_id']
+                elif event['event'] == 'complete':
+                    active_sessions[session_id] = education_service.sessions[session_id].started_at
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'session_id': session_id, 'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # =============================================================================
 # LEARN MODE (Read & Hover) - Feature #1
 # =============================================================================
@@ -319,7 +474,7 @@ async def synthesize_section_voice(session_id: str, request: VoiceGenerationRequ
             text = f"Here's the subjective analysis: {section_content}"
         
         # Generate voice using ElevenLabs
-        audio_data = voice_agent.synthesize_voice(text, request.voice_type)
+        audio_data = await run_in_threadpool(voice_agent.synthesize_voice, text, request.voice_type)
         
         if not audio_data or audio_data == b"SIMULATED_AUDIO_DATA":
             return {
@@ -375,7 +530,7 @@ async def save_practice_draft(session_id: str, draft: StudentSMAPSubmission):
         if session_id not in active_sessions:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = active_sessions[session_id]
+        session = education_service.sessions[session_id]
         
         # Update session with draft
         session.student_smap = {
@@ -385,6 +540,8 @@ async def save_practice_draft(session_id: str, draft: StudentSMAPSubmission):
             "plan": draft.plan
         }
         
+        education_service.save_session(session)
+        
         # Calculate completion percentage
         sections_completed = sum(1 for text in session.student_smap.values() if text.strip())
         completion_percentage = (sections_completed / 4) * 100
@@ -400,6 +557,18 @@ async def save_practice_draft(session_id: str, draft: StudentSMAPSubmission):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Draft save error: {str(e)}")
 
+@app.post("/api/session/{session_id}/practice/check-metrics")
+async def check_practice_metrics(session_id: str, request: MetricsCheckRequest):
+    """Instantly verify numbers quoted in the Metrics box against the filing"""
+    if session_id not in active_sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {
+        "success": True,
+        "session_id": session_id,
+        **education_service.check_metrics(session_id, request.metrics)
+    }
+
 @app.post("/api/session/{session_id}/practice/submit")
 async def submit_student_smap(session_id: str, submission: StudentSMAPSubmission):
     """Submit student's completed SMAP notes for AI feedback"""
@@ -425,8 +594,8 @@ async def submit_student_smap(session_id: str, submission: StudentSMAPSubmission
                 "message": f"Please complete the following sections: {', '.join(empty_sections)}"
             }
         
-        # Submit for feedback
-        feedback_results = education_service.submit_student_work(session_id, student_smap)
+        # Submit for feedback (a blocking Gemini round-trip, so off the event loop)
+        feedback_results = await run_in_threadpool(education_service.submit_student_work, session_id, student_smap)
         
         return {
             "success": True,
@@ -434,9 +603,14 @@ async def submit_student_smap(session_id: str, submission: StudentSMAPSubmission
             "session_id": session_id,
             "feedback_available": True,
             "overall_score": feedback_results["overall_score"],
-            "message": "SMAP notes submitted successfully! AI feedback is ready.",
+            "provisional": feedback_results["provisional"],
+            "message": feedback_results["feedback"]["notice"] or "SMAP notes submitted successfully! AI feedback is ready.",
             "next_step": "view_feedback"
         }
+    except GradingUnavailable as e:
+        # Nothing was recorded; the draft is saved and the student can resubmit
+        raise HTTPException(status_code=503, detail=f"Grading unavailable, please resubmit shortly: {e}",
+                            headers={"Retry-After": "30"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Submission error: {str(e)}")
 
@@ -451,21 +625,24 @@ async def get_ai_feedback(session_id: str):
         if session_id not in active_sessions:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = active_sessions[session_id]
+        session = education_service.sessions[session_id]
         
-        if session.status != "completed":
+        if session.status not in ("completed", "provisional"):
             raise HTTPException(status_code=400, detail="Session not completed yet")
         
         # Return comprehensive feedback
         feedback_response = {
             "success": True,
             "session_id": session_id,
+            "provisional": session.status == "provisional",
+            "notice": session.feedback.get("notice"),
             "overall_score": session.overall_score,
             "section_scores": session.scores,
             "feedback": {
                 "strengths": session.feedback.get("strengths", []),
                 "improvements": session.feedback.get("improvements", []),
-                "suggestions": session.feedback.get("next_steps", [])
+                "suggestions": session.feedback.get("next_steps", []),
+                "metric_checks": session.feedback.get("metric_checks", [])
             },
             "detailed_analysis": {
                 "completeness": "✅ Good coverage of key areas",
@@ -504,7 +681,7 @@ async def get_gold_standard_comparison(session_id: str):
             raise HTTPException(status_code=404, detail="Gold standard not available")
         
         gold_standard = education_service.gold_standard_smap[session_id]
-        session = active_sessions[session_id]
+        session = education_service.sessions[session_id]
         
         return {
             "success": True,
@@ -550,7 +727,7 @@ async def generate_earnings_call_experience(session_id: str):
         if session_id not in active_sessions:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        earnings_call = education_service.generate_earnings_call_experience(session_id)
+        earnings_call = await run_in_threadpool(education_service.generate_earnings_call_experience, session_id)
         
         # Convert audio bytes to base64 for JSON response (if real audio)
         if earnings_call['audio']['management'] != b"SIMULATED_AUDIO_DATA":
@@ -586,7 +763,7 @@ async def generate_smap_audio_briefing(session_id: str):
             raise HTTPException(status_code=404, detail="SMAP analysis not available")
         
         enhanced_smap = education_service.gold_standard_smap[session_id]
-        briefing = voice_agent.generate_smap_audio_briefing(enhanced_smap)
+        briefing = await run_in_threadpool(voice_agent.generate_smap_audio_briefing, enhanced_smap)
         
         return {
             "success": True,
@@ -612,7 +789,7 @@ async def get_session_status(session_id: str):
         if session_id not in active_sessions:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = active_sessions[session_id]
+        session = education_service.sessions[session_id]
         
         return {
             "success": True,
@@ -642,7 +819,7 @@ async def end_session(session_id: str):
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Archive session data (in production, save to database)
-        session = active_sessions[session_id]
+        session = education_service.sessions[session_id]
         
         # Remove from active sessions
         del active_sessions[session_id]
@@ -662,6 +839,164 @@ async def end_session(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Session end error: {str(e)}")
 
+# =============================================================================
+# INSTRUCTOR BATCH GRADING
+# =============================================================================
+
+@app.post("/api/instructor/batch-grade", dependencies=[Depends(require_admin)])
+async def batch_grade_submissions(request: BatchGradeRequest):
+    """Grade a class's SMAP submissions together, streaming results (SSE) as they finish"""
+    if not request.submissions:
+        raise HTTPException(status_code=400, detail="No submissions provided")
+    
+    submissions = []
+    for index, item in enumerate(request.submissions):
+        student_smap = {
+            "subjective": (item.subjective or "").strip(),
+            "metrics": (item.metrics or "").strip(),
+            "assessment": (item.assessment or "").strip(),
+            "plan": (item.plan or "").strip()
+        }
+        # No text in the request: grade the student's saved draft
+        session = education_service.sessions.get(item.session_id)
+        if not any(student_smap.values()) and session is not None and session.student_smap:
+            student_smap = dict(session.student_smap)
+        
+        submissions.append(BatchSubmission(
+            submission_id=item.submission_id or f"{item.session_id}:{index}",
+            session_id=item.session_id,
+            student_smap=student_smap
+        ))
+    
+    job = batch_grader.start(submissions)
+    
+    def event_stream():
+        for event in batch_grader.stream(job):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Batch-Job-Id": job.job_id}
+    )
+
+@app.get("/api/instructor/batch-grade/{job_id}", dependencies=[Depends(require_admin)])
+async def get_batch_grade_job(job_id: str):
+    """Progress and results of a batch grading job"""
+    job = batch_grader.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    return {
+        "success": True,
+        **job.summary(),
+        "results": list(job.results)
+    }
+
+# =============================================================================
+# INSTRUCTOR LEADERBOARDS
+# =============================================================================
+
+MAX_LEADERBOARD_PAGE = 100
+
+def _leaderboard_response(kind: str, name: str, offset: int, limit: int, student_id: Optional[str]):
+    if offset < 0 or not 1 <= limit <= MAX_LEADERBOARD_PAGE:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {MAX_LEADERBOARD_PAGE}")
+    
+    education_service.events.catch_up()
+    page = education_service.leaderboards.query(kind, name, offset, limit, student_id)
+    if page is None:
+        raise HTTPException(status_code=404, detail="No graded submissions for this leaderboard yet")
+    
+    return {"success": True, **page}
+
+@app.get("/api/instructor/leaderboard/university/{university}", dependencies=[Depends(require_admin)])
+async def get_university_leaderboard(university: str, offset: int = 0, limit: int = 25,
+                                     student_id: Optional[str] = None):
+    """Students of a university ranked by average score"""
+    return _leaderboard_response('university', university, offset, limit, student_id)
+
+@app.get("/api/instructor/leaderboard/filing/{ticker}", dependencies=[Depends(require_admin)])
+async def get_filing_leaderboard(ticker: str, filing_period: str, offset: int = 0, limit: int = 25,
+                                 student_id: Optional[str] = None):
+    """Students ranked by their best score on one filing"""
+    key = education_service.leaderboards.filing_key(ticker, filing_period)
+    return _leaderboard_response('filing', key, offset, limit, student_id)
+
+# =============================================================================
+# USAGE & COST ENDPOINTS
+# =============================================================================
+
+@app.get("/api/instructor/usage", dependencies=[Depends(require_admin)])
+async def get_usage(by: str = "student", limit: int = 20):
+    """Most expensive students, sessions, filings or endpoints by estimated AI cost"""
+    if by not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(DIMENSIONS)}")
+    
+    return {
+        "success": True,
+        "by": by,
+        "overall": usage_ledger.overall.to_dict(),
+        "budget_degradations": usage_ledger.degradations(),
+        "top": usage_ledger.top(by, max(1, limit))
+    }
+
+@app.get("/api/session/{session_id}/usage", dependencies=[Depends(require_admin)])
+async def get_session_usage(session_id: str):
+    """Tokens, TTS characters and estimated cost of one learning session"""
+    if session_id not in education_service.sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # The middleware has already scoped this request to the session and its student
+    return {
+        "success": True,
+        "session_id": session_id,
+        "usage": usage_ledger.summary('session', session_id) or {},
+        "budgets_exceeded": [exceeded for exceeded in (usage_ledger.over_budget('llm'), usage_ledger.over_budget('tts'))
+                             if exceeded]
+    }
+
+# =============================================================================
+# ADMIN PROFILING ENDPOINTS
+# =============================================================================
+
+def _collapsed_response(sampler: profiler.SamplingProfiler, profile_id: str) -> Response:
+    """Collapsed stacks as a download, ready for flamegraph.pl or speedscope"""
+    summary = sampler.summary()
+    return Response(
+        content=sampler.collapsed(),
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{profile_id}.collapsed"',
+            "X-Profile-Id": profile_id,
+            "X-Profile-Samples": str(summary['samples']),
+            "X-Profile-Overhead-Ratio": str(summary['overhead_ratio'])
+        }
+    )
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(seconds: float = 10, interval_ms: float = profiler.PROFILER_INTERVAL_MS,
+                         include_idle: bool = False):
+    """Sample every thread of this worker for a number of seconds and return collapsed stacks"""
+    if not 0 < seconds <= profiler.PROFILER_MAX_SECONDS or interval_ms < 1:
+        raise HTTPException(status_code=400,
+                            detail=f"seconds must be in (0, {profiler.PROFILER_MAX_SECONDS:g}] and interval_ms >= 1")
+    
+    # Sleeps for the whole window, so it runs in the threadpool and the worker keeps serving
+    sampler = await run_in_threadpool(profiler.profile_worker, seconds, interval_ms, include_idle)
+    if sampler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    
+    return _collapsed_response(sampler, profiler.profiles.add(sampler))
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Collapsed stacks of a recent profiled request or worker profile"""
+    sampler = profiler.profiles.get(profile_id)
+    if sampler is None:
+        raise HTTPException(status_code=404, detail="Profile not found (only the most recent are kept)")
+    return _collapsed_response(sampler, profile_id)
+
 # =============================================================================
 # HEALTH CHECK & INFO ENDPOINTS
 # =============================================================================
@@ -682,9 +1017,15 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request and pipeline stage metrics"""
+    return Response(content=instrumentation.render(), media_type=instrumentation.CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    shm_cache = get_shm_cache()
     return {
         "status": "healthy",
         "services": {
@@ -694,7 +1035,10 @@ async def health_check():
             "document_processor": "active"
         },
         "active_sessions": len(active_sessions),
-        "authenticated_students": len(student_data)
+        "authenticated_students": len(student_data),
+        "worker_pid": os.getpid(),
+        "state_backend": type(state_store).__name__,
+        "shm_cache": shm_cache.usage() if shm_cache is not None else None
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,322 @@
+"""
+10Q Notes AI - Batch Grading
+HackRU 2025 Project by azrabano
+
+Instructor batch grading for a whole class:
+- Groups submissions by gold standard so each filing's rubric is shared across packed requests
+- Packs several submissions into one Gemini grading request
+- Runs packed requests concurrently under a requests-per-minute limit
+- Streams results as they finish and keeps job status for polling
+"""
+
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+from gemini_service import FeedbackScore
+from grading_service import gold_standard_hash
+from structured_logging import get_logger
+from leaderboard import LeaderboardService
+from usage_accounting import usage_scope
+from shared_state import SharedMapping
+
+log = get_logger(__name__)
+
+MAX_TRACKED_JOBS = 100
+# Results between job snapshots in the shared state store
+JOB_SNAPSHOT_EVERY = int(os.getenv('BATCH_JOB_SNAPSHOT_EVERY', 10))
+
+
+class RateLimiter:
+    """Token bucket limiting LLM requests per minute across worker threads"""
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class BatchSubmission:
+    """One student submission in a batch"""
+    submission_id: str
+    session_id: str
+    student_smap: Dict[str, str]
+
+
+@dataclass
+class BatchJob:
+    """Progress and results of a batch grading job"""
+    job_id: str
+    total: int
+    status: str = "queued"  # queued, running, completed
+    graded: int = 0
+    failed: int = 0
+    llm_requests: int = 0
+    created_at: str = ""
+    completed_at: str = ""
+    results: List[Dict[str, Any]] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        summary = asdict(self)
+        summary.pop('results')
+        return summary
+
+
+class BatchGradingEngine:
+    """Grades many submissions together through the shared FeedbackGrader"""
+
+    def __init__(self, education_service, max_workers: int = None, pack_size: int = None,
+                 requests_per_minute: float = None):
+        self.education_service = education_service
+        self.grader = education_service.grader
+        self.max_workers = max_workers or int(os.getenv('BATCH_GRADING_WORKERS', 4))
+        self.pack_size = pack_size or int(os.getenv('BATCH_GRADING_PACK_SIZE', 5))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute or float(os.getenv('BATCH_GRADING_REQUESTS_PER_MINUTE', 60)),
+            burst=self.max_workers
+        )
+
+        self.jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._events: Dict[str, "queue.Queue"] = {}
+        self._lock = threading.Lock()
+        # Snapshots for progress queries served by other workers
+        self.shared_jobs = SharedMapping(education_service.store, 'batch_jobs')
+
+    def start(self, submissions: List[BatchSubmission]) -> BatchJob:
+        """Create a job and begin grading it in the background"""
+        job = BatchJob(job_id=str(uuid.uuid4()), total=len(submissions),
+                       created_at=datetime.now().isoformat())
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._events[job.job_id] = queue.Queue()
+            while len(self.jobs) > MAX_TRACKED_JOBS:
+                old_id, _ = self.jobs.popitem(last=False)
+                self._events.pop(old_id, None)
+                self.shared_jobs.pop(old_id, None)
+        self.shared_jobs[job.job_id] = job
+
+        threading.Thread(target=self._run, args=(job, submissions), daemon=True,
+                         name=f"batch-grade-{job.job_id[:8]}").start()
+        log.info("batch_job_started", job_id=job.job_id, submissions=job.total)
+        return job
+
+    def get(self, job_id: str):
+        """A job started by this worker, or the latest snapshot of one started by another"""
+        return self.jobs.get(job_id) or self.shared_jobs.get(job_id)
+
+    def stream(self, job: BatchJob) -> Iterator[Dict[str, Any]]:
+        """Yield 'job', one 'result' per submission as it finishes, then 'complete'"""
+        events = self._events.get(job.job_id)
+        yield {'event': 'job', 'data': job.summary()}
+        if events is None:
+            return
+        while True:
+            event = events.get()
+            yield event
+            if event['event'] == 'complete':
+                return
+
+    def _run(self, job: BatchJob, submissions: List[BatchSubmission]):
+        job.status = "running"
+        try:
+            # Local resolution first: cached, pre-scored and near-duplicate submissions finish instantly
+            groups: Dict[str, tuple] = {}
+            for submission in submissions:
+                try:
+                    self._prepare(job, submission, groups)
+                except Exception as e:
+                    self._fail(job, submission, f"Grading failed: {e}")
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {}
+                for gold_standard, pending in groups.values():
+                    for start in range(0, len(pending), self.pack_size):
+                        pack = pending[start:start + self.pack_size]
+                        futures[executor.submit(self._grade_pack, job, pack, gold_standard)] = pack
+
+                for future in as_completed(futures):
+                    pack = futures[future]
+                    try:
+                        scores = future.result()
+                    except Exception as e:
+                        for submission in pack:
+                            self._fail(job, submission, f"Grading failed: {e}")
+                        continue
+                    for submission, score in zip(pack, scores):
+                        self._complete(job, submission, score, 'llm')
+        finally:
+            job.status = "completed"
+            job.completed_at = datetime.now().isoformat()
+            log.info("batch_job_completed", job_id=job.job_id, graded=job.graded, failed=job.failed,
+                     llm_requests=job.llm_requests)
+            self._emit(job, {'event': 'complete', 'data': job.summary()})
+
+    def _prepare(self, job: BatchJob, submission: BatchSubmission, groups: Dict[str, tuple]):
+        """Finish a submission locally if possible, else queue it under its gold standard"""
+        gold_standard = self.education_service.gold_standard_smap.get(submission.session_id)
+        if gold_standard is None or submission.session_id not in self.education_service.sessions:
+            self._fail(job, submission, "Session not found")
+            return
+        if not any((text or '').strip() for text in submission.student_smap.values()):
+            self._fail(job, submission, "Empty submission")
+            return
+
+        fact_index = self.education_service.fact_indexes.get(submission.session_id)
+        score, source = self.grader.resolve_locally(submission.student_smap, gold_standard, fact_index)
+        if score is not None:
+            self._complete(job, submission, score, source)
+            return
+
+        key = gold_standard_hash(gold_standard)
+        groups.setdefault(key, (gold_standard, []))[1].append(submission)
+
+    def _grade_pack(self, job: BatchJob, pack: List[BatchSubmission], gold_standard) -> List[FeedbackScore]:
+        self.rate_limiter.acquire()
+        with self._lock:
+            job.llm_requests += 1
+        # A packed request covers several students, so it is attributed to the filing only
+        session = self.education_service.sessions[pack[0].session_id] if len(pack) == 1 else None
+        fact_indexes = [self.education_service.fact_indexes.get(submission.session_id) for submission in pack]
+        with usage_scope(endpoint='batch_grading',
+                         filing=LeaderboardService.filing_key(gold_standard.ticker_symbol, gold_standard.filing_period),
+                         session_id=session.session_id if session else None,
+                         student_id=session.student_id if session else None):
+            if session is not None:
+                return [self.grader.grade(pack[0].student_smap, gold_standard, fact_indexes[0])]
+            # Budgets are per session and student, so each submission is checked under its own scope
+            attributions = []
+            for submission in pack:
+                pack_session = self.education_service.sessions[submission.session_id]
+                attributions.append({'session_id': pack_session.session_id, 'student_id': pack_session.student_id})
+            return self.grader.grade_packed([submission.student_smap for submission in pack], gold_standard,
+                                            attributions, fact_indexes)
+
+    def _complete(self, job: BatchJob, submission: BatchSubmission, score: FeedbackScore, source: str):
+        """Record one grade; a failure here fails only this submission"""
+        try:
+            feedback_results = self.education_service.record_graded_work(
+                submission.session_id, submission.student_smap, score
+            )
+            session = self.education_service.sessions[submission.session_id]
+        except Exception as e:
+            log.warning("batch_result_not_recorded", job_id=job.job_id, submission_id=submission.submission_id,
+                        error=str(e))
+            self._fail(job, submission, f"Recording grade failed: {e}")
+            return
+        job.graded += 1
+        self._emit(job, {'event': 'result', 'data': {
+            'submission_id': submission.submission_id,
+            'session_id': submission.session_id,
+            'student_id': session.student_id,
+            'status': 'graded',
+            'source': source,
+            'overall_score': feedback_results['overall_score'],
+            'section_scores': feedback_results['section_scores'],
+            'feedback': feedback_results['feedback']
+        }})
+
+    def _fail(self, job: BatchJob, submission: BatchSubmission, error: str):
+        job.failed += 1
+        self._emit(job, {'event': 'result', 'data': {
+            'submission_id': submission.submission_id,
+            'session_id': submission.session_id,
+            'status': 'error',
+            'error': error
+        }})
+
+    def _emit(self, job: BatchJob, event: Dict[str, Any]):
+        if event['event'] == 'result':
+            job.results.append(event['data'])
+        if event['event'] == 'complete' or len(job.results) % JOB_SNAPSHOT_EVERY == 0:
+            self.shared_jobs[job.job_id] = job
+        events = self._events.get(job.job_id)
+        if events is not None:
+            events.put(event)
+
+
+def test_batch_grading():
+    """Packed results map to students by id only; one bad submission does not stop the batch"""
+    from types import SimpleNamespace
+    from gemini_service import GeminiService
+    from grading_service import FeedbackGrader
+    from shared_state import MemoryStateStore
+    print("🧪 Testing Batch Grading")
+
+    def score_for(notes) -> FeedbackScore:
+        points = len(notes.subjective)
+        return FeedbackScore(points, points, points, points, points, [notes.subjective], [])
+
+    class MislabellingGemini:
+        """Numbers from 1, repeats one id, skips another and garbles a score, like a confused model"""
+        def __init__(self):
+            self.regraded = []
+
+        def provide_batch_feedback(self, user_smaps, gold_standard):
+            items = list(user_smaps.items())
+            graded = [{'submission_id': items[0][0], **asdict(score_for(items[0][1])), 'accuracy': 'n/a'},
+                      {'submission_id': items[1][0], **asdict(score_for(items[1][1]))},
+                      {'submission_id': items[1][0], **asdict(score_for(items[2][1]))},
+                      {'submission_id': '1', **asdict(score_for(items[3][1]))}]
+            return GeminiService._match_batch_results(GeminiService.__new__(GeminiService), graded, user_smaps)
+
+        def provide_feedback(self, notes, gold_standard, raise_on_error=False):
+            self.regraded.append(notes.subjective)
+            return score_for(notes)
+
+    gold = SimpleNamespace(subjective="s", metrics="m", assessment="a", plan="p", company_name="JPM",
+                           filing_type="10-Q", ticker_symbol="JPM", filing_period="Q1 2025")
+    gemini = MislabellingGemini()
+    grader = FeedbackGrader(gemini, max_concurrent=2, queue_timeout=1)
+    grader.prescoring = False
+    smaps = [{'subjective': 'x' * (10 * (i + 1)), 'metrics': '', 'assessment': '', 'plan': ''} for i in range(4)]
+    scores = grader.grade_packed(smaps, gold)
+    assert [score.overall_score for score in scores] == [10, 20, 30, 40]
+    # Invalid score, duplicated, wrong and missing ids
+    assert sorted(gemini.regraded) == ['x' * 10, 'x' * 20, 'x' * 30, 'x' * 40]
+
+    recorded = []
+
+    def record_graded_work(session_id, student_smap, score):
+        if session_id == 's2':
+            raise KeyError(session_id)
+        recorded.append(session_id)
+        return {'overall_score': score.overall_score, 'section_scores': {}, 'feedback': {}}
+
+    sessions = {f"s{i}": SimpleNamespace(session_id=f"s{i}", student_id=f"student_{i}") for i in range(4)}
+    education_service = SimpleNamespace(grader=grader, store=MemoryStateStore(), sessions=sessions,
+                                        gold_standard_smap={session_id: gold for session_id in sessions},
+                                        fact_indexes={}, record_graded_work=record_graded_work)
+    engine = BatchGradingEngine(education_service, max_workers=1, pack_size=4, requests_per_minute=6000)
+    job = engine.start([BatchSubmission(f"sub{i}", f"s{i}", smap) for i, smap in enumerate(smaps)])
+    events = list(engine.stream(job))
+    assert events[-1]['event'] == 'complete' and job.graded == 3 and job.failed == 1
+    assert sorted(recorded) == ['s0', 's1', 's3']
+    print(f"   📊 {job.summary()}")
+    print("✅ Results matched by id; a failing submission is isolated")
+
+
+if __name__ == "__main__":
+    test_batch_grading()
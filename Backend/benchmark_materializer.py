@@ -0,0 +1,278 @@
+"""
+10Q Notes AI - Benchmark Materializer
+HackRU 2025 Project by azrabano
+
+Incrementally maintained industry benchmarks:
+- One streaming quantile sketch per industry, period and FinancialMetrics column
+- Exact quantiles while a cohort is small, P² estimators (Jain & Chlamtac) once it grows
+- O(1) updates per stored filing and O(1) benchmark reads
+- Rows for the industry_benchmarks table, written through the bulk writer
+"""
+
+import re
+import threading
+from bisect import bisect_right, insort
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from enhanced_gemini_service import FinancialMetrics
+from metrics_store import FinancialMetricsStore, METRIC_FIELDS, period_label
+
+# 0.875 is the middle of the top quartile, reported as the top-quartile benchmark
+BENCHMARK_QUANTILES = (0.25, 0.5, 0.75, 0.875)
+
+# Cohorts up to this size keep every value and report exact quantiles
+EXACT_SAMPLE_LIMIT = 256
+
+
+def _interpolate(ordered: Sequence[float], p: float) -> float:
+    """Linear-interpolated quantile of sorted values (NumPy's default method)"""
+    position = p * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class P2Quantile:
+    """P² estimate of one quantile: five markers, constant memory and time per value"""
+
+    def __init__(self, p: float, seed: Sequence[float]):
+        """seed: sorted values seen so far (at least five) used to place the markers"""
+        self.p = p
+        last = len(seed) - 1
+        self.desired = [0.0, last * p / 2, last * p, last * (1 + p) / 2, float(last)]
+        self.positions = [0, *(int(round(position)) for position in self.desired[1:4]), last]
+        for i in (1, 2, 3):
+            self.positions[i] = min(max(self.positions[i], self.positions[i - 1] + 1), last - (4 - i))
+        self.heights = [float(seed[position]) for position in self.positions]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = min(bisect_right(q, x) - 1, 3)
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            offset = self.desired[i] - n[i]
+            if (offset >= 1 and n[i + 1] - n[i] > 1) or (offset <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> float:
+        return self.heights[2]
+
+
+class QuantileSketch:
+    """Count, mean, min, max and quantiles of a value stream"""
+
+    def __init__(self, probabilities: Tuple[float, ...] = BENCHMARK_QUANTILES,
+                 exact_limit: int = EXACT_SAMPLE_LIMIT):
+        self.probabilities = probabilities
+        self.exact_limit = max(exact_limit, 5)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._sample: List[float] = []
+        self._estimators: Optional[Dict[float, P2Quantile]] = None
+
+    def add(self, x: float):
+        self.count += 1
+        self.total += x
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+        if self._estimators is not None:
+            for estimator in self._estimators.values():
+                estimator.add(x)
+            return
+
+        insort(self._sample, x)
+        if len(self._sample) > self.exact_limit:
+            self._estimators = {p: P2Quantile(p, self._sample) for p in self.probabilities}
+            self._sample = []
+
+    def quantile(self, p: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        if self._estimators is None:
+            return _interpolate(self._sample, p)
+        # Markers of separate estimators can cross on heavily tied data; keep quantiles ordered and in range
+        estimate = max(self._estimators[q].value for q in self.probabilities if q <= p)
+        return min(max(estimate, self.min), self.max)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class BenchmarkMaterializer:
+    """Per-industry, per-period sketches of every FinancialMetrics column"""
+
+    def __init__(self, metrics_store: FinancialMetricsStore):
+        self.metrics_store = metrics_store
+        self._cells: Dict[Tuple[str, int], Dict[str, QuantileSketch]] = {}
+        self._industry_names: Dict[str, str] = {}
+        self._latest: Dict[str, int] = {}
+        # filing_id -> (cell, metric values) last observed, to spot re-ingested filings
+        self._observed: Dict[str, Tuple[Tuple[str, int], Tuple[Optional[float], ...]]] = {}
+        self._lock = threading.RLock()
+        self.stats = {'observed': 0, 'rebuilds': 0}
+
+    def observe(self, filing_id: str, industry: str, period: int, metrics: FinancialMetrics) -> Set[Tuple[str, int]]:
+        """Fold a stored filing into its cohort; returns the cells whose benchmarks changed"""
+        if period < 0 or not industry:
+            return set()
+
+        cell = (industry.lower(), period)
+        values = tuple(getattr(metrics, name) for name in METRIC_FIELDS)
+        with self._lock:
+            previous = self._observed.get(filing_id)
+            if previous == (cell, values):
+                return set()
+            self._observed[filing_id] = (cell, values)
+            self._industry_names.setdefault(cell[0], industry)
+            self._latest[cell[0]] = max(period, self._latest.get(cell[0], period))
+            self.stats['observed'] += 1
+
+            if previous is not None:
+                # Sketches cannot forget a value, so a replaced filing rebuilds its cohorts from the store
+                changed = {previous[0], cell}
+                for stale in changed:
+                    self._rebuild(stale)
+                return changed
+
+            sketches = self._cells.setdefault(cell, {})
+            for name, value in zip(METRIC_FIELDS, values):
+                if value is not None:
+                    sketches.setdefault(name, QuantileSketch()).add(float(value))
+            return {cell}
+
+    def _rebuild(self, cell: Tuple[str, int]):
+        self.stats['rebuilds'] += 1
+        sketches = {}
+        for name in METRIC_FIELDS:
+            values = self.metrics_store.cohort(name, industry=cell[0], period=cell[1])
+            if values.size:
+                sketch = sketches[name] = QuantileSketch()
+                for value in values:
+                    sketch.add(float(value))
+        self._cells[cell] = sketches
+
+    def latest_period(self, industry: str) -> Optional[int]:
+        return self._latest.get(industry.lower())
+
+    def benchmark(self, industry: str, metric: str, period: Optional[int] = None) -> Dict[str, Any]:
+        """Materialized benchmark for one metric; period defaults to the industry's latest"""
+        if period is None:
+            period = self.latest_period(industry)
+        with self._lock:
+            sketch = self._cells.get((industry.lower(), period), {}).get(metric)
+            if sketch is None:
+                return {'sample_size': 0, 'percentile_25': None, 'percentile_50': None, 'percentile_75': None,
+                        'mean': None, 'min': None, 'max': None, 'top_quartile': None}
+            return {
+                'sample_size': sketch.count,
+                'percentile_25': sketch.quantile(0.25),
+                'percentile_50': sketch.quantile(0.5),
+                'percentile_75': sketch.quantile(0.75),
+                'mean': sketch.mean,
+                'min': sketch.min,
+                'max': sketch.max,
+                'top_quartile': sketch.quantile(0.875)
+            }
+
+    def rows(self, cell: Tuple[str, int]) -> List[Dict[str, Any]]:
+        """industry_benchmarks rows for one cohort"""
+        industry = self._industry_names.get(cell[0], cell[0])
+        period = period_label(cell[1])
+        updated_at = datetime.now().isoformat()
+        rows = []
+        for metric in METRIC_FIELDS:
+            stats = self.benchmark(industry, metric, cell[1])
+            if not stats['sample_size']:
+                continue
+            rows.append({
+                'benchmark_id': re.sub(r'[^A-Za-z0-9]+', '_', f"{industry}_{period}_{metric}").strip('_').upper(),
+                'industry': industry,
+                'metric_name': metric,
+                'benchmark_value': stats['mean'],
+                'percentile_25': stats['percentile_25'],
+                'percentile_50': stats['percentile_50'],
+                'percentile_75': stats['percentile_75'],
+                'period': period,
+                'updated_at': updated_at
+            })
+        return rows
+
+
+def test_benchmark_materializer():
+    """Compare streaming benchmarks against exact percentiles"""
+    import numpy as np
+
+    print("🧪 Testing Benchmark Materializer")
+    rng = np.random.default_rng(7)
+    values = rng.normal(0.14, 0.03, 5000)
+
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(float(value))
+
+    for p in BENCHMARK_QUANTILES:
+        exact = float(np.percentile(values, p * 100))
+        print(f"   p{p * 100:g}: streaming {sketch.quantile(p):.4f} vs exact {exact:.4f}")
+        assert abs(sketch.quantile(p) - exact) < 0.002  # a fraction of the 0.03 spread
+    assert abs(sketch.mean - values.mean()) < 1e-9
+
+    # Small cohorts are exact
+    small = QuantileSketch()
+    for value in values[:100]:
+        small.add(float(value))
+    assert all(abs(small.quantile(p) - np.percentile(values[:100], p * 100)) < 1e-12 for p in BENCHMARK_QUANTILES)
+
+    # A re-ingested filing replaces its earlier values instead of being counted twice
+    from metrics_store import period_key
+    q1 = period_key("Q1 2025")
+    store = FinancialMetricsStore()
+    materializer = BenchmarkMaterializer(store)
+    for i, roe in enumerate([0.10, 0.12, 0.14, 0.16]):
+        metrics = FinancialMetrics(return_on_equity=roe, quarter='Q1', year=2025)
+        store.add(f"bank_{i}", f"BANK{i}", f"Bank {i}", "Banking", "Q1 2025", metrics)
+        materializer.observe(f"bank_{i}", "Banking", q1, metrics)
+    assert abs(materializer.benchmark("Banking", "return_on_equity")['percentile_50'] - 0.13) < 1e-12
+
+    restated = FinancialMetrics(return_on_equity=0.30, quarter='Q1', year=2025)
+    store.add("bank_0", "BANK0", "Bank 0", "Banking", "Q1 2025", restated)
+    assert materializer.observe("bank_0", "Banking", q1, restated) == {('banking', q1)}
+    assert materializer.observe("bank_0", "Banking", q1, restated) == set()  # unchanged re-ingest
+    stats = materializer.benchmark("Banking", "return_on_equity")
+    assert materializer.stats['rebuilds'] == 1 and stats['sample_size'] == 4
+    assert abs(stats['percentile_50'] - np.percentile([0.30, 0.12, 0.14, 0.16], 50)) < 1e-12 and stats['max'] == 0.30
+    print(f"✅ {sketch.count} values summarized in {len(BENCHMARK_QUANTILES) * 5} markers; re-ingests rebuild the cohort")
+
+
+if __name__ == "__main__":
+    test_benchmark_materializer()
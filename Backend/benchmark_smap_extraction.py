@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+10Q Notes AI - SMAP Extraction Benchmark
+HackRU 2025 Project by azrabano
+
+Compares the five-prompt pipeline with single-call structured output:
+- End-to-end latency per run
+- Gemini round-trips and prompt characters sent
+- Field coverage across SMAP text, metadata, metrics, risks and segments
+
+Usage: python benchmark_smap_extraction.py [filing.txt] [--runs N]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from dataclasses import asdict
+from typing import Dict, Any
+
+from enhanced_gemini_service import EnhancedGeminiService, EnhancedSMAPNotes
+
+SAMPLE_FILING = """
+JPMORGAN CHASE & CO.
+FORM 10-Q
+
+CONSOLIDATED STATEMENT OF INCOME
+Three Months Ended March 31, 2025
+
+Total net revenue: $42,550 million (2024: $39,880 million)
+Net interest income: $23,900 million
+Noninterest revenue: $18,650 million
+Net income: $13,420 million
+
+Return on equity: 17.8%
+Common equity Tier 1 ratio: 15.9%
+Net interest margin: 2.74%
+Book value per share: $95.35
+
+RISK FACTORS:
+Credit risk from potential economic downturn affecting loan portfolios.
+Market risk from interest rate volatility and trading positions.
+Regulatory changes could impact capital requirements and operations.
+
+BUSINESS SEGMENTS:
+Consumer & Community Banking revenue: $17.2 billion
+Corporate & Investment Bank revenue: $12.1 billion
+"""
+
+
+class CountingModel:
+    """Wraps a Gemini model to count round-trips and prompt characters"""
+
+    def __init__(self, model):
+        self._model = model
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        return self._model.generate_content(prompt, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def field_coverage(notes: EnhancedSMAPNotes) -> Dict[str, Any]:
+    """Count populated fields in each part of the extraction"""
+    smap_defaults = ('No subjective analysis generated', 'No metrics extracted',
+                     'No assessment provided', 'No plan recommendations')
+    smap_filled = sum(1 for text in (notes.subjective, notes.metrics, notes.assessment, notes.plan)
+                      if text and text not in smap_defaults and not text.startswith('Error'))
+    metadata_filled = sum(1 for value in (notes.company_name, notes.ticker_symbol, notes.filing_type,
+                                          notes.filing_period, notes.industry)
+                          if value and value not in ('Unknown Company', 'N/A', 'SEC Filing'))
+    metrics = asdict(notes.financial_metrics)
+
+    return {
+        'smap_sections': smap_filled,
+        'metadata_fields': metadata_filled,
+        'financial_metrics': sum(1 for value in metrics.values() if value is not None),
+        'financial_metrics_total': len(metrics),
+        'risk_factors': sum(len(risks) for risks in asdict(notes.risk_factors).values()),
+        'business_segments': len(notes.business_segments.segments)
+    }
+
+
+def run_mode(service: EnhancedGeminiService, counter: CountingModel, filing_text: str,
+             single_call: bool, runs: int) -> Dict[str, Any]:
+    """Run one extraction mode several times and collect latency, calls and coverage"""
+    latencies, calls, prompt_chars, coverages = [], [], [], []
+
+    for _ in range(runs):
+        counter.calls = 0
+        counter.prompt_chars = 0
+        started = time.perf_counter()
+        notes = service.generate_enhanced_smap_notes(filing_text, single_call=single_call)
+        latencies.append(time.perf_counter() - started)
+        calls.append(counter.calls)
+        prompt_chars.append(counter.prompt_chars)
+        coverages.append(field_coverage(notes))
+
+    return {
+        'latency_median': statistics.median(latencies),
+        'latency_max': max(latencies),
+        'calls': statistics.mean(calls),
+        'prompt_chars': statistics.mean(prompt_chars),
+        'coverage': {key: statistics.mean(c[key] for c in coverages) for key in coverages[0]}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-call vs single-call SMAP extraction")
+    parser.add_argument('filing', nargs='?', help="Path to a filing text file (defaults to a JPM sample)")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per mode")
+    args = parser.parse_args()
+
+    filing_text = SAMPLE_FILING
+    if args.filing:
+        with open(args.filing, 'r', encoding='utf-8', errors='ignore') as f:
+            filing_text = f.read()
+
+    print("🏁 SMAP Extraction Benchmark: multi-call vs single-call")
+    print("=" * 60)
+
+    service = EnhancedGeminiService()
+    counter = CountingModel(service.model)
+    service.model = counter
+
+    results = {
+        'multi-call': run_mode(service, counter, filing_text, single_call=False, runs=args.runs),
+        'single-call': run_mode(service, counter, filing_text, single_call=True, runs=args.runs)
+    }
+
+    print(f"\n{'mode':<12} {'p50 (s)':>8} {'max (s)':>8} {'calls':>6} {'prompt chars':>13}")
+    for mode, result in results.items():
+        print(f"{mode:<12} {result['latency_median']:>8.2f} {result['latency_max']:>8.2f} "
+              f"{result['calls']:>6.1f} {result['prompt_chars']:>13.0f}")
+
+    print("\n📊 Field coverage (mean per run)")
+    for mode, result in results.items():
+        coverage = result['coverage']
+        print(f"   {mode:<12} SMAP {coverage['smap_sections']:.1f}/4, "
+              f"metadata {coverage['metadata_fields']:.1f}/5, "
+              f"metrics {coverage['financial_metrics']:.1f}/{coverage['financial_metrics_total']:.0f}, "
+              f"risks {coverage['risk_factors']:.1f}, segments {coverage['business_segments']:.1f}")
+
+    multi, single = results['multi-call'], results['single-call']
+    if single['latency_median'] > 0 and single['prompt_chars'] > 0:
+        print(f"\n⚡ Single-call speedup: {multi['latency_median'] / single['latency_median']:.1f}x latency, "
+              f"{multi['prompt_chars'] / single['prompt_chars']:.1f}x fewer prompt characters")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+10Q Notes AI - Bulk Writer
+HackRU 2025 Project by azrabano
+
+Buffered bulk writes for the analytics database:
+- Rows for a filing across all tables are buffered under its deterministic filing_id
+- Flushed as one atomic batch when enough rows are pending or the oldest row is too old
+- Idempotent upserts; child tables are replaced so re-ingesting a filing leaves no stale rows
+- Commit listeners (e.g. the query result cache) are told which tables changed
+"""
+
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Set
+
+import tracing
+from analytics_backend import AnalyticsBackend, WriteStep
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class BulkWriter:
+    """Buffers per-filing rows and writes them with one backend.write_batch per flush"""
+
+    def __init__(self, backend: AnalyticsBackend, table_keys: Dict[str, str], child_tables: Dict[str, str],
+                 max_rows: int = None, flush_interval: float = None):
+        """
+        table_keys maps each table to its primary key, in foreign-key write order.
+        child_tables maps tables whose rows are replaced wholesale for a parent to
+        the column holding the parent id.
+        """
+        self.backend = backend
+        self.table_keys = table_keys
+        self.child_tables = child_tables
+        self.max_rows = max_rows or int(os.getenv('BULK_WRITE_MAX_ROWS', 500))
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('BULK_WRITE_FLUSH_SECONDS', 2.0))
+
+        self._pending: "OrderedDict[str, Dict[str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._pending_rows = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.listeners: List[Callable[[Set[str]], None]] = []
+
+        self.stats = {'flushes': 0, 'filings_written': 0, 'rows_written': 0,
+                      'failed_flushes': 0, 'last_flush_seconds': 0.0}
+
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flush_periodically, daemon=True, name="bulk-writer").start()
+        atexit.register(self.close)
+
+    @property
+    def pending_rows(self) -> int:
+        return self._pending_rows
+
+    def add(self, parent_id: str, rows: Dict[str, List[Dict[str, Any]]]):
+        """Buffer every row of one filing; a later add for the same filing replaces the earlier one"""
+        with self._lock:
+            previous = self._pending.pop(parent_id, None)
+            if previous is not None:
+                self._pending_rows -= sum(len(table_rows) for table_rows in previous.values())
+            self._pending[parent_id] = rows
+            self._pending_rows += sum(len(table_rows) for table_rows in rows.values())
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._pending_rows >= self.max_rows
+
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered in one transaction; returns the number of filings written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, row_count = self._pending, self._pending_rows
+                self._pending, self._pending_rows, self._oldest = OrderedDict(), 0, None
+
+            started = time.perf_counter()
+            steps = self._steps(pending)
+            try:
+                with tracing.span('analytics.write_batch', kind='client', **{
+                        'db.system': self.backend.name, 'db.operation.name': 'write_batch',
+                        'db.rows': row_count, 'db.filings': len(pending)}):
+                    self.backend.write_batch(steps)
+            except Exception:
+                self.stats['failed_flushes'] += 1
+                self._requeue(pending)
+                raise
+
+            tables = {step.table for step in steps}
+            for listener in self.listeners:
+                listener(tables)
+
+            self.stats['flushes'] += 1
+            self.stats['filings_written'] += len(pending)
+            self.stats['rows_written'] += row_count
+            self.stats['last_flush_seconds'] = time.perf_counter() - started
+            return len(pending)
+
+    def close(self):
+        """Stop the flush thread and write what is left"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            log.error("bulk_write_dropped", pending_rows=self._pending_rows, error=str(e))
+
+    def _steps(self, pending: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> List[WriteStep]:
+        parent_ids = list(pending)
+        steps = []
+        for table, key in self.table_keys.items():
+            if table in self.child_tables:
+                steps.append(WriteStep('delete', table, self.child_tables[table], values=parent_ids))
+            # Rows shared between filings (companies) are deduplicated, latest wins
+            rows = {}
+            for filing_rows in pending.values():
+                for row in filing_rows.get(table, []):
+                    rows[row[key]] = row
+            if rows:
+                steps.append(WriteStep('upsert', table, key, rows=list(rows.values())))
+        return steps
+
+    def _requeue(self, pending: Dict[str, Dict[str, List[Dict[str, Any]]]]):
+        """Put a failed batch back without overwriting filings added since"""
+        with self._lock:
+            for parent_id, rows in pending.items():
+                if parent_id not in self._pending:
+                    self._pending[parent_id] = rows
+                    self._pending_rows += sum(len(table_rows) for table_rows in rows.values())
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(min(self.flush_interval, 1.0)):
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.flush_interval:
+                try:
+                    self.flush()
+                except Exception as e:
+                    log.warning("bulk_write_failed", pending_rows=self._pending_rows, error=str(e), retrying=True)
+
+
+def test_bulk_writer():
+    """Coalesce re-added filings, replace child rows, requeue a failed flush"""
+    print("🧪 Testing Bulk Writer")
+
+    class RecordingBackend(AnalyticsBackend):
+        name = "recording"
+
+        def __init__(self):
+            self.batches = []
+            self.fail_next = False
+
+        def write_batch(self, steps):
+            if self.fail_next:
+                self.fail_next = False
+                raise ConnectionError("warehouse unavailable")
+            self.batches.append(steps)
+
+    backend = RecordingBackend()
+    writer = BulkWriter(backend, {'companies': 'company_id', 'filings': 'filing_id', 'risk_factors': 'risk_id'},
+                        {'risk_factors': 'filing_id'}, max_rows=100, flush_interval=0)
+    changed = []
+    writer.listeners.append(changed.append)
+
+    def filing(filing_id, risks):
+        return {'companies': [{'company_id': 'JPM'}], 'filings': [{'filing_id': filing_id}],
+                'risk_factors': [{'risk_id': f"{filing_id}_{i}", 'filing_id': filing_id} for i in range(risks)]}
+
+    writer.add('JPM_Q1_2025', filing('JPM_Q1_2025', 3))
+    writer.add('JPM_Q1_2025', filing('JPM_Q1_2025', 2))  # re-extracted: replaces the buffered rows
+    writer.add('JPM_Q2_2025', filing('JPM_Q2_2025', 1))
+    assert writer.pending_rows == 7
+
+    backend.fail_next = True
+    try:
+        writer.flush()
+        raise AssertionError("failed flush was swallowed")
+    except ConnectionError:
+        pass
+    assert writer.pending_rows == 7 and not backend.batches
+
+    assert writer.flush() == 2
+    steps = {(step.op, step.table): step for step in backend.batches[0]}
+    assert steps[('delete', 'risk_factors')].values == ['JPM_Q1_2025', 'JPM_Q2_2025']
+    assert len(steps[('upsert', 'companies')].rows) == 1 and len(steps[('upsert', 'risk_factors')].rows) == 3
+    assert changed == [{'companies', 'filings', 'risk_factors'}]
+    writer.close()
+    print(f"   📊 {writer.stats}")
+    print("✅ One atomic batch per flush, retried after a failure")
+
+
+if __name__ == "__main__":
+    test_bulk_writer()
@@ -15,19 +15,27 @@ import PyPDF2
 import requests
 from io import BytesIO
 
+from instrumentation import track_stage
+from tracing import current_span, set_attributes
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
 class DocumentProcessor:
     """Handles document processing and text extraction"""
     
     def __init__(self):
         """Initialize document processor"""
-        print("📄 Document processor initialized")
+        log.debug("document_processor_initialized")
     
+    @track_stage('pdf_extraction')
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from a PDF file"""
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 text = ""
+                set_attributes(**{'pdf.pages': len(pdf_reader.pages), 'pdf.bytes': os.path.getsize(pdf_path)})
                 
                 for page_num in range(len(pdf_reader.pages)):
                     page = pdf_reader.pages[page_num]
@@ -36,7 +44,8 @@ class DocumentProcessor:
                 return text.strip()
                 
         except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
+            log.error("pdf_extraction_failed", path=pdf_path, error=str(e))
+            current_span().record_exception(e)
             return ""
     
     def extract_text_from_url(self, url: str) -> str:
@@ -50,7 +59,7 @@ class DocumentProcessor:
             return response.text
             
         except Exception as e:
-            print(f"Error extracting text from URL: {e}")
+            log.error("url_extraction_failed", url=url, error=str(e))
             return ""
     
     def clean_sec_filing_text(self, raw_text: str) -> str:
@@ -92,6 +101,7 @@ class DocumentProcessor:
         
         return filing_info
     
+    @track_stage('financial_table_extraction')
     def extract_financial_tables(self, text: str) -> Dict[str, str]:
         """Extract key financial statement sections"""
         sections = {}
@@ -12,12 +12,29 @@ Complete educational system implementation:
 import os
 import json
 import uuid
-from typing import Dict, List, Optional, Any
+import threading
+from bisect import insort
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
+from types import SimpleNamespace
 from enhanced_gemini_service import EnhancedSMAPNotes, EnhancedGeminiService
+from gemini_service import GeminiService, FeedbackScore
+from grading_service import FeedbackGrader, GradingUnavailable
 from voice_agent_service import VoiceAgentService
 from snowflake_service import SnowflakeService
+from document_processor import DocumentProcessor
+from numeric_fact_index import NumericFactIndex
+from progress_engine import ProgressEngine, ProgressEvent
+from leaderboard import LeaderboardService
+from instrumentation import track_stage
+from structured_logging import get_logger
+from usage_accounting import ledger as usage_ledger, usage_scope, scoped_iter
+from shared_state import StateStore, SharedMapping, EventLog, state_store
+from shm_cache import get_shm_cache
+from single_flight import SingleFlight, content_key
+
+log = get_logger(__name__)
 
 @dataclass
 class StudentProfile:
@@ -58,7 +75,7 @@ class LearningSession:
     filing_period: str
     
     # Session progress
-    status: str = "started"  # started, learning, practicing, completed
+    status: str = "started"  # started, learning, practicing, provisional, completed
     current_mode: str = "learn"  # learn, practice, feedback, review
     sections_completed: List[str] = None
     
@@ -84,27 +101,189 @@ class LearningSession:
         if self.feedback is None:
             self.feedback = {"strengths": [], "improvements": [], "suggestions": []}
 
+PROVISIONAL_NOTICE = ("Your AI usage budget is used up, so this is a provisional local score. It does not count "
+                      "toward your progress or leaderboards; resubmit once your budget resets for a full AI grade.")
+
+# Session fields carried by learning events; SMAP text and feedback stay in the session record
+SESSION_EVENT_FIELDS = ('session_id', 'student_id', 'company_name', 'ticker', 'filing_type', 'filing_period',
+                        'status', 'scores', 'overall_score', 'started_at', 'completed_at')
+
+class StudentSessionIndex:
+    """Secondary index of sessions by student, ordered by started_at, with completion aggregates"""
+    
+    def __init__(self):
+        self._by_student: Dict[str, List[Tuple[str, str]]] = {}  # student_id -> sorted (started_at, session_id)
+        self._sessions: Dict[str, LearningSession] = {}
+        self._completed_scores: Dict[str, float] = {}  # session_id -> score counted in the aggregates
+        self._aggregates: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, session: LearningSession):
+        with self._lock:
+            if session.session_id in self._sessions:
+                return
+            self._sessions[session.session_id] = session
+            insort(self._by_student.setdefault(session.student_id, []), (session.started_at, session.session_id))
+    
+    def record_completion(self, session: LearningSession):
+        """Count a completed session once; a re-graded session replaces its earlier score"""
+        with self._lock:
+            aggregates = self._aggregates.setdefault(
+                session.student_id, {'completed': 0, 'score_total': 0.0, 'best_score': 0.0})
+            previous = self._completed_scores.get(session.session_id)
+            if previous is None:
+                aggregates['completed'] += 1
+            else:
+                aggregates['score_total'] -= previous
+            aggregates['score_total'] += session.overall_score
+            self._completed_scores[session.session_id] = session.overall_score
+            self._sessions[session.session_id] = session
+            if previous is not None and previous >= aggregates['best_score']:
+                # The best session was re-graded; rescan this student's own sessions
+                aggregates['best_score'] = max((self._completed_scores.get(session_id, 0.0)
+                                                for _, session_id in self._by_student.get(session.student_id, [])),
+                                               default=session.overall_score)
+            else:
+                aggregates['best_score'] = max(aggregates['best_score'], session.overall_score)
+    
+    def recent(self, student_id: str, limit: int = 5) -> List[LearningSession]:
+        """A student's most recently started sessions, newest first"""
+        with self._lock:
+            entries = self._by_student.get(student_id, [])
+            return [self._sessions[session_id] for _, session_id in reversed(entries[-limit:])]
+    
+    def aggregates(self, student_id: str) -> Dict[str, float]:
+        with self._lock:
+            aggregates = dict(self._aggregates.get(student_id, {'completed': 0, 'score_total': 0.0, 'best_score': 0.0}))
+            aggregates['started'] = len(self._by_student.get(student_id, []))
+            return aggregates
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+# Learn Mode guidance shown alongside each AI-generated SMAP section
+LEARN_SECTION_GUIDES = {
+    'subjective': {
+        'title': 'Subjective (S) - What Management Said',
+        'explanation': 'This section captures the narrative and tone from management, including strategic priorities and forward-looking statements.',
+        'key_concepts': ['Management tone', 'Strategic priorities', 'Forward guidance', 'Qualitative insights'],
+        'hover_definitions': {
+            'fortress balance sheet': 'Strong financial position with high capital levels',
+            'operational efficiency': 'How well the company uses resources to generate profits',
+            'regulatory headwinds': 'Government policy changes that may hurt business'
+        }
+    },
+    'metrics': {
+        'title': 'Metrics (M) - Key Financial Numbers',
+        'explanation': 'Hard numbers, ratios, and financial data extracted directly from the filing.',
+        'key_concepts': ['Revenue growth', 'Profitability ratios', 'Balance sheet strength', 'Per-share metrics'],
+        'hover_definitions': {
+            'ROE': 'Return on Equity - measures how efficiently the company uses shareholder money',
+            'CET1 ratio': 'Common Equity Tier 1 - bank\'s core capital as % of risk-weighted assets',
+            'NIM': 'Net Interest Margin - spread between interest earned and paid by a bank'
+        }
+    },
+    'assessment': {
+        'title': 'Assessment (A) - What It All Means',
+        'explanation': 'AI interprets the numbers and narrative to identify trends, strengths, and concerns.',
+        'key_concepts': ['Trend analysis', 'Competitive positioning', 'Risk factors', 'Growth drivers'],
+        'hover_definitions': {
+            'operating leverage': 'When revenue grows faster than expenses, boosting profits',
+            'credit provisions': 'Money set aside for potential loan losses',
+            'market share': 'Company\'s portion of total industry sales'
+        }
+    },
+    'plan': {
+        'title': 'Plan (P) - Recommended Next Steps',
+        'explanation': 'Specific actionable recommendations for investors, analysts, or advisors.',
+        'key_concepts': ['Monitoring priorities', 'Investment decisions', 'Risk management', 'Action items'],
+        'hover_definitions': {
+            'valuation multiple': 'Ratio comparing company price to financial metrics',
+            'peer analysis': 'Comparing performance to similar companies',
+            'catalyst': 'Event that could significantly impact stock price'
+        }
+    }
+}
+
 class EducationService:
     """Complete educational service for SMAP-Q learning platform"""
     
-    def __init__(self):
+    def __init__(self, store: StateStore = None):
         """Initialize education service with all components"""
-        print("🎓 Initializing 10Q Notes AI Education Platform")
-        print("📚 Complete Student Learning Experience")
-        print("="*60)
-        
         # Initialize AI services
         self.gemini_service = EnhancedGeminiService()
+        self.smap_flight = SingleFlight('smap_generation')
+        self.grader = FeedbackGrader(GeminiService())
         self.voice_agent = VoiceAgentService()
         self.snowflake_service = SnowflakeService()
-        
-        # In-memory storage for demo (production would use database)
-        self.students: Dict[str, StudentProfile] = {}
-        self.sessions: Dict[str, LearningSession] = {}
-        self.gold_standard_smap: Dict[str, EnhancedSMAPNotes] = {}
-        
-        print("✅ Education platform initialized")
-        print("🎯 Ready for interactive learning sessions")
+        self.document_processor = DocumentProcessor()
+        
+        # Records in the state store, visible to every worker; save changed records back
+        self.store = store or state_store
+        self.students: Dict[str, StudentProfile] = SharedMapping(self.store, 'students')
+        self.sessions: Dict[str, LearningSession] = SharedMapping(self.store, 'sessions')
+        # Gold standards never change once stored: hot ones are read from host shared memory
+        self.gold_standard_smap: Dict[str, EnhancedSMAPNotes] = SharedMapping(
+            self.store, 'gold_standard_smap', cache=get_shm_cache() if self.store.shared else None)
+        self.fact_indexes: Dict[str, NumericFactIndex] = SharedMapping(self.store, 'fact_indexes')
+        
+        # Per-worker projections of the shared learning event stream
+        self.session_index = StudentSessionIndex()
+        self.progress = ProgressEngine()
+        self.leaderboards = LeaderboardService()
+        self.events = EventLog(self.store, 'learning_events', self._apply_event,
+                               snapshot=self._projections, restore=self._restore_projections)
+        self.events.catch_up()
+        
+        log.info("education_service_initialized", shared_state=self.store.shared)
+    
+    def save_session(self, session: LearningSession):
+        """Write a changed session back to the state store"""
+        self.sessions[session.session_id] = session
+    
+    @staticmethod
+    def _session_event(kind: str, session: LearningSession, **details) -> Dict[str, Any]:
+        """A learning event with the session fields the projections need, not the whole session"""
+        return {'event': kind, 'session': {name: getattr(session, name) for name in SESSION_EVENT_FIELDS}, **details}
+    
+    def _apply_event(self, event: Dict[str, Any]):
+        """Fold one learning event into this worker's index, progress and leaderboards"""
+        session = LearningSession(**event['session'])
+        if event['event'] == 'session_started':
+            self.session_index.add(session)
+        elif event['event'] == 'session_graded':
+            self.session_index.record_completion(session)
+            progress = self.progress.record(ProgressEvent(
+                student_id=session.student_id,
+                session_id=session.session_id,
+                occurred_at=session.completed_at or datetime.now().isoformat(),
+                overall_score=session.overall_score,
+                section_scores=session.scores
+            ))
+            standing = SimpleNamespace(**event['student'], total_sessions=progress.completed)
+            self.leaderboards.record(standing, session, progress.overall.mean)
+    
+    def _projections(self) -> Dict[str, Any]:
+        return {'session_index': self.session_index, 'progress': self.progress, 'leaderboards': self.leaderboards}
+    
+    def _restore_projections(self, state: Dict[str, Any]):
+        self.session_index = state['session_index']
+        self.progress = state['progress']
+        self.leaderboards = state['leaderboards']
+    
+    @staticmethod
+    def _sync_student_progress(student: StudentProfile, progress):
+        student.total_sessions = progress.completed
+        student.total_score = progress.overall.mean
+        student.streak_days = progress.current_streak
+        student.last_active = progress.last_active
+        student.skill_levels.update(progress.skill_levels)
     
     def authenticate_student(self, email: str, name: str = None) -> StudentProfile:
         """Authenticate student with .edu account (simulated)"""
@@ -118,10 +297,10 @@ class EducationService:
         if student_id in self.students:
             student = self.students[student_id]
             student.last_active = datetime.now().isoformat()
-            print(f"👨‍🎓 Welcome back, {student.name}!")
-            print(f"   📊 Total sessions: {student.total_sessions}")
-            print(f"   🏆 Average score: {student.total_score:.1f}")
-            print(f"   🔥 Learning streak: {student.streak_days} days")
+            self.students[student_id] = student
+            log.info("student_authenticated", student_id=student_id, returning=True,
+                     total_sessions=student.total_sessions, average_score=round(student.total_score, 1),
+                     streak_days=student.streak_days)
         else:
             # Create new student profile
             university = email.split('@')[1].replace('.edu', '').title()
@@ -135,28 +314,31 @@ class EducationService:
                 created_at=datetime.now().isoformat()
             )
             self.students[student_id] = student
-            print(f"🎉 Welcome to 10Q Notes AI, {student.name}!")
-            print(f"   🏛️ University: {student.university}")
-            print(f"   📚 Ready to start your finance learning journey!")
+            log.info("student_authenticated", student_id=student_id, returning=False,
+                     university=student.university)
         
         return student
     
+    @track_stage('start_learning_session')
     def start_learning_session(self, student: StudentProfile, company_name: str, ticker: str, 
                              filing_text: str, filing_type: str = "10-Q", 
                              filing_period: str = "Q1 2025") -> LearningSession:
         """Start a new learning session for a student"""
         
-        session_id = str(uuid.uuid4())[:8]
+        session_id = str(uuid.uuid4())
         
-        print(f"\n📚 Starting New Learning Session")
-        print(f"   👨‍🎓 Student: {student.name}")
-        print(f"   🏢 Company: {company_name} ({ticker})")
-        print(f"   📋 Filing: {filing_type} - {filing_period}")
+        log.info("learning_session_starting", session_id=session_id, student_id=student.student_id,
+                 ticker=ticker, filing_type=filing_type, filing_period=filing_period)
         
-        # Generate gold standard SMAP using enhanced Gemini
-        print("🤖 Generating AI Gold Standard SMAP...")
-        enhanced_smap = self.gemini_service.generate_enhanced_smap_notes(filing_text)
-        self.gold_standard_smap[session_id] = enhanced_smap
+        # Generate gold standard SMAP using enhanced Gemini; one combined call once over budget
+        with usage_scope(session_id=session_id, student_id=student.student_id,
+                         filing=LeaderboardService.filing_key(ticker, filing_period)):
+            single_call = True if usage_ledger.degrade('llm', 'single_call_smap') else None
+            # A class uploading the same filing at once shares one generation (usage is charged to the leader)
+            enhanced_smap = self.smap_flight.do(content_key(filing_text, bool(single_call)),
+                                                self.gemini_service.generate_enhanced_smap_notes,
+                                                filing_text, single_call=single_call)
+        self._store_gold_standard(session_id, enhanced_smap, filing_text)
         
         # Create learning session
         session = LearningSession(
@@ -169,23 +351,43 @@ class EducationService:
             started_at=datetime.now().isoformat()
         )
         
-        self.sessions[session_id] = session
+        self._register_session(session)
         
-        print(f"✅ Learning session created: {session_id}")
-        print(f"🎯 Ready to begin interactive learning experience")
+        log.info("learning_session_started", session_id=session_id, student_id=student.student_id)
         
         return session
     
+    def _register_session(self, session: LearningSession):
+        self.sessions[session.session_id] = session
+        self.events.publish(self._session_event('session_started', session))
+    
+    def _store_gold_standard(self, session_id: str, enhanced_smap: EnhancedSMAPNotes, filing_text: str):
+        """Keep the session's gold standard and index the filing's reported numbers"""
+        
+        self.gold_standard_smap[session_id] = enhanced_smap
+        self.fact_indexes[session_id] = NumericFactIndex.from_filing(
+            enhanced_smap.financial_metrics,
+            self.document_processor.extract_financial_tables(filing_text)
+        )
+        log.debug("filing_figures_indexed", session_id=session_id, figures=len(self.fact_indexes[session_id]))
+        
+        # Ingest into the analytics store that backs benchmarks and history
+        self.snowflake_service.store_enhanced_smap_notes(enhanced_smap, filing_text)
+    
+    def check_metrics(self, session_id: str, metrics_text: str) -> Dict[str, Any]:
+        """Verify the numbers a student quotes against the filing, without an LLM call"""
+        
+        fact_index = self.fact_indexes.get(session_id)
+        if fact_index is None:
+            fact_index = NumericFactIndex.from_filing(self.gold_standard_smap[session_id].financial_metrics)
+        return fact_index.verify(metrics_text).to_dict()
+    
     def enter_learn_mode(self, session_id: str) -> Dict[str, Any]:
         """Enter Learn Mode - read and understand the filing with AI assistance"""
         
         session = self.sessions[session_id]
         enhanced_smap = self.gold_standard_smap[session_id]
         
-        print(f"\n📖 LEARN MODE - {enhanced_smap.company_name}")
-        print("🎯 Interactive Learning with AI Assistance")
-        print("-" * 50)
-        
         # Create learning content with simplified explanations
         learn_content = {
             'session_id': session_id,
@@ -197,50 +399,8 @@ class EducationService:
                 'period': enhanced_smap.filing_period
             },
             'sections': {
-                'subjective': {
-                    'title': 'Subjective (S) - What Management Said',
-                    'explanation': 'This section captures the narrative and tone from management, including strategic priorities and forward-looking statements.',
-                    'content': enhanced_smap.subjective,
-                    'key_concepts': ['Management tone', 'Strategic priorities', 'Forward guidance', 'Qualitative insights'],
-                    'hover_definitions': {
-                        'fortress balance sheet': 'Strong financial position with high capital levels',
-                        'operational efficiency': 'How well the company uses resources to generate profits',
-                        'regulatory headwinds': 'Government policy changes that may hurt business'
-                    }
-                },
-                'metrics': {
-                    'title': 'Metrics (M) - Key Financial Numbers',
-                    'explanation': 'Hard numbers, ratios, and financial data extracted directly from the filing.',
-                    'content': enhanced_smap.metrics,
-                    'key_concepts': ['Revenue growth', 'Profitability ratios', 'Balance sheet strength', 'Per-share metrics'],
-                    'hover_definitions': {
-                        'ROE': 'Return on Equity - measures how efficiently the company uses shareholder money',
-                        'CET1 ratio': 'Common Equity Tier 1 - bank\'s core capital as % of risk-weighted assets',
-                        'NIM': 'Net Interest Margin - spread between interest earned and paid by a bank'
-                    }
-                },
-                'assessment': {
-                    'title': 'Assessment (A) - What It All Means',
-                    'explanation': 'AI interprets the numbers and narrative to identify trends, strengths, and concerns.',
-                    'content': enhanced_smap.assessment,
-                    'key_concepts': ['Trend analysis', 'Competitive positioning', 'Risk factors', 'Growth drivers'],
-                    'hover_definitions': {
-                        'operating leverage': 'When revenue grows faster than expenses, boosting profits',
-                        'credit provisions': 'Money set aside for potential loan losses',
-                        'market share': 'Company\'s portion of total industry sales'
-                    }
-                },
-                'plan': {
-                    'title': 'Plan (P) - Recommended Next Steps',
-                    'explanation': 'Specific actionable recommendations for investors, analysts, or advisors.',
-                    'content': enhanced_smap.plan,
-                    'key_concepts': ['Monitoring priorities', 'Investment decisions', 'Risk management', 'Action items'],
-                    'hover_definitions': {
-                        'valuation multiple': 'Ratio comparing company price to financial metrics',
-                        'peer analysis': 'Comparing performance to similar companies',
-                        'catalyst': 'Event that could significantly impact stock price'
-                    }
-                }
+                section: self._learn_section(section, getattr(enhanced_smap, section))
+                for section in LEARN_SECTION_GUIDES
             },
             'progress_status': {
                 'sections_available': 4,
@@ -252,22 +412,109 @@ class EducationService:
         # Update session
         session.current_mode = 'learn'
         session.status = 'learning'
+        self.save_session(session)
         
-        print("📚 Learn Mode content prepared")
-        print("💡 Hover definitions and explanations available")
+        log.info("learn_mode_entered", session_id=session_id, ticker=enhanced_smap.ticker_symbol)
         
         return learn_content
     
+    def _learn_section(self, section: str, content: str) -> Dict[str, Any]:
+        """Learn Mode payload for one SMAP section: guidance plus the AI-generated content"""
+        guide = LEARN_SECTION_GUIDES[section]
+        return {
+            'title': guide['title'],
+            'explanation': guide['explanation'],
+            'content': content,
+            'key_concepts': guide['key_concepts'],
+            'hover_definitions': guide['hover_definitions']
+        }
+    
+    def start_learning_session_stream(self, student: StudentProfile, company_name: str, ticker: str,
+                                      filing_text: str, filing_type: str = "10-Q",
+                                      filing_period: str = "Q1 2025") -> Iterator[Dict[str, Any]]:
+        """Start a learning session while streaming Learn Mode sections as they are generated
+        
+        Yields a 'session' event immediately, a 'section' event per completed SMAP section,
+        and a 'complete' event once the gold standard is stored and Learn Mode is ready.
+        """
+        
+        session = LearningSession(
+            session_id=str(uuid.uuid4()),
+            student_id=student.student_id,
+            company_name=company_name,
+            ticker=ticker,
+            filing_type=filing_type,
+            filing_period=filing_period,
+            status='learning',
+            started_at=datetime.now().isoformat()
+        )
+        
+        log.info("learning_session_starting", session_id=session.session_id, student_id=student.student_id,
+                 ticker=ticker, filing_type=filing_type, filing_period=filing_period, streaming=True)
+        
+        yield {'event': 'session', 'data': {'session_id': session.session_id, 'status': session.status}}
+        
+        scope = dict(session_id=session.session_id, student_id=student.student_id,
+                     filing=LeaderboardService.filing_key(ticker, filing_period))
+        with usage_scope(**scope):
+            single_call = usage_ledger.degrade('llm', 'single_call_smap')
+            if single_call:
+                # Over budget: the same combined call as start_learning_session, replayed as section events
+                enhanced_smap = self.smap_flight.do(content_key(filing_text, True),
+                                                    self.gemini_service.generate_enhanced_smap_notes,
+                                                    filing_text, single_call=True)
+        leader = False
+        if single_call:
+            events = self._notes_events(enhanced_smap)
+        else:
+            # Uploads of the same filing share one generation: the first streams it, the rest replay its notes
+            key = content_key(filing_text, False)
+            leader, call = self.smap_flight.claim(key)
+            if leader:
+                events = scoped_iter(self.gemini_service.stream_enhanced_smap_notes(filing_text), **scope)
+            else:
+                events = self._notes_events(self.smap_flight.wait(call))
+        try:
+            for event in events:
+                if event['event'] == 'section':
+                    yield {
+                        'event': 'section',
+                        'data': {
+                            'section': event['section'],
+                            **self._learn_section(event['section'], event['content'])
+                        }
+                    }
+                elif event['event'] == 'complete':
+                    if leader:
+                        self.smap_flight.resolve(key, call, result=event['notes'])
+                    self._store_gold_standard(session.session_id, event['notes'], filing_text)
+                    self._register_session(session)
+                    
+                    log.info("learning_session_started", session_id=session.session_id,
+                             student_id=student.student_id, streaming=True)
+                    yield {'event': 'complete', 'data': self.enter_learn_mode(session.session_id)}
+        except Exception as e:
+            if leader:
+                self.smap_flight.resolve(key, call, error=e)
+            raise
+        finally:
+            if leader:
+                # No-op once resolved; otherwise the client left mid-stream, so release the followers
+                self.smap_flight.resolve(key, call, error=RuntimeError("SMAP generation stream was abandoned"))
+    
+    @staticmethod
+    def _notes_events(enhanced_smap: EnhancedSMAPNotes) -> Iterator[Dict[str, Any]]:
+        """Stream events for notes that are already generated"""
+        for section in LEARN_SECTION_GUIDES:
+            yield {'event': 'section', 'section': section, 'content': getattr(enhanced_smap, section)}
+        yield {'event': 'complete', 'notes': enhanced_smap}
+    
     def enter_practice_mode(self, session_id: str) -> Dict[str, Any]:
         """Enter Practice Mode - student writes their own SMAP notes"""
         
         session = self.sessions[session_id]
         enhanced_smap = self.gold_standard_smap[session_id]
         
-        print(f"\n✍️ PRACTICE MODE - {enhanced_smap.company_name}")
-        print("🎯 Write Your Own SMAP Notes")
-        print("-" * 50)
-        
         practice_content = {
             'session_id': session_id,
             'mode': 'practice',
@@ -314,9 +561,9 @@ class EducationService:
         # Update session
         session.current_mode = 'practice'
         session.status = 'practicing'
+        self.save_session(session)
         
-        print("✍️ Practice Mode initialized")
-        print("📝 Student ready to write SMAP notes")
+        log.info("practice_mode_entered", session_id=session_id, ticker=enhanced_smap.ticker_symbol)
         
         return practice_content
     
@@ -326,70 +573,85 @@ class EducationService:
         session = self.sessions[session_id]
         enhanced_smap = self.gold_standard_smap[session_id]
         
-        print(f"\n🎯 FEEDBACK MODE - Analyzing Student Work")
-        print(f"   ✍️ Student: {self.students[session.student_id].name}")
-        print(f"   📊 Company: {enhanced_smap.company_name}")
+        # Save student work; it stays a draft if grading fails
+        session.student_smap = student_smap
+        self.save_session(session)
+        
+        # Generate comprehensive feedback using Gemini (raises GradingUnavailable, recording nothing)
+        feedback_results = self._generate_detailed_feedback(
+            student_smap, enhanced_smap, self.fact_indexes.get(session_id)
+        )
+        self._record_feedback(session, feedback_results)
         
-        # Save student work
+        log.info("submission_graded", session_id=session_id, student_id=session.student_id,
+                 overall_score=round(session.overall_score, 1))
+        
+        return feedback_results
+    
+    def record_graded_work(self, session_id: str, student_smap: Dict[str, str],
+                           feedback_score: FeedbackScore) -> Dict[str, Any]:
+        """Apply a grade computed elsewhere (e.g. instructor batch grading) to a session"""
+        
+        session = self.sessions[session_id]
         session.student_smap = student_smap
         
-        # Generate comprehensive feedback using Gemini
-        feedback_results = self._generate_detailed_feedback(student_smap, enhanced_smap)
+        metric_checks = self.check_metrics(session_id, student_smap.get('metrics', ''))['feedback']
+        feedback_results = self._feedback_results(feedback_score, metric_checks)
+        self._record_feedback(session, feedback_results)
+        
+        return feedback_results
+    
+    def _record_feedback(self, session: LearningSession, feedback_results: Dict[str, Any]):
+        """Store feedback on the session and update the student's progress"""
         
-        # Update session with results
         session.scores = feedback_results['section_scores']
         session.overall_score = feedback_results['overall_score']
         session.feedback = feedback_results['feedback']
         session.current_mode = 'feedback'
+        
+        if feedback_results['provisional']:
+            # Shown to the student, but not a final grade: no progress, streak or leaderboard update
+            session.status = 'provisional'
+            self.save_session(session)
+            return
+        
         session.status = 'completed'
         session.completed_at = datetime.now().isoformat()
+        self.save_session(session)
         
         # Update student progress
         self._update_student_progress(session.student_id, session)
-        
-        print(f"📊 Feedback generated - Overall Score: {session.overall_score:.1f}/100")
-        
-        return feedback_results
     
     def _generate_detailed_feedback(self, student_smap: Dict[str, str], 
-                                  gold_standard: EnhancedSMAPNotes) -> Dict[str, Any]:
+                                  gold_standard: EnhancedSMAPNotes,
+                                  fact_index: NumericFactIndex = None) -> Dict[str, Any]:
         """Generate detailed educational feedback using Gemini"""
         
-        # Create student SMAP object for comparison
-        from gemini_service import SMAPNotes
-        student_smap_obj = SMAPNotes(
-            subjective=student_smap.get('subjective', ''),
-            metrics=student_smap.get('metrics', ''),
-            assessment=student_smap.get('assessment', ''),
-            plan=student_smap.get('plan', ''),
-            company_name=gold_standard.company_name,
-            filing_type=gold_standard.filing_type
-        )
+        if fact_index is None:
+            fact_index = NumericFactIndex.from_filing(gold_standard.financial_metrics)
         
-        # Generate educational feedback (simplified for demo)
-        # In production, would use enhanced Gemini feedback
-        feedback_score = type('FeedbackScore', (), {
-            'completeness': 85,
-            'accuracy': 88,
-            'insight_depth': 75,
-            'clarity': 92,
-            'overall_score': 85,
-            'feedback_comments': [
-                "Excellent work capturing key financial metrics and management tone",
-                "Good analysis of the fortress balance sheet strategy and its implications"
-            ],
-            'suggestions': [
-                "Include more specific discussion of credit provision trends",
-                "Connect the efficiency ratio improvement to operational performance"
-            ]
-        })()
+        # Grade with Gemini against the gold standard (cached, concurrency-bounded)
+        try:
+            feedback_score = self.grader.grade(student_smap, gold_standard, fact_index)
+        except GradingUnavailable:
+            raise
+        except Exception as e:
+            log.warning("ai_grading_unavailable", error=str(e))
+            raise GradingUnavailable(f"AI grading failed: {e}") from e
+        
+        metric_checks = fact_index.verify(student_smap.get('metrics', '')).feedback()
+        return self._feedback_results(feedback_score, metric_checks)
+    
+    def _feedback_results(self, feedback_score: FeedbackScore,
+                          metric_checks: List[str] = None) -> Dict[str, Any]:
+        """Turn a grader FeedbackScore into the educational feedback format"""
         
         # Process into educational format
         section_scores = {
-            'subjective': feedback_score.completeness if feedback_score.completeness > 0 else 75,
-            'metrics': feedback_score.accuracy if feedback_score.accuracy > 0 else 80,
-            'assessment': feedback_score.insight_depth if feedback_score.insight_depth > 0 else 70,
-            'plan': feedback_score.clarity if feedback_score.clarity > 0 else 85
+            'subjective': feedback_score.completeness,
+            'metrics': feedback_score.accuracy,
+            'assessment': feedback_score.insight_depth,
+            'plan': feedback_score.clarity
         }
         
         overall_score = sum(section_scores.values()) / len(section_scores)
@@ -397,11 +659,9 @@ class EducationService:
         feedback_results = {
             'overall_score': overall_score,
             'section_scores': section_scores,
+            'provisional': feedback_score.provisional,
             'feedback': {
-                'strengths': feedback_score.feedback_comments[:2] if feedback_score.feedback_comments else [
-                    "Good structure following the SMAP framework",
-                    "Clear writing style that's easy to understand"
-                ],
+                'strengths': feedback_score.feedback_comments[:2],
                 'improvements': feedback_score.suggestions[:2] if feedback_score.suggestions else [
                     "Include more specific financial metrics and ratios",
                     "Connect your assessment more directly to the metrics"
@@ -410,7 +670,9 @@ class EducationService:
                     "Practice identifying key financial ratios in earnings reports",
                     "Work on connecting qualitative insights to quantitative data",
                     "Try analyzing a different industry to broaden your skills"
-                ]
+                ],
+                'metric_checks': metric_checks or [],
+                'notice': PROVISIONAL_NOTICE if feedback_score.provisional else None
             },
             'skill_development': {
                 'narrative_summarization': min(10, max(1, section_scores['subjective'] // 10)),
@@ -423,47 +685,26 @@ class EducationService:
         return feedback_results
     
     def _update_student_progress(self, student_id: str, session: LearningSession):
-        """Update student's overall learning progress"""
+        """Record the graded session as a progress event and sync the student's profile"""
         
         student = self.students[student_id]
+        self.events.publish(self._session_event(
+            'session_graded', session,
+            student={'student_id': student.student_id, 'name': student.name, 'university': student.university}))
         
-        # Update session count and average score
-        student.total_sessions += 1
-        if student.total_score == 0:
-            student.total_score = session.overall_score
-        else:
-            student.total_score = (student.total_score + session.overall_score) / 2
-        
-        # Update streak (simplified logic)
-        student.streak_days += 1
-        student.last_active = datetime.now().isoformat()
-        
-        # Update skill levels based on session performance
-        for skill, level in session.scores.items():
-            if skill in student.skill_levels:
-                current_level = student.skill_levels[skill]
-                # Gradual skill improvement based on performance
-                if level >= 85:
-                    student.skill_levels[skill] = min(10, current_level + 1)
-                elif level >= 70:
-                    student.skill_levels[skill] = current_level  # maintain
-                else:
-                    student.skill_levels[skill] = max(1, current_level - 0.5)
+        # The profile follows from the event log, so every worker derives the same one
+        self._sync_student_progress(student, self.progress.progress(student_id))
+        self.students[student_id] = student
     
     def generate_earnings_call_experience(self, session_id: str) -> Dict[str, Any]:
         """Generate immersive earnings call experience with voice synthesis"""
         
         enhanced_smap = self.gold_standard_smap[session_id]
         
-        print(f"\n🎙️ EARNINGS CALL EXPERIENCE")
-        print(f"   🏢 {enhanced_smap.company_name}")
-        print(f"   🎤 Simulated Management & Analyst Voices")
-        
         # Generate earnings call with voice agent
         earnings_call = self.voice_agent.create_earnings_call_experience(enhanced_smap)
         
-        print("✅ Interactive earnings call experience ready")
-        print("🎧 Audio content available for immersive learning")
+        log.info("earnings_call_prepared", session_id=session_id, ticker=enhanced_smap.ticker_symbol)
         
         return earnings_call
     
@@ -471,10 +712,12 @@ class EducationService:
         """Generate student progress dashboard"""
         
         student = self.students[student_id]
-        student_sessions = [s for s in self.sessions.values() if s.student_id == student_id]
+        self.events.catch_up()
         
-        # Calculate progress metrics
-        completed_sessions = [s for s in student_sessions if s.status == 'completed']
+        # Indexed lookups: O(k) in this student's own history; current status from the store
+        session_stats = self.session_index.aggregates(student_id)
+        recent_sessions = [self.sessions.get(s.session_id, s) for s in self.session_index.recent(student_id, 5)]
+        progress = self.progress.summary(student_id)
         
         dashboard = {
             'student_info': {
@@ -484,9 +727,12 @@ class EducationService:
                 'year': student.year
             },
             'progress_summary': {
-                'total_sessions': len(completed_sessions),
+                'total_sessions': session_stats['completed'],
                 'average_score': student.total_score,
-                'learning_streak': student.streak_days,
+                'best_score': session_stats['best_score'],
+                'learning_streak': progress['current_streak'],
+                'longest_streak': progress['longest_streak'],
+                'score_std': progress['score_std'],
                 'last_active': student.last_active
             },
             'skill_levels': student.skill_levels,
@@ -497,38 +743,14 @@ class EducationService:
                     'date': s.completed_at[:10] if s.completed_at else s.started_at[:10],
                     'status': s.status
                 }
-                for s in sorted(student_sessions, key=lambda x: x.started_at, reverse=True)[:5]
+                for s in recent_sessions
             ],
-            'achievements': self._calculate_achievements(student, completed_sessions),
+            'achievements': self.progress.progress(student_id).achievements,
             'next_recommendations': self._generate_learning_recommendations(student)
         }
         
         return dashboard
     
-    def _calculate_achievements(self, student: StudentProfile, completed_sessions: List[LearningSession]) -> List[Dict[str, str]]:
-        """Calculate student achievements and badges"""
-        
-        achievements = []
-        
-        if len(completed_sessions) >= 1:
-            achievements.append({'title': 'First Analysis', 'description': 'Completed your first SMAP analysis', 'icon': '🎉'})
-        
-        if len(completed_sessions) >= 5:
-            achievements.append({'title': 'Analyst in Training', 'description': 'Completed 5 financial analyses', 'icon': '📊'})
-        
-        if student.total_score >= 85:
-            achievements.append({'title': 'Expert Analyst', 'description': 'Maintaining 85+ average score', 'icon': '🏆'})
-        
-        if student.streak_days >= 7:
-            achievements.append({'title': 'Consistent Learner', 'description': '7-day learning streak', 'icon': '🔥'})
-        
-        high_skills = [skill for skill, level in student.skill_levels.items() if level >= 8]
-        if high_skills:
-            achievements.append({'title': f'Expert in {high_skills[0].replace("_", " ").title()}', 
-                               'description': 'Mastered advanced skill level', 'icon': '⭐'})
-        
-        return achievements
-    
     def _generate_learning_recommendations(self, student: StudentProfile) -> List[str]:
         """Generate personalized learning recommendations"""
         
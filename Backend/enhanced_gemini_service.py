@@ -9,15 +9,24 @@ Enhanced Gemini service for MLH "Best Use of Gemini API" prize:
 """
 
 import os
-import json
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, asdict, fields
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from llm_resilience import ResilientCaller, RetryPolicy, Deadline
+from instrumentation import track_stage
+from tracing import set_attributes
+from structured_logging import get_logger
+from json_extraction import extract_json_from_stream, parse_into_dataclass
+from prompt_cache import PromptPrefixCache
+from usage_accounting import ledger as usage_ledger
+
 # Load environment variables
 load_dotenv()
 
+log = get_logger(__name__)
+
 @dataclass
 class FinancialMetrics:
     """Structured financial metrics for Snowflake storage"""
@@ -89,6 +98,67 @@ class EnhancedSMAPNotes:
     industry: str = ""
     market_cap_category: str = ""  # Large Cap, Mid Cap, etc.
 
+# JSON schema for single-call mode: SMAP text, metadata and all structured data in one response.
+# Gemini response schemas cannot express free-form maps, so segments come back as a list.
+_NULLABLE_NUMBER = {"type": "number", "nullable": True}
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+SMAP_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "company": {
+            "type": "object",
+            "properties": {
+                "company_name": {"type": "string"},
+                "ticker": {"type": "string"},
+                "filing_type": {"type": "string"},
+                "quarter_year": {"type": "string"},
+                "industry": {"type": "string"}
+            },
+            "required": ["company_name", "ticker", "filing_type", "quarter_year", "industry"]
+        },
+        "smap": {
+            "type": "object",
+            "properties": {
+                "subjective": {"type": "string"},
+                "metrics": {"type": "string"},
+                "assessment": {"type": "string"},
+                "plan": {"type": "string"}
+            },
+            "required": ["subjective", "metrics", "assessment", "plan"]
+        },
+        "financial_metrics": {
+            "type": "object",
+            "properties": {
+                **{f.name: _NULLABLE_NUMBER for f in fields(FinancialMetrics)
+                   if f.name not in ('quarter', 'year', 'filing_date')},
+                "quarter": {"type": "string", "nullable": True},
+                "year": {"type": "integer", "nullable": True},
+                "filing_date": {"type": "string", "nullable": True}
+            }
+        },
+        "risk_factors": {
+            "type": "object",
+            "properties": {f.name: _STRING_LIST for f in fields(RiskFactors)},
+            "required": [f.name for f in fields(RiskFactors)]
+        },
+        "business_segments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "revenue": _NULLABLE_NUMBER,
+                    "net_income": _NULLABLE_NUMBER,
+                    "assets": _NULLABLE_NUMBER
+                },
+                "required": ["name"]
+            }
+        }
+    },
+    "required": ["company", "smap", "financial_metrics", "risk_factors", "business_segments"]
+}
+
 class EnhancedGeminiService:
     """Enhanced Gemini service for advanced financial extraction"""
     
@@ -101,22 +171,93 @@ class EnhancedGeminiService:
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-2.5-pro')
         
-        print("✅ Enhanced Gemini API service initialized")
-        print("🎯 Ready for advanced financial data extraction")
-    
-    def extract_structured_metrics(self, filing_text: str) -> FinancialMetrics:
-        """Extract structured financial metrics using advanced Gemini prompting"""
+        # Retries, backoff, deadline budget and hedging for every model call
+        self.retry_policy = RetryPolicy.from_env()
+        self.caller = ResilientCaller(self.retry_policy)
+        
+        # Single-call mode asks for SMAP + all structured data in one schema-constrained response
+        self.single_call_mode = os.getenv('GEMINI_SINGLE_CALL', 'false').lower() in ('1', 'true', 'yes')
         
-        prompt = f"""
-        You are a expert financial data analyst. Extract specific financial metrics from this SEC filing.
+        # The filing goes in a stable shared prefix, context-cached when large enough
+        self.prompt_cache = PromptPrefixCache(self.model.model_name)
+        
+        log.info("enhanced_gemini_initialized", model=self.model.model_name, single_call=self.single_call_mode)
+    
+    def _filing_prefix(self, filing_text: str) -> str:
+        """Shared prompt prefix carrying the filing; identical for every call on the same filing"""
+        return f"""
+        You are an expert financial analyst. All instructions below refer to this SEC filing.
         
         SEC Filing Text:
-        {filing_text[:10000]}
+        {filing_text[:12000]}
+        """
+    
+    def _model_and_prompt(self, prompt: str, prefix: Optional[str]):
+        """Resolve the model and full prompt, reusing a cached prefix when one is given"""
+        if prefix is None:
+            return self.model, prompt
+        cached_model, full_prompt = self.prompt_cache.prepare(prefix, prompt)
+        return cached_model or self.model, full_prompt
+    
+    def _generate(self, prompt: str, key: str, parse=None, deadline: Optional[Deadline] = None,
+                  generation_config: Optional[Dict[str, Any]] = None, prefix: Optional[str] = None):
+        """Call Gemini through the resilient caller (retries, backoff, deadline, hedging)"""
+        def call():
+            model, full_prompt = self._model_and_prompt(prompt, prefix)
+            response = model.generate_content(full_prompt, generation_config=generation_config)
+            set_attributes(**{'gen_ai.prompt_chars': len(full_prompt)})
+            usage_ledger.record_llm(response, getattr(model, 'model_name', None))
+            return response
+        
+        return self.caller.call(call, key=key, parse=parse, deadline=deadline)
+    
+    def _generate_json(self, prompt: str, key: str, build=None, deadline: Optional[Deadline] = None,
+                       generation_config: Optional[Dict[str, Any]] = None, root: str = '{',
+                       prefix: Optional[str] = None):
+        """Stream a Gemini response, stop reading at the first complete JSON value and build it
+        
+        build validates the decoded payload (e.g. into a dataclass); a payload that fails
+        validation counts as a failed attempt and is retried by the resilient caller.
+        """
+        def stream_json():
+            model, full_prompt = self._model_and_prompt(prompt, prefix)
+            response = model.generate_content(full_prompt, generation_config=generation_config, stream=True)
+            set_attributes(**{'gen_ai.prompt_chars': len(full_prompt), 'gen_ai.streaming': True})
+            payload = extract_json_from_stream((chunk.text for chunk in response), root=root)
+            usage_ledger.record_llm(response, getattr(model, 'model_name', None))
+            return payload
+        
+        return self.caller.call(stream_json, key=key, parse=build, deadline=deadline)
+    
+    def _build_financial_metrics(self, data: Dict[str, Any]) -> FinancialMetrics:
+        """Validate a JSON payload into FinancialMetrics, dropping unknown keys and bad values"""
+        return parse_into_dataclass(data, FinancialMetrics)
+    
+    def _build_risk_factors(self, data: Dict[str, Any]) -> RiskFactors:
+        """Validate a JSON payload into RiskFactors, defaulting missing categories to []"""
+        return parse_into_dataclass(data, RiskFactors)
+    
+    def _build_business_segments(self, data: Any) -> BusinessSegments:
+        """Validate segment data given either as {"segments": {name: {...}}} or a list of named rows"""
+        if isinstance(data, dict):
+            data = data.get('segments', {})
+        if isinstance(data, list):
+            data = {
+                row['name']: {metric: value for metric, value in row.items() if metric != 'name'}
+                for row in data if isinstance(row, dict) and row.get('name')
+            }
+        return parse_into_dataclass({'segments': data}, BusinessSegments)
+    
+    def extract_structured_metrics(self, filing_text: str, deadline: Optional[Deadline] = None) -> FinancialMetrics:
+        """Extract structured financial metrics using advanced Gemini prompting"""
+        
+        prompt = """
+        TASK: Extract specific financial metrics from the SEC filing above.
         
         Extract the following financial metrics and return as JSON. Use null for any metric not found.
         Be very precise with numbers - include decimal places where provided.
         
-        {{
+        {
             "total_revenue": [revenue in millions, as number],
             "revenue_yoy_growth": [year-over-year growth percentage as decimal, e.g. 0.068 for 6.8%],
             "net_income": [net income in millions],
@@ -138,96 +279,76 @@ class EnhancedGeminiService:
             "quarter": ["Q1", "Q2", "Q3", "Q4"],
             "year": [year as integer, e.g. 2025],
             "filing_date": ["YYYY-MM-DD format if available"]
-        }}
+        }
         
         Return ONLY valid JSON, no other text.
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON response
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            metrics_data = json.loads(response_text)
-            return FinancialMetrics(**metrics_data)
+            return self._generate_json(
+                prompt, key='financial_metrics', build=self._build_financial_metrics, deadline=deadline,
+                prefix=self._filing_prefix(filing_text)
+            )
             
         except Exception as e:
-            print(f"Error extracting financial metrics: {e}")
+            log.error("extraction_failed", stage='financial_metrics', error=str(e))
             return FinancialMetrics()
     
-    def extract_risk_factors(self, filing_text: str) -> RiskFactors:
+    def extract_risk_factors(self, filing_text: str, deadline: Optional[Deadline] = None) -> RiskFactors:
         """Extract and categorize risk factors from SEC filing"""
         
-        prompt = f"""
-        Extract and categorize risk factors from this SEC filing into specific categories.
-        
-        Filing Text:
-        {filing_text[:8000]}
+        prompt = """
+        TASK: Extract and categorize risk factors from the SEC filing above into specific categories.
         
         Categorize risks into these specific buckets and return as JSON:
         
-        {{
+        {
             "credit_risk": ["list of credit-related risks"],
             "market_risk": ["list of market/economic risks"],
             "operational_risk": ["list of operational/technology risks"],
             "regulatory_risk": ["list of regulatory/compliance risks"],
             "strategic_risk": ["list of strategic/competitive risks"],
             "other_risks": ["any other significant risks"]
-        }}
+        }
         
         Each risk should be a concise 1-2 sentence description.
         Return ONLY valid JSON, no other text.
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON response
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            risk_data = json.loads(response_text)
-            return RiskFactors(**risk_data)
+            return self._generate_json(
+                prompt, key='risk_factors', build=self._build_risk_factors, deadline=deadline,
+                prefix=self._filing_prefix(filing_text)
+            )
             
         except Exception as e:
-            print(f"Error extracting risk factors: {e}")
+            log.error("extraction_failed", stage='risk_factors', error=str(e))
             return RiskFactors(
                 credit_risk=[], market_risk=[], operational_risk=[],
                 regulatory_risk=[], strategic_risk=[], other_risks=[]
             )
     
-    def extract_business_segments(self, filing_text: str) -> BusinessSegments:
+    def extract_business_segments(self, filing_text: str, deadline: Optional[Deadline] = None) -> BusinessSegments:
         """Extract business segment performance data"""
         
-        prompt = f"""
-        Extract business segment financial performance from this SEC filing.
-        
-        Filing Text:
-        {filing_text[:8000]}
+        prompt = """
+        TASK: Extract business segment financial performance from the SEC filing above.
         
         Return segment data as JSON in this format:
         
-        {{
-            "segments": {{
-                "Consumer & Community Banking": {{
+        {
+            "segments": {
+                "Consumer & Community Banking": {
                     "revenue": [revenue in millions],
                     "net_income": [net income in millions],
                     "assets": [assets in millions if available]
-                }},
-                "Corporate & Investment Bank": {{
+                },
+                "Corporate & Investment Bank": {
                     "revenue": [revenue in millions],
                     "net_income": [net income in millions]
-                }}
-            }}
-        }}
+                }
+            }
+        }
         
         Include all segments mentioned with their financial metrics.
         Use null for unavailable metrics.
@@ -235,35 +356,64 @@ class EnhancedGeminiService:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            # Clean JSON response
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            segment_data = json.loads(response_text)
-            return BusinessSegments(**segment_data)
+            return self._generate_json(
+                prompt, key='business_segments', build=self._build_business_segments, deadline=deadline,
+                prefix=self._filing_prefix(filing_text)
+            )
             
         except Exception as e:
-            print(f"Error extracting business segments: {e}")
+            log.error("extraction_failed", stage='business_segments', error=str(e))
             return BusinessSegments(segments={})
     
-    def generate_enhanced_smap_notes(self, filing_text: str) -> EnhancedSMAPNotes:
-        """Generate enhanced SMAP notes with structured data extraction"""
+    @track_stage('smap_generation')
+    def generate_enhanced_smap_notes(self, filing_text: str, single_call: Optional[bool] = None) -> EnhancedSMAPNotes:
+        """Generate enhanced SMAP notes with structured data extraction
+        
+        single_call overrides GEMINI_SINGLE_CALL: True requests everything in one
+        schema-constrained response, False uses the five-prompt pipeline.
+        """
+        
+        # One deadline budget covers every call in the pipeline
+        deadline = Deadline(self.retry_policy.pipeline_budget)
         
-        print("🤖 Generating enhanced SMAP notes with structured data extraction...")
+        if single_call if single_call is not None else self.single_call_mode:
+            try:
+                return self._generate_single_call_smap_notes(filing_text, deadline)
+            except Exception as e:
+                log.error("smap_generation_failed", mode='single_call', error=str(e))
+                return self._error_smap_notes()
         
         # Extract company metadata first
-        company_info = self._extract_company_metadata(filing_text)
+        company_info = self._extract_company_metadata(filing_text, deadline=deadline)
         
         # Generate traditional SMAP notes
-        smap_prompt = f"""
-        Generate comprehensive SMAP notes for this SEC filing:
+        smap_prompt = self._smap_prompt()
         
-        {filing_text[:12000]}
+        try:
+            # Generate SMAP content
+            smap_sections = self._generate(
+                smap_prompt, key='smap_notes', deadline=deadline,
+                parse=lambda response: self._require_smap_sections(response.text),
+                prefix=self._filing_prefix(filing_text)
+            )
+            
+            # Extract structured data
+            financial_metrics = self.extract_structured_metrics(filing_text, deadline=deadline)
+            risk_factors = self.extract_risk_factors(filing_text, deadline=deadline)
+            business_segments = self.extract_business_segments(filing_text, deadline=deadline)
+            
+            return self._assemble_smap_notes(
+                smap_sections, company_info, financial_metrics, risk_factors, business_segments
+            )
+            
+        except Exception as e:
+            log.error("smap_generation_failed", mode='pipeline', error=str(e))
+            return self._error_smap_notes()
+    
+    def _smap_prompt(self) -> str:
+        """Task prompt for the S/M/A/P section text (follows the filing prefix)"""
+        return """
+        TASK: Generate comprehensive SMAP notes for the SEC filing above:
         
         **SUBJECTIVE (S):**
         [Management tone, strategic priorities, forward-looking statements]
@@ -277,77 +427,98 @@ class EnhancedGeminiService:
         **PLAN (P):**
         [Specific actionable next steps for investors/analysts]
         """
+    
+    def _generate_single_call_smap_notes(self, filing_text: str, deadline: Deadline) -> EnhancedSMAPNotes:
+        """Request SMAP text, metadata and all structured data in one JSON-schema-constrained call"""
+        
+        prompt = """
+        TASK: Analyze the SEC filing above once and return every field of the requested JSON schema.
+        
+        - company: full company name, stock ticker, filing type (10-Q or 10-K), quarter and year (e.g. "Q1 2025"), industry sector
+        - smap.subjective: management tone, strategic priorities, forward-looking statements
+        - smap.metrics: key financial numbers, ratios, YoY changes
+        - smap.assessment: connect metrics to business performance, identify trends and risks
+        - smap.plan: specific actionable next steps for investors/analysts
+        - financial_metrics: amounts in millions; growth rates, margins and ratios as decimals
+          (e.g. 0.068 for 6.8%); null for any metric not found
+        - risk_factors: concise 1-2 sentence risks in each category
+        - business_segments: every segment with revenue, net income and assets in millions (null if unavailable)
+        """
         
-        try:
-            # Generate SMAP content
-            smap_response = self.model.generate_content(smap_prompt)
-            smap_sections = self._parse_smap_response(smap_response.text)
-            
-            # Extract structured data in parallel
-            print("📊 Extracting structured financial metrics...")
-            financial_metrics = self.extract_structured_metrics(filing_text)
-            
-            print("⚠️ Extracting risk factors...")
-            risk_factors = self.extract_risk_factors(filing_text)
-            
-            print("🏢 Extracting business segment data...")
-            business_segments = self.extract_business_segments(filing_text)
-            
-            return EnhancedSMAPNotes(
-                subjective=smap_sections.get('subjective', 'No subjective analysis generated'),
-                metrics=smap_sections.get('metrics', 'No metrics extracted'),
-                assessment=smap_sections.get('assessment', 'No assessment provided'),
-                plan=smap_sections.get('plan', 'No plan recommendations'),
-                financial_metrics=financial_metrics,
-                risk_factors=risk_factors,
-                business_segments=business_segments,
-                company_name=company_info.get('company_name', 'Unknown Company'),
-                ticker_symbol=company_info.get('ticker', 'N/A'),
-                filing_type=company_info.get('filing_type', 'SEC Filing'),
-                filing_period=company_info.get('quarter_year', 'N/A'),
-                industry=company_info.get('industry', 'Financial Services')
-            )
-            
-        except Exception as e:
-            print(f"Error generating enhanced SMAP notes: {e}")
-            return EnhancedSMAPNotes(
-                subjective="Error generating analysis",
-                metrics="Error extracting metrics",
-                assessment="Error in assessment",
-                plan="Error in planning",
-                financial_metrics=FinancialMetrics(),
-                risk_factors=RiskFactors([], [], [], [], [], []),
-                business_segments=BusinessSegments({}),
-                company_name="Unknown Company"
+        generation_config = {
+            "response_mime_type": "application/json",
+            "response_schema": SMAP_RESPONSE_SCHEMA
+        }
+        
+        def build(payload: Dict[str, Any]) -> EnhancedSMAPNotes:
+            smap_sections = payload.get('smap') or {}
+            if not any(smap_sections.get(section) for section in ('subjective', 'metrics', 'assessment', 'plan')):
+                raise ValueError("single-call response contained no SMAP sections")
+            return self._assemble_smap_notes(
+                smap_sections,
+                payload.get('company') or {},
+                self._build_financial_metrics(payload.get('financial_metrics') or {}),
+                self._build_risk_factors(payload.get('risk_factors') or {}),
+                self._build_business_segments(payload.get('business_segments') or [])
             )
+        
+        return self._generate_json(
+            prompt, key='smap_single_call', build=build, deadline=deadline,
+            generation_config=generation_config, prefix=self._filing_prefix(filing_text)
+        )
+    
+    def _assemble_smap_notes(self, smap_sections: Dict[str, str], company_info: Dict[str, str],
+                             financial_metrics: FinancialMetrics, risk_factors: RiskFactors,
+                             business_segments: BusinessSegments) -> EnhancedSMAPNotes:
+        """Combine SMAP text, metadata and structured data into EnhancedSMAPNotes"""
+        return EnhancedSMAPNotes(
+            subjective=smap_sections.get('subjective') or 'No subjective analysis generated',
+            metrics=smap_sections.get('metrics') or 'No metrics extracted',
+            assessment=smap_sections.get('assessment') or 'No assessment provided',
+            plan=smap_sections.get('plan') or 'No plan recommendations',
+            financial_metrics=financial_metrics,
+            risk_factors=risk_factors,
+            business_segments=business_segments,
+            company_name=company_info.get('company_name', 'Unknown Company'),
+            ticker_symbol=company_info.get('ticker', 'N/A'),
+            filing_type=company_info.get('filing_type', 'SEC Filing'),
+            filing_period=company_info.get('quarter_year', 'N/A'),
+            industry=company_info.get('industry', 'Financial Services')
+        )
+    
+    def _error_smap_notes(self) -> EnhancedSMAPNotes:
+        """Placeholder notes returned when generation fails outright"""
+        return EnhancedSMAPNotes(
+            subjective="Error generating analysis",
+            metrics="Error extracting metrics",
+            assessment="Error in assessment",
+            plan="Error in planning",
+            financial_metrics=FinancialMetrics(),
+            risk_factors=RiskFactors([], [], [], [], [], []),
+            business_segments=BusinessSegments({}),
+            company_name="Unknown Company"
+        )
     
-    def _extract_company_metadata(self, filing_text: str) -> Dict[str, str]:
+    def _extract_company_metadata(self, filing_text: str, deadline: Optional[Deadline] = None) -> Dict[str, str]:
         """Extract company metadata"""
-        prompt = f"""
-        Extract company metadata from this SEC filing:
-        
-        {filing_text[:2000]}
+        prompt = """
+        TASK: Extract company metadata from the SEC filing above.
         
         Return JSON:
-        {{
+        {
             "company_name": "Full company name",
             "ticker": "Stock symbol",
             "filing_type": "10-Q or 10-K",
             "quarter_year": "Q1 2025",
             "industry": "Industry sector"
-        }}
+        }
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-            
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            return json.loads(response_text)
+            return self._generate_json(
+                prompt, key='company_metadata', deadline=deadline,
+                prefix=self._filing_prefix(filing_text)
+            )
         except:
             return {
                 "company_name": "Unknown Company",
@@ -357,47 +528,145 @@ class EnhancedGeminiService:
                 "industry": "Financial Services"
             }
     
+    def _require_smap_sections(self, response_text: str) -> Dict[str, str]:
+        """Parse SMAP sections, rejecting responses that contain none so they get retried"""
+        sections = self._parse_smap_response(response_text)
+        if not any(sections.values()):
+            raise ValueError("Gemini response contained no SMAP sections")
+        return sections
+    
     def _parse_smap_response(self, response_text: str) -> Dict[str, str]:
         """Parse SMAP sections from Gemini response"""
-        sections = {}
-        current_section = None
-        current_content = []
+        parser = SMAPStreamParser()
+        parser.feed(response_text)
+        parser.finish()
+        return parser.sections
+    
+    def stream_enhanced_smap_notes(self, filing_text: str) -> Iterator[Dict[str, Any]]:
+        """Stream SMAP generation, yielding each section as soon as Gemini finishes it
         
-        lines = response_text.split('\n')
+        Yields {'event': 'section', 'section': name, 'content': text} per SMAP section,
+        then a final {'event': 'complete', 'notes': EnhancedSMAPNotes} once metadata and
+        structured extraction have run.
+        """
+        deadline = Deadline(self.retry_policy.pipeline_budget)
+        parser = SMAPStreamParser()
         
-        for line in lines:
-            line = line.strip()
-            
-            # Detect section headers
-            if line.upper().startswith('**SUBJECTIVE') or line.upper().startswith('SUBJECTIVE'):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = 'subjective'
-                current_content = []
-            elif line.upper().startswith('**METRICS') or line.upper().startswith('METRICS'):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = 'metrics'
-                current_content = []
-            elif line.upper().startswith('**ASSESSMENT') or line.upper().startswith('ASSESSMENT'):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = 'assessment'
-                current_content = []
-            elif line.upper().startswith('**PLAN') or line.upper().startswith('PLAN'):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = 'plan'
-                current_content = []
-            elif current_section and line:
-                if not line.startswith('**') and not line.startswith('['):
-                    current_content.append(line)
-        
-        # Add the last section
-        if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
+        prefix = self._filing_prefix(filing_text)
         
-        return sections
+        try:
+            model, full_prompt = self._model_and_prompt(self._smap_prompt(), prefix)
+            response = model.generate_content(full_prompt, stream=True)
+            for chunk in response:
+                for section, content in parser.feed(chunk.text):
+                    yield {'event': 'section', 'section': section, 'content': content}
+            usage_ledger.record_llm(response, getattr(model, 'model_name', None))
+            for section, content in parser.finish():
+                yield {'event': 'section', 'section': section, 'content': content}
+        except Exception as e:
+            log.warning("smap_stream_failed", error=str(e), sections_sent=len(parser.sections))
+            if not parser.sections:
+                # Nothing reached the client yet, so a normal (retried) call is still safe
+                try:
+                    sections = self._generate(
+                        self._smap_prompt(), key='smap_notes', deadline=deadline,
+                        parse=lambda response: self._require_smap_sections(response.text),
+                        prefix=prefix
+                    )
+                except Exception as retry_error:
+                    log.error("smap_generation_failed", mode='stream_fallback', error=str(retry_error))
+                    sections = {}
+                for section, content in sections.items():
+                    parser.sections[section] = content
+                    yield {'event': 'section', 'section': section, 'content': content}
+        
+        company_info = self._extract_company_metadata(filing_text, deadline=deadline)
+        financial_metrics = self.extract_structured_metrics(filing_text, deadline=deadline)
+        risk_factors = self.extract_risk_factors(filing_text, deadline=deadline)
+        business_segments = self.extract_business_segments(filing_text, deadline=deadline)
+        
+        yield {
+            'event': 'complete',
+            'notes': self._assemble_smap_notes(
+                parser.sections, company_info, financial_metrics, risk_factors, business_segments
+            )
+        }
+
+
+class SMAPStreamParser:
+    """Incremental SMAP section parser for streamed Gemini output
+    
+    Text is fed in arbitrary chunks; a section is reported complete as soon as the
+    next section header (or the end of the stream) is seen.
+    """
+    
+    HEADERS = (
+        ('SUBJECTIVE', 'subjective'),
+        ('METRICS', 'metrics'),
+        ('ASSESSMENT', 'assessment'),
+        ('PLAN', 'plan'),
+    )
+    
+    def __init__(self):
+        self.sections: Dict[str, str] = {}
+        self._pending = ""
+        self._current_section: Optional[str] = None
+        self._current_content: List[str] = []
+    
+    @classmethod
+    def match_header(cls, line: str) -> Optional[str]:
+        """Return the section name if the (stripped) line is a SMAP section header"""
+        upper = line.upper()
+        for header, section in cls.HEADERS:
+            if upper.startswith('**' + header) or upper.startswith(header):
+                return section
+        return None
+    
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk of text; returns sections completed by it"""
+        self._pending += chunk
+        *lines, self._pending = self._pending.split('\n')
+        completed = []
+        for line in lines:
+            finished = self._consume_line(line)
+            if finished:
+                completed.append(finished)
+        return completed
+    
+    def finish(self) -> List[Tuple[str, str]]:
+        """Flush buffered text at end of stream; returns the sections it completed"""
+        completed = []
+        if self._pending:
+            finished = self._consume_line(self._pending)
+            self._pending = ""
+            if finished:
+                completed.append(finished)
+        if self._current_section:
+            completed.append(self._close_section())
+        return completed
+    
+    def _consume_line(self, line: str) -> Optional[Tuple[str, str]]:
+        line = line.strip()
+        section = self.match_header(line)
+        
+        if section:
+            finished = self._close_section() if self._current_section else None
+            self._current_section = section
+            self._current_content = []
+            return finished
+        
+        if self._current_section and line:
+            if not line.startswith('**') and not line.startswith('['):
+                self._current_content.append(line)
+        return None
+    
+    def _close_section(self) -> Tuple[str, str]:
+        section = self._current_section
+        content = '\n'.join(self._current_content).strip()
+        self.sections[section] = content
+        self._current_section = None
+        self._current_content = []
+        return section, content
 
 # Test the enhanced service
 def test_enhanced_gemini():
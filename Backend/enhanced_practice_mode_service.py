@@ -13,9 +13,14 @@ from datetime import datetime
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from smap_prescorer import SMAPPreScorer
+from structured_logging import get_logger
+
 # Load environment variables
 load_dotenv()
 
+log = get_logger(__name__)
+
 class EnhancedPracticeModeService:
     """Enhanced service for interactive SMAP notes practice with high-quality grading"""
     
@@ -27,24 +32,27 @@ class EnhancedPracticeModeService:
             genai.configure(api_key=gemini_key)
             self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
             self.gemini_available = True
-            print("✅ Enhanced Practice Mode: Gemini API initialized")
+            log.info("practice_mode_gemini_initialized")
         else:
             self.gemini_available = False
-            print("⚠️ Enhanced Practice Mode: Gemini API key not found")
+            log.warning("practice_mode_gemini_unavailable", reason="GEMINI_API_KEY not set")
         
         # OpenAI API for high-quality grading
         # Set your OpenAI API key in environment variable: export OPENAI_API_KEY="your-key-here"
         self.openai_key = os.getenv("OPENAI_API_KEY")
         if self.openai_key:
             self.openai_available = True
-            print("✅ Enhanced Practice Mode: OpenAI API initialized")
+            log.info("practice_mode_openai_initialized")
         else:
             self.openai_available = False
-            print("⚠️ Enhanced Practice Mode: OpenAI API key not found - set OPENAI_API_KEY environment variable")
+            log.warning("practice_mode_openai_unavailable", reason="OPENAI_API_KEY not set")
+        
+        # Local pre-scoring skips the OpenAI call for clearly failing or copied submissions
+        self.prescorer = SMAPPreScorer()
     
     def extract_filing_sections(self, filing_content: str) -> Dict[str, Any]:
         """Extract proper 10-Q sections based on SEC structure"""
-        print("Enhanced Practice Mode: Extracting 10-Q filing sections...")
+        log.debug("practice_sections_extracting", chars=len(filing_content))
         
         # Proper 10-Q structure based on SEC requirements
         sections = [
@@ -189,7 +197,7 @@ class EnhancedPracticeModeService:
     
     def teach_smap_framework(self, section: Dict[str, Any]) -> Dict[str, Any]:
         """Teach students about SMAP framework for the specific section"""
-        print(f"Enhanced Practice Mode: Teaching SMAP framework for {section['title']}")
+        log.debug("practice_smap_teaching", section=section['title'])
         
         if not self.gemini_available:
             return self._fallback_smap_teaching(section)
@@ -234,7 +242,7 @@ Make this educational and practical for finance students.
             }
             
         except Exception as e:
-            print(f"❌ Error in SMAP teaching: {str(e)}")
+            log.error("practice_smap_teaching_failed", section=section['title'], error=str(e))
             return self._fallback_smap_teaching(section)
     
     def _fallback_smap_teaching(self, section: Dict[str, Any]) -> Dict[str, Any]:
@@ -260,7 +268,11 @@ For this {section['difficulty']} section, pay attention to {section['smap_focus'
     
     def grade_student_submission(self, student_submission: str, section: Dict[str, Any], gold_standard: str = "") -> Dict[str, Any]:
         """Grade student's SMAP submission using OpenAI GPT-4 for high-quality feedback"""
-        print(f"Enhanced Practice Mode: Grading student submission for {section['title']}")
+        log.debug("practice_submission_grading", section=section['title'])
+        
+        prescore = self.prescorer.prescore_text(student_submission, gold_standard or section.get('content', ''))
+        if prescore.short_circuit:
+            return self._prescore_grading(prescore, section)
         
         if not self.openai_available:
             return self._fallback_grading(student_submission, section)
@@ -350,11 +362,11 @@ Be detailed and educational in your feedback.
                     "grader": "OpenAI GPT-4"
                 }
             else:
-                print(f"❌ OpenAI API error: {response.status_code}")
+                log.error("practice_openai_grading_failed", section=section['title'], status=response.status_code)
                 return self._fallback_grading(student_submission, section)
                 
         except Exception as e:
-            print(f"❌ Error in OpenAI grading: {str(e)}")
+            log.error("practice_openai_grading_failed", section=section['title'], error=str(e))
             return self._fallback_grading(student_submission, section)
     
     def _extract_score(self, text: str, prefix: str) -> int:
@@ -394,6 +406,19 @@ Be detailed and educational in your feedback.
             pass
         return "C"  # Default grade
     
+    def _prescore_grading(self, prescore, section: Dict[str, Any]) -> Dict[str, Any]:
+        """Grade from the local pre-score when the submission does not need an LLM review"""
+        score = int(round(prescore.overall_score))
+        return {
+            "overall_score": score,
+            "letter_grade": "C" if score >= 70 else "D" if score >= 60 else "F",
+            "component_scores": {section_name: int(round(value)) for section_name, value in prescore.section_scores.items()},
+            "detailed_feedback": f"{' '.join(prescore.reasons)}. Review the {section['title']} section and write your own SMAP notes covering management's narrative, key metrics, your assessment and the outlook.",
+            "section_title": section['title'],
+            "grading_timestamp": datetime.now().isoformat(),
+            "grader": "Local pre-score"
+        }
+    
     def _fallback_grading(self, student_submission: str, section: Dict[str, Any]) -> Dict[str, Any]:
         """Fallback grading when OpenAI is unavailable"""
         # Simple keyword-based grading
@@ -422,7 +447,7 @@ Be detailed and educational in your feedback.
     
     def generate_progress_insights(self, completed_sections: List[Dict], student_performance: List[Dict]) -> Dict[str, Any]:
         """Generate insights about student's learning progress"""
-        print("Enhanced Practice Mode: Generating progress insights...")
+        log.debug("practice_insights_generating", sections=len(completed_sections))
         
         if not self.gemini_available:
             return self._fallback_insights(completed_sections, student_performance)
@@ -462,7 +487,7 @@ Be encouraging but honest about areas for improvement.
             }
             
         except Exception as e:
-            print(f"❌ Error generating insights: {str(e)}")
+            log.error("practice_insights_failed", error=str(e))
             return self._fallback_insights(completed_sections, student_performance)
     
     def _fallback_insights(self, completed_sections: List[Dict], student_performance: List[Dict]) -> Dict[str, Any]:
@@ -479,7 +504,7 @@ Be encouraging but honest about areas for improvement.
     
     def assign_next_section(self, completed_sections: List[str], available_sections: List[Dict]) -> Dict[str, Any]:
         """Assign the next section for practice"""
-        print("Enhanced Practice Mode: Assigning next section...")
+        log.debug("practice_section_assigning", completed=len(completed_sections))
         
         # Find first uncompleted section
         for section in available_sections:
@@ -9,15 +9,40 @@ This module handles all interactions with Google's Gemini API for:
 """
 
 import os
-import json
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from json_extraction import extract_json, parse_into_dataclass
+from prompt_cache import PromptPrefixCache
+from usage_accounting import ledger as usage_ledger
+from structured_logging import get_logger
+
 # Load environment variables
 load_dotenv()
 
+log = get_logger(__name__)
+
+# Packed grading: one result per submission, tied to it by the opaque id it was sent with
+BATCH_FEEDBACK_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "submission_id": {"type": "string"},
+            "completeness": {"type": "integer"},
+            "accuracy": {"type": "integer"},
+            "insight_depth": {"type": "integer"},
+            "clarity": {"type": "integer"},
+            "overall_score": {"type": "number"},
+            "feedback_comments": {"type": "array", "items": {"type": "string"}},
+            "suggestions": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["submission_id", "completeness", "accuracy", "insight_depth", "clarity", "overall_score"]
+    }
+}
+
 @dataclass
 class SMAPNotes:
     """Structure to hold SMAP notes data"""
@@ -38,6 +63,7 @@ class FeedbackScore:
     overall_score: int
     feedback_comments: List[str]
     suggestions: List[str]
+    provisional: bool = False  # local pre-score given instead of an AI grade (usage budget reached)
 
 class GeminiService:
     """Main service class for Gemini API interactions"""
@@ -53,16 +79,19 @@ class GeminiService:
         # Initialize the model - using gemini-2.5-pro (latest stable version)
         self.model = genai.GenerativeModel('gemini-2.5-pro')
         
-        print("✅ Gemini API service initialized successfully")
+        # Reuses the gold-standard prefix across repeated feedback requests
+        self.prompt_cache = PromptPrefixCache(self.model.model_name)
+        
+        log.info("gemini_initialized", model=self.model.model_name)
     
     def test_connection(self) -> bool:
         """Test the connection to Gemini API"""
         try:
             response = self.model.generate_content("Hello, this is a test message.")
-            print(f"✅ API Connection Test Successful: {response.text[:50]}...")
+            log.info("gemini_connection_ok", reply=response.text[:50])
             return True
         except Exception as e:
-            print(f"❌ API Connection Test Failed: {str(e)}")
+            log.error("gemini_connection_failed", error=str(e))
             return False
     
     def extract_company_info(self, filing_text: str) -> Dict[str, str]:
@@ -84,17 +113,11 @@ class GeminiService:
         
         try:
             response = self.model.generate_content(prompt)
-            # Clean response text to extract JSON
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            company_info = json.loads(response_text)
+            usage_ledger.record_llm(response, self.model.model_name)
+            company_info = extract_json(response.text, root='{')
             return company_info
         except Exception as e:
-            print(f"Error extracting company info: {e}")
+            log.error("company_info_extraction_failed", error=str(e))
             return {
                 "company_name": "Unknown Company",
                 "ticker": "N/A",
@@ -140,6 +163,7 @@ class GeminiService:
         
         try:
             response = self.model.generate_content(prompt)
+            usage_ledger.record_llm(response, self.model.model_name)
             text = response.text
             
             # Parse the response to extract sections
@@ -155,7 +179,7 @@ class GeminiService:
             )
             
         except Exception as e:
-            print(f"Error generating SMAP notes: {e}")
+            log.error("smap_generation_failed", error=str(e))
             return SMAPNotes(
                 subjective="Error generating subjective analysis",
                 metrics="Error extracting metrics",
@@ -206,11 +230,11 @@ class GeminiService:
         
         return sections
     
-    def provide_feedback(self, user_smap: SMAPNotes, gold_standard_smap: SMAPNotes) -> FeedbackScore:
-        """Provide AI feedback comparing user's SMAP notes to gold standard"""
-        
-        prompt = f"""
-        You are an expert financial education instructor. Compare these SMAP notes and provide detailed feedback.
+    def _feedback_prefix(self, gold_standard_smap: SMAPNotes) -> str:
+        """Grading instructions and gold standard, identical for every submission on a filing"""
+        return f"""
+        You are an expert financial education instructor. Compare a student's SMAP notes
+        against the gold standard below and provide detailed feedback.
         
         GOLD STANDARD SMAP NOTES:
         Subjective: {gold_standard_smap.subjective}
@@ -218,12 +242,6 @@ class GeminiService:
         Assessment: {gold_standard_smap.assessment}
         Plan: {gold_standard_smap.plan}
         
-        STUDENT'S SMAP NOTES:
-        Subjective: {user_smap.subjective}
-        Metrics: {user_smap.metrics}
-        Assessment: {user_smap.assessment}
-        Plan: {user_smap.plan}
-        
         Please provide scores (0-100) and feedback for:
         1. Completeness - How complete are the notes?
         2. Accuracy - Are the facts and numbers correct?
@@ -241,36 +259,110 @@ class GeminiService:
             "suggestions": ["suggestion1", "suggestion2"]
         }}
         """
+    
+    @staticmethod
+    def _feedback_score(feedback_data: Dict[str, Any]) -> FeedbackScore:
+        """Validate the model's scores; ValueError if any score is missing or not a number"""
+        score = parse_into_dataclass(feedback_data, FeedbackScore)
+        score.provisional = False  # only the local budget prescore is provisional
+        return score
+    
+    def provide_feedback(self, user_smap: SMAPNotes, gold_standard_smap: SMAPNotes,
+                         raise_on_error: bool = False) -> FeedbackScore:
+        """Provide AI feedback comparing user's SMAP notes to gold standard
+        
+        With raise_on_error the underlying error propagates instead of returning a
+        zero-score placeholder, so callers such as the grading cache can tell failures apart.
+        """
+        
+        # Gold standard and rubric form a stable prefix shared by every submission on the session
+        prefix = self._feedback_prefix(gold_standard_smap)
+        
+        task = f"""
+        STUDENT'S SMAP NOTES:
+        Subjective: {user_smap.subjective}
+        Metrics: {user_smap.metrics}
+        Assessment: {user_smap.assessment}
+        Plan: {user_smap.plan}
+        """
         
         try:
-            response = self.model.generate_content(prompt)
-            # Clean response text to extract JSON
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
+            cached_model, prompt = self.prompt_cache.prepare(prefix, task)
+            response = (cached_model or self.model).generate_content(prompt)
+            usage_ledger.record_llm(response, getattr(cached_model or self.model, 'model_name', None))
+            feedback_data = extract_json(response.text, root='{')
             
-            feedback_data = json.loads(response_text)
-            
-            return FeedbackScore(
-                completeness=feedback_data.get('completeness', 0),
-                accuracy=feedback_data.get('accuracy', 0),
-                insight_depth=feedback_data.get('insight_depth', 0),
-                clarity=feedback_data.get('clarity', 0),
-                overall_score=feedback_data.get('overall_score', 0),
-                feedback_comments=feedback_data.get('feedback_comments', []),
-                suggestions=feedback_data.get('suggestions', [])
-            )
+            return self._feedback_score(feedback_data)
             
         except Exception as e:
-            print(f"Error providing feedback: {e}")
+            log.error("feedback_failed", error=str(e))
+            if raise_on_error:
+                raise
             return FeedbackScore(
                 completeness=0, accuracy=0, insight_depth=0, clarity=0,
                 overall_score=0, feedback_comments=["Error generating feedback"],
                 suggestions=["Please try again"]
             )
     
+    def provide_batch_feedback(self, user_smaps: Dict[str, SMAPNotes],
+                               gold_standard_smap: SMAPNotes) -> Dict[str, FeedbackScore]:
+        """Grade several submissions on the same filing in one request
+        
+        user_smaps maps an opaque submission id to its notes. Uses the same gold-standard
+        prefix as provide_feedback, so both share a context cache. Results are matched
+        back by id only, never by position: ids the model skipped, repeated or invented
+        are left out so the caller can regrade those submissions. Request errors raise.
+        """
+        prefix = self._feedback_prefix(gold_standard_smap)
+        
+        submissions = "\n".join(f"""
+        SUBMISSION (submission_id "{submission_id}"):
+        Subjective: {smap.subjective}
+        Metrics: {smap.metrics}
+        Assessment: {smap.assessment}
+        Plan: {smap.plan}
+        """ for submission_id, smap in user_smaps.items())
+        
+        task = f"""
+        Grade each of the {len(user_smaps)} student submissions below independently.
+        Return a JSON array with one object per submission, using the structure above
+        plus a "submission_id" field copied exactly from the submission's header.
+        {submissions}
+        """
+        
+        generation_config = {"response_mime_type": "application/json", "response_schema": BATCH_FEEDBACK_SCHEMA}
+        cached_model, prompt = self.prompt_cache.prepare(prefix, task)
+        response = (cached_model or self.model).generate_content(prompt, generation_config=generation_config)
+        usage_ledger.record_llm(response, getattr(cached_model or self.model, 'model_name', None))
+        return self._match_batch_results(extract_json(response.text, root='['), user_smaps)
+    
+    def _match_batch_results(self, graded: List[Any], user_smaps: Dict[str, Any]) -> Dict[str, FeedbackScore]:
+        """Scores by submission id; missing, duplicated and unknown ids are rejected"""
+        items: Dict[str, List[Dict[str, Any]]] = {}
+        unknown = 0
+        for item in graded:
+            submission_id = item.get('submission_id') if isinstance(item, dict) else None
+            if isinstance(submission_id, str) and submission_id in user_smaps:
+                items.setdefault(submission_id, []).append(item)
+            else:
+                unknown += 1
+        
+        scores = {}
+        invalid = 0
+        for submission_id, found in items.items():
+            if len(found) != 1:
+                continue
+            try:
+                scores[submission_id] = self._feedback_score(found[0])
+            except ValueError:
+                invalid += 1  # left out, so the caller regrades it
+        if len(scores) < len(user_smaps) or unknown:
+            log.warning("batch_feedback_unmatched", submissions=len(user_smaps), matched=len(scores),
+                        missing=sum(1 for submission_id in user_smaps if submission_id not in items),
+                        duplicated=sum(1 for found in items.values() if len(found) > 1), unknown=unknown,
+                        invalid=invalid)
+        return scores
+    
     def generate_flashcards(self, smap_notes: SMAPNotes, num_cards: int = 5) -> List[Dict[str, str]]:
         """Generate educational flashcards from SMAP notes"""
         
@@ -302,17 +394,11 @@ class GeminiService:
         
         try:
             response = self.model.generate_content(prompt)
-            # Clean response text to extract JSON
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-            
-            flashcards = json.loads(response_text)
+            usage_ledger.record_llm(response, self.model.model_name)
+            flashcards = extract_json(response.text, root='[')
             return flashcards
         except Exception as e:
-            print(f"Error generating flashcards: {e}")
+            log.error("flashcard_generation_failed", error=str(e))
             return [{"question": "Error generating flashcard", "answer": "Please try again", "category": "Error", "difficulty": "N/A"}]
 
 # Test function
@@ -0,0 +1,385 @@
+"""
+10Q Notes AI - Grading Service
+HackRU 2025 Project by azrabano
+
+LLM-backed grading of student SMAP submissions:
+- Gemini grader comparing student notes with the gold standard
+- Cache keyed by (gold-standard hash, normalized student SMAP hash) so resubmissions
+  and copy-pasted answers are graded instantly
+- Bounded concurrency so a class deadline cannot overwhelm the grader
+- Local pre-scoring short-circuits clearly failing, gold-copied and near-duplicate submissions
+"""
+
+import os
+import re
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from gemini_service import GeminiService, SMAPNotes, FeedbackScore
+from enhanced_gemini_service import EnhancedSMAPNotes
+from numeric_fact_index import NumericFactIndex
+from smap_prescorer import SMAPPreScorer, submission_vector
+from instrumentation import track_stage
+from structured_logging import get_logger
+from usage_accounting import ledger as usage_ledger, usage_scope
+from shared_state import SharedMapping, state_store
+
+log = get_logger(__name__)
+
+SMAP_SECTIONS = ('subjective', 'metrics', 'assessment', 'plan')
+
+
+class GradingUnavailable(Exception):
+    """The submission could not be graded right now; no score was produced"""
+
+
+class GraderBusy(GradingUnavailable):
+    """Raised when no grading slot frees up within the queue timeout"""
+
+
+class _GradedSubmissions:
+    """
+    Unit vectors and scores of LLM-graded submissions on one gold standard.
+
+    Rows live in a preallocated matrix that doubles when full (amortized O(1)
+    inserts); once max_rows is reached the oldest row is overwritten.
+    """
+
+    def __init__(self, dimensions: int, dtype, max_rows: int, initial_capacity: int = 64):
+        self.max_rows = max(1, max_rows)
+        self._vectors = np.empty((min(initial_capacity, self.max_rows), dimensions), dtype=dtype)
+        self._scores: List[FeedbackScore] = []
+        self._oldest = 0
+        self.size = 0
+
+    def add(self, vector: np.ndarray, score: FeedbackScore):
+        if self.size < self.max_rows:
+            if self.size == self._vectors.shape[0]:
+                self._grow()
+            self._vectors[self.size] = vector
+            self._scores.append(score)
+            self.size += 1
+        else:
+            self._vectors[self._oldest] = vector
+            self._scores[self._oldest] = score
+            self._oldest = (self._oldest + 1) % self.max_rows
+
+    def _grow(self):
+        capacity = min(self._vectors.shape[0] * 2, self.max_rows)
+        vectors = np.empty((capacity, self._vectors.shape[1]), dtype=self._vectors.dtype)
+        vectors[:self.size] = self._vectors[:self.size]
+        self._vectors = vectors
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[FeedbackScore], float]:
+        """Most similar graded submission's score and its cosine similarity"""
+        if not self.size:
+            return None, 0.0
+        similarities = self._vectors[:self.size] @ vector
+        best = int(similarities.argmax())
+        return self._scores[best], float(similarities[best])
+
+
+def normalize_smap_text(text: str) -> str:
+    """Normalize a SMAP section for hashing: case, whitespace and trailing punctuation"""
+    text = re.sub(r'\s+', ' ', (text or '').lower()).strip()
+    return text.rstrip('.!')
+
+
+def student_smap_hash(student_smap: Dict[str, str]) -> str:
+    """Stable hash of a student's SMAP notes, insensitive to case and whitespace"""
+    normalized = '\x1f'.join(normalize_smap_text(student_smap.get(section, '')) for section in SMAP_SECTIONS)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def gold_standard_hash(gold_standard: EnhancedSMAPNotes) -> str:
+    """Stable hash of the gold-standard SMAP text a submission is graded against"""
+    content = '\x1f'.join(getattr(gold_standard, section) for section in SMAP_SECTIONS)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class FeedbackGrader:
+    """Grades student SMAPs with Gemini, caching results and bounding concurrent calls"""
+
+    def __init__(self, gemini_service: GeminiService, max_concurrent: int = None,
+                 queue_timeout: float = None, cache_size: int = None):
+        self.gemini_service = gemini_service
+        self.max_concurrent = max_concurrent or int(os.getenv('GRADER_MAX_CONCURRENCY', 4))
+        self.queue_timeout = queue_timeout or float(os.getenv('GRADER_QUEUE_TIMEOUT_SECONDS', 60))
+        self.cache_size = cache_size or int(os.getenv('GRADER_CACHE_SIZE', 5000))
+        self.prescoring = os.getenv('GRADER_PRESCORE', 'true').lower() in ('1', 'true', 'yes')
+        self.near_duplicate_similarity = float(os.getenv('GRADER_NEAR_DUPLICATE_SIMILARITY', 0.97))
+
+        self.prescorer = SMAPPreScorer()
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._cache: "OrderedDict[Tuple[str, str], FeedbackScore]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # With several workers, grades are also shared so a resubmission hits on any worker
+        self._shared_cache = SharedMapping(state_store, 'grade_cache') if state_store.shared else None
+        # Per gold standard: unit vectors of LLM-graded submissions and their scores
+        self._graded: Dict[str, _GradedSubmissions] = {}
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'rejected': 0,
+                      'prescore_short_circuits': 0, 'near_duplicate_hits': 0,
+                      'packed_requests': 0, 'packed_fallbacks': 0, 'budget_prescores': 0}
+
+    def cache_key(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes) -> Tuple[str, str]:
+        return gold_standard_hash(gold_standard), student_smap_hash(student_smap)
+
+    def cached(self, key: Tuple[str, str]):
+        """Cached FeedbackScore for a key, or None"""
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+                return score
+        if self._shared_cache is not None:
+            score = self._shared_cache.get(":".join(key))
+            if score is not None:
+                self._store_local(key, score)
+        return score
+
+    def store(self, key: Tuple[str, str], score: FeedbackScore):
+        self._store_local(key, score)
+        if self._shared_cache is not None:
+            self._shared_cache[":".join(key)] = score
+
+    def _store_local(self, key: Tuple[str, str], score: FeedbackScore):
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def near_duplicate(self, gold_key: str, vector: np.ndarray):
+        """Score of an already-graded submission nearly identical to this one, or None"""
+        with self._cache_lock:
+            graded = self._graded.get(gold_key)
+            if graded is None or not vector.any():
+                return None
+            score, similarity = graded.nearest(vector)
+            return score if similarity >= self.near_duplicate_similarity else None
+
+    def _remember(self, gold_key: str, vector: np.ndarray, score: FeedbackScore):
+        with self._cache_lock:
+            graded = self._graded.get(gold_key)
+            if graded is None:
+                graded = self._graded[gold_key] = _GradedSubmissions(vector.size, vector.dtype, self.cache_size)
+            graded.add(vector, score)
+
+    def resolve_locally(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes,
+                        fact_index: NumericFactIndex = None) -> Tuple[Optional[FeedbackScore], str]:
+        """
+        Grade without the LLM where possible.
+
+        Returns (score, source) with source 'cache', 'prescore' or 'near_duplicate',
+        or (None, 'llm') when the submission needs an LLM grade.
+        """
+        key = self.cache_key(student_smap, gold_standard)
+
+        score = self.cached(key)
+        if score is not None:
+            self.stats['cache_hits'] += 1
+            log.info("grade_cache_hit", submission=key[1][:8])
+            return score, 'cache'
+        self.stats['cache_misses'] += 1
+
+        if not self.prescoring:
+            return None, 'llm'
+
+        prescore = self.prescorer.prescore(student_smap, gold_standard, fact_index)
+        if prescore.short_circuit:
+            self.stats['prescore_short_circuits'] += 1
+            log.info("grade_prescore_short_circuit", decision=prescore.decision,
+                     overall_score=round(prescore.overall_score))
+            score = self.prescorer.to_feedback_score(prescore)
+            # A local 'fail' is a heuristic; keep it out of the cache so a resubmission is judged afresh
+            if prescore.decision != 'fail':
+                self.store(key, score)
+            return score, 'prescore'
+
+        score = self.near_duplicate(key[0], submission_vector(student_smap))
+        if score is not None:
+            self.stats['near_duplicate_hits'] += 1
+            log.info("grade_near_duplicate_hit", submission=key[1][:8])
+            self.store(key, score)
+            return score, 'near_duplicate'
+
+        return None, 'llm'
+
+    @track_stage('grading')
+    def grade(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes,
+              fact_index: NumericFactIndex = None) -> FeedbackScore:
+        """Grade a submission, serving identical (normalized) submissions from cache"""
+        score, _ = self.resolve_locally(student_smap, gold_standard, fact_index)
+        if score is not None:
+            return score
+
+        budget_score = self._budget_prescore(student_smap, gold_standard, fact_index)
+        if budget_score is not None:
+            return budget_score
+
+        self._acquire_slot()
+        try:
+            score = self.gemini_service.provide_feedback(
+                self._student_notes(student_smap, gold_standard), gold_standard, raise_on_error=True
+            )
+        finally:
+            self._slots.release()
+
+        # Only successful grades are cached; failures stay retryable
+        self._record(student_smap, gold_standard, score)
+        return score
+
+    def _budget_prescore(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes,
+                         fact_index: NumericFactIndex = None) -> Optional[FeedbackScore]:
+        """Over the token budget: a pre-score marked provisional, never cached, not a final grade"""
+        if not usage_ledger.degrade('llm', 'prescore_grade'):
+            return None
+        self.stats['budget_prescores'] += 1
+        score = self.prescorer.to_feedback_score(self.prescorer.prescore(student_smap, gold_standard, fact_index))
+        score.provisional = True
+        return score
+
+    @track_stage('grading_packed')
+    def grade_packed(self, student_smaps: List[Dict[str, str]], gold_standard: EnhancedSMAPNotes,
+                     attributions: Optional[List[Dict[str, Any]]] = None,
+                     fact_indexes: Optional[List[Optional[NumericFactIndex]]] = None) -> List[FeedbackScore]:
+        """
+        Grade several submissions on one gold standard in a single LLM request.
+
+        Callers resolve cache/pre-score hits first with resolve_locally. attributions
+        gives each submission's usage scope (session_id, student_id); submissions whose
+        session or student is over budget get a pre-score, as in grade(), and stay out
+        of the request. fact_indexes gives each submission's filing figures, used by
+        pre-scores and individual regrades. The packed request takes one grading slot. Each submission goes
+        out under a random id and results are matched by that id; submissions the model
+        skipped, repeated or mislabelled are regraded individually.
+        """
+        attributions = attributions or [{} for _ in student_smaps]
+        fact_indexes = fact_indexes or [None for _ in student_smaps]
+        scores: List[Optional[FeedbackScore]] = [None] * len(student_smaps)
+        pending: Dict[str, int] = {}
+        for index, (student_smap, attribution) in enumerate(zip(student_smaps, attributions)):
+            with usage_scope(**attribution):
+                scores[index] = self._budget_prescore(student_smap, gold_standard, fact_indexes[index])
+            if scores[index] is None:
+                pending[uuid.uuid4().hex[:12]] = index
+        if not pending:
+            return scores
+
+        self._acquire_slot()
+        try:
+            packed = self.gemini_service.provide_batch_feedback(
+                {submission_id: self._student_notes(student_smaps[index], gold_standard)
+                 for submission_id, index in pending.items()}, gold_standard
+            )
+        finally:
+            self._slots.release()
+        self.stats['packed_requests'] += 1
+
+        for submission_id, index in pending.items():
+            score = packed.get(submission_id)
+            if score is None:
+                self.stats['packed_fallbacks'] += 1
+                with usage_scope(**attributions[index]):
+                    score = self.grade(student_smaps[index], gold_standard, fact_indexes[index])
+            else:
+                self._record(student_smaps[index], gold_standard, score)
+            scores[index] = score
+        return scores
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats['rejected'] += 1
+            raise GraderBusy(f"No grading slot free within {self.queue_timeout:.0f}s")
+
+    def _record(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes, score: FeedbackScore):
+        key = self.cache_key(student_smap, gold_standard)
+        self.store(key, score)
+        if self.prescoring:
+            self._remember(key[0], submission_vector(student_smap), score)
+
+    @staticmethod
+    def _student_notes(student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes) -> SMAPNotes:
+        return SMAPNotes(
+            subjective=student_smap.get('subjective', ''),
+            metrics=student_smap.get('metrics', ''),
+            assessment=student_smap.get('assessment', ''),
+            plan=student_smap.get('plan', ''),
+            company_name=gold_standard.company_name,
+            filing_type=gold_standard.filing_type
+        )
+
+
+def test_grading_service():
+    """Cache resubmissions, keep failures ungraded, grow the near-duplicate matrix"""
+    from types import SimpleNamespace
+    print("🧪 Testing Grading Service")
+
+    gold = SimpleNamespace(subjective="Management was upbeat about net interest income.",
+                           metrics="Revenue $42.5B, net income $13.4B, ROE 17%.",
+                           assessment="Fortress balance sheet with rising card charge-offs.",
+                           plan="Watch NII guidance and credit provisions.",
+                           company_name="JPMorgan Chase & Co.", filing_type="10-Q", financial_metrics=None)
+    calls = []
+
+    class FakeGemini:
+        def provide_feedback(self, notes, gold_standard, raise_on_error=False):
+            calls.append(notes)
+            if len(calls) == 1:
+                raise TimeoutError("Gemini timed out")
+            return FeedbackScore(completeness=80, accuracy=70, insight_depth=60, clarity=90,
+                                 overall_score=75, feedback_comments=["Quoted ROE"], suggestions=[])
+
+        def provide_batch_feedback(self, user_smaps, gold_standard):
+            calls.append(list(user_smaps))
+            return {}  # every submission falls back to an individual grade
+
+    grader = FeedbackGrader(FakeGemini(), max_concurrent=1, queue_timeout=1)
+    grader.prescoring = False
+    smap = {'subjective': 'Tone was confident.', 'metrics': 'Revenue $42.5B', 'assessment': 'Strong.',
+            'plan': 'Hold.'}
+
+    try:
+        grader.grade(smap, gold)
+        raise AssertionError("a failed grade must not produce a score")
+    except TimeoutError:
+        pass
+    assert grader.cached(grader.cache_key(smap, gold)) is None
+
+    assert grader.grade(smap, gold).overall_score == 75
+    assert grader.grade({**smap, 'plan': '  HOLD  '}, gold).overall_score == 75  # normalized cache hit
+    assert len(calls) == 2 and grader.stats['cache_hits'] == 1
+
+    # A session over its token budget gets a pre-score on the packed path too
+    from usage_accounting import UsageBudget, UsageRecord
+    saved_budget, usage_ledger.budget = usage_ledger.budget, UsageBudget(session_tokens=1)
+    try:
+        usage_ledger.record(UsageRecord(kind='llm', input_tokens=10, session_id='over_budget'))
+        calls.clear()
+        other = {**smap, 'subjective': 'A different take on the quarter.'}
+        packed = grader.grade_packed([{**smap, 'plan': 'Sell.'}, other], gold,
+                                     [{'session_id': 'over_budget'}, {'session_id': 'within_budget'}])
+        assert grader.stats['budget_prescores'] == 1 and packed[1].overall_score == 75
+        assert packed[0].provisional and not packed[1].provisional
+        assert len(calls[0]) == 1  # only the in-budget submission was sent
+    finally:
+        usage_ledger.budget = saved_budget
+
+    graded = _GradedSubmissions(dimensions=3, dtype=np.float32, max_rows=100, initial_capacity=2)
+    rows = np.eye(3, dtype=np.float32)
+    for i in range(150):
+        graded.add(rows[i % 3], FeedbackScore(i, i, i, i, i, [], []))
+    assert graded.size == 100 and graded._vectors.shape[0] == 100
+    score, similarity = graded.nearest(rows[1])
+    assert similarity == 1.0 and score.overall_score % 3 == 1 and score.overall_score >= 50
+    print("✅ Failures stay ungraded; resubmissions hit the cache")
+
+
+if __name__ == "__main__":
+    test_grading_service()
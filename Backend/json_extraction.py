@@ -0,0 +1,301 @@
+"""
+10Q Notes AI - Tolerant JSON Extraction
+HackRU 2025 Project by azrabano
+
+Robust JSON handling for LLM responses:
+- Finds the first balanced JSON object or array anywhere in the text (fences, prose, trailing notes)
+- Works incrementally on streamed chunks so callers can stop reading once the value is complete
+- Validates decoded payloads against the target dataclass with type coercion
+"""
+
+import re
+import json
+import typing
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Iterable, Optional, Type, TypeVar
+
+T = TypeVar('T')
+
+_OPENERS = {'{': '}', '[': ']'}
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class JSONExtractionError(ValueError):
+    """The text contained no complete JSON value (typically truncated or prose-only model output)"""
+
+
+class IncrementalJSONExtractor:
+    """Scans streamed text for the first balanced JSON value that actually decodes"""
+
+    def __init__(self, root: Optional[str] = None):
+        """root restricts the value to an object ('{') or array ('['); None accepts either"""
+        if root is not None and root not in _OPENERS:
+            raise ValueError("root must be '{', '[' or None")
+        self.root = root
+        self.complete = False
+        self.value: Any = None
+
+        self._buffer = ""
+        self._pos = 0
+        self._reset_candidate(None)
+
+    def _reset_candidate(self, start: Optional[int]):
+        self._start = start
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of text; returns True once a complete JSON value has been found"""
+        if self.complete:
+            return True
+        self._buffer += chunk
+        self._scan()
+        return self.complete
+
+    def _is_opener(self, char: str) -> bool:
+        return char == self.root if self.root else char in _OPENERS
+
+    def _scan(self):
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+
+            if self._start is None:
+                if self._is_opener(char):
+                    self._reset_candidate(self._pos)
+                    self._stack.append(_OPENERS[char])
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._stack.append(_OPENERS[char])
+            elif char in '}]':
+                if char != self._stack[-1]:
+                    # Mismatched bracket: this candidate was prose, not JSON
+                    self._restart()
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    candidate = buffer[self._start:self._pos + 1]
+                    decoded, ok = _decode(candidate)
+                    if ok:
+                        self.value = decoded
+                        self.complete = True
+                        return
+                    self._restart()
+                    continue
+            self._pos += 1
+
+    def _restart(self):
+        """Abandon the current candidate and resume scanning just after its opening bracket"""
+        self._pos = self._start + 1
+        self._reset_candidate(None)
+
+
+def _decode(candidate: str):
+    """Strict decode, then a lenient pass that drops trailing commas"""
+    try:
+        return json.loads(candidate), True
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r'\1', candidate)), True
+    except json.JSONDecodeError:
+        return None, False
+
+
+def extract_json(text: str, root: Optional[str] = None) -> Any:
+    """
+    Return the first balanced JSON object/array in text, or raise JSONExtractionError.
+
+    Models wrap JSON in ```json fences, lead with prose or append notes, so
+    the value is located by bracket matching rather than parsing the whole
+    response.
+    """
+    extractor = IncrementalJSONExtractor(root)
+    if not extractor.feed(text):
+        raise JSONExtractionError("No complete JSON value found in response")
+    return extractor.value
+
+
+def extract_json_from_stream(chunks: Iterable[str], root: Optional[str] = None) -> Any:
+    """Consume streamed chunks only until the first complete JSON value is found"""
+    extractor = IncrementalJSONExtractor(root)
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            return extractor.value
+    raise JSONExtractionError("Stream ended before a complete JSON value was found")
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """Coerce a decoded JSON value to a dataclass field annotation; ValueError if impossible"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Union:
+        if value is None and type(None) in args:
+            return None
+        for arg in args:
+            if arg is type(None):
+                continue
+            try:
+                return _coerce(value, arg)
+            except (TypeError, ValueError):
+                continue
+        raise ValueError(f"{value!r} does not match {annotation}")
+
+    if value is None:
+        raise ValueError("unexpected null")
+
+    if annotation is Any:
+        return value
+    if is_dataclass(annotation):
+        return parse_into_dataclass(value, annotation)
+    if origin in (list, typing.List):
+        if not isinstance(value, list):
+            raise ValueError(f"expected a list, got {type(value).__name__}")
+        item_type = args[0] if args else Any
+        items = []
+        for item in value:
+            try:
+                items.append(_coerce(item, item_type))
+            except (TypeError, ValueError):
+                continue  # drop malformed list entries rather than the whole payload
+        return items
+    if origin in (dict, typing.Dict):
+        if not isinstance(value, dict):
+            raise ValueError(f"expected an object, got {type(value).__name__}")
+        value_type = args[1] if len(args) == 2 else Any
+        result = {}
+        for key, item in value.items():
+            try:
+                result[str(key)] = _coerce(item, value_type)
+            except (TypeError, ValueError):
+                continue
+        return result
+    if annotation is float:
+        if isinstance(value, bool):
+            raise ValueError("boolean is not a number")
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            text = value.strip().replace(',', '').replace('$', '')
+            if text.endswith('%'):
+                return float(text[:-1]) / 100
+            return float(text)
+        raise ValueError(f"expected a number, got {type(value).__name__}")
+    if annotation is int:
+        if isinstance(value, bool):
+            raise ValueError("boolean is not an integer")
+        return int(float(value)) if isinstance(value, str) else int(value)
+    if annotation is str:
+        if isinstance(value, (dict, list)):
+            raise ValueError("expected a string")
+        return str(value)
+    return value
+
+
+def parse_into_dataclass(data: Any, cls: Type[T]) -> T:
+    """
+    Validate a decoded JSON payload into a dataclass.
+
+    Unknown keys are ignored, values are coerced to the field types, and
+    unusable optional values become None. Missing list/dict fields default to
+    empty containers; any other missing required field raises ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{cls.__name__} payload is not a JSON object")
+
+    hints = typing.get_type_hints(cls)
+    values = {}
+    for field in fields(cls):
+        annotation = hints.get(field.name, Any)
+        optional = type(None) in typing.get_args(annotation)
+        has_default = field.default is not MISSING or field.default_factory is not MISSING
+
+        if field.name in data and data[field.name] is not None:
+            try:
+                values[field.name] = _coerce(data[field.name], annotation)
+                continue
+            except (TypeError, ValueError):
+                if not (optional or has_default):
+                    raise ValueError(f"{cls.__name__}.{field.name}: invalid value {data[field.name]!r}")
+
+        if has_default:
+            continue
+        if optional:
+            values[field.name] = None
+        elif typing.get_origin(annotation) in (list, typing.List):
+            values[field.name] = []
+        elif typing.get_origin(annotation) in (dict, typing.Dict):
+            values[field.name] = {}
+        else:
+            raise ValueError(f"{cls.__name__}.{field.name} is required")
+
+    return cls(**values)
+
+
+def test_json_extraction():
+    """Fenced, chatty, streamed and truncated model output"""
+    from dataclasses import dataclass, field
+    from typing import Dict, List
+    print("🧪 Testing JSON Extraction")
+
+    fenced = 'Here is the analysis:\n```json\n{"score": 82, "notes": ["uses {braces}", "a ] b"],}\n```\nLet me know!'
+    assert extract_json(fenced, root='{') == {'score': 82, 'notes': ['uses {braces}', 'a ] b']}
+
+    # Prose brackets before the payload are skipped, and root picks arrays over objects
+    assert extract_json('Scores [see below]: [{"id": "s1"}, {"id": "s2"}]', root='[') == [{'id': 's1'}, {'id': 's2'}]
+    assert extract_json('Note {not json} then {"ok": true}') == {'ok': True}
+
+    # Streamed: stops at the first complete value, never reads the trailing chunk
+    def chunks():
+        yield '```json\n{"company_name": "JPMorgan'
+        yield ' Chase", "ticker": "JPM"}\n```'
+        raise AssertionError("read past the complete value")
+    assert extract_json_from_stream(chunks(), root='{')['ticker'] == 'JPM'
+
+    for partial in ('{"score": 82, "notes": ["cut off', 'No JSON here at all', ''):
+        try:
+            extract_json(partial)
+            raise AssertionError(f"extracted from {partial!r}")
+        except JSONExtractionError:
+            pass
+    try:
+        extract_json_from_stream(iter(['{"score": ', '82']))
+        raise AssertionError("extracted from a truncated stream")
+    except JSONExtractionError:
+        pass
+
+    @dataclass
+    class Metrics:
+        ticker: str
+        total_revenue: Optional[float] = None
+        roe: Optional[float] = None
+        segments: Dict[str, float] = field(default_factory=dict)
+        risks: List[str] = field(default_factory=list)
+
+    metrics = parse_into_dataclass({'ticker': 'JPM', 'total_revenue': '$42,500', 'roe': '17%',
+                                    'segments': {'CIB': 18.2, 'AWM': 'n/a'}, 'risks': ['credit', {'x': 1}],
+                                    'unknown': 1}, Metrics)
+    assert metrics == Metrics('JPM', 42500.0, 0.17, {'CIB': 18.2}, ['credit'])
+    try:
+        parse_into_dataclass({'total_revenue': 1.0}, Metrics)
+        raise AssertionError("missing required field accepted")
+    except ValueError:
+        pass
+    print("✅ Fences, prose, streams and partial output handled")
+
+
+if __name__ == "__main__":
+    test_json_extraction()
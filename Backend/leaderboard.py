@@ -0,0 +1,237 @@
+"""
+10Q Notes AI - Cohort Leaderboards
+HackRU 2025 Project by azrabano
+
+Class rankings maintained as grades come in:
+- Indexable skip list ordered by score: O(log n) insert, remove, rank and page lookups
+- One leaderboard per university (average score) and per filing (best score on that filing)
+- Paginated rank queries for the instructor endpoints
+"""
+
+import random
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_LEVELS = 32
+
+
+class _Node:
+    __slots__ = ('key', 'value', 'next', 'width')
+
+    def __init__(self, key, value, levels: int):
+        self.key = key
+        self.value = value
+        self.next: List[Optional['_Node']] = [None] * levels
+        self.width = [1] * levels  # elements skipped by each forward link
+
+
+class IndexableSkipList:
+    """Sorted keys with positional access; every operation is O(log n) expected"""
+
+    def __init__(self, max_levels: int = MAX_LEVELS):
+        self.max_levels = max_levels
+        self.tail = _Node(None, None, 0)
+        self.head = _Node(None, None, max_levels)
+        self.head.next = [self.tail] * max_levels
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _predecessors(self, key) -> Tuple[List[_Node], List[int]]:
+        chain, steps = [None] * self.max_levels, [0] * self.max_levels
+        node = self.head
+        for level in reversed(range(self.max_levels)):
+            while node.next[level] is not self.tail and node.next[level].key < key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps
+
+    def insert(self, key, value=None):
+        chain, steps_at_level = self._predecessors(key)
+        height = 1
+        while height < self.max_levels and random.random() < 0.5:
+            height += 1
+
+        node = _Node(key, value, height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            node.next[level] = previous.next[level]
+            previous.next[level] = node
+            node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.max_levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._predecessors(key)
+        node = chain[0].next[0]
+        if node is self.tail or node.key != key:
+            raise KeyError(key)
+        for level in range(self.max_levels):
+            if chain[level].next[level] is node:
+                chain[level].width[level] += node.width[level] - 1
+                chain[level].next[level] = node.next[level]
+            else:
+                chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key) -> Optional[int]:
+        """0-based position of key, or None"""
+        chain, steps = self._predecessors(key)
+        node = chain[0].next[0]
+        if node is self.tail or node.key != key:
+            return None
+        return sum(steps)
+
+    def slice(self, start: int, count: int) -> List[Tuple[Any, Any]]:
+        """(key, value) pairs at positions start .. start + count - 1"""
+        if start >= self.size or count <= 0:
+            return []
+        node, remaining = self.head, start + 1
+        for level in reversed(range(self.max_levels)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        items = []
+        while node is not self.tail and len(items) < count:
+            items.append((node.key, node.value))
+            node = node.next[0]
+        return items
+
+
+class Leaderboard:
+    """Ranking of students by score; ties broken by student_id"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._ranking = IndexableSkipList()
+        self._keys: Dict[str, Tuple[float, str]] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ranking)
+
+    def __getstate__(self):
+        # Pickling the skip list's linked nodes would recurse once per student; rebuild it instead
+        return {'name': self.name, 'keys': self._keys, 'entries': self._entries}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'])
+        for student_id, key in state['keys'].items():
+            self._ranking.insert(key, state['entries'][student_id])
+        self._keys, self._entries = state['keys'], state['entries']
+
+    def score(self, student_id: str) -> Optional[float]:
+        key = self._keys.get(student_id)
+        return -key[0] if key else None
+
+    def update(self, student_id: str, score: float, **details):
+        old_key = self._keys.get(student_id)
+        if old_key is not None:
+            self._ranking.remove(old_key)
+        key = (-float(score), student_id)
+        entry = {'student_id': student_id, 'score': round(float(score), 2), **details,
+                 'updated_at': datetime.now().isoformat()}
+        self._ranking.insert(key, entry)
+        self._keys[student_id] = key
+        self._entries[student_id] = entry
+
+    def page(self, offset: int = 0, limit: int = 25) -> List[Dict[str, Any]]:
+        return [{'rank': offset + position + 1, **entry}
+                for position, (_, entry) in enumerate(self._ranking.slice(offset, limit))]
+
+    def rank(self, student_id: str) -> Optional[Dict[str, Any]]:
+        key = self._keys.get(student_id)
+        if key is None:
+            return None
+        position = self._ranking.index(key)
+        return {'rank': position + 1, 'out_of': len(self._ranking),
+                'percentile': round(100.0 * (len(self._ranking) - position) / len(self._ranking), 1),
+                **self._entries[student_id]}
+
+
+class LeaderboardService:
+    """Per-university and per-filing leaderboards, updated on each graded submission"""
+
+    def __init__(self):
+        self._boards: Dict[Tuple[str, str], Leaderboard] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def filing_key(ticker: str, filing_period: str) -> str:
+        return f"{(ticker or '').upper()} {(filing_period or '').upper()}".strip()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _board(self, kind: str, name: str) -> Leaderboard:
+        key = (kind, name.lower())
+        board = self._boards.get(key)
+        if board is None:
+            board = self._boards[key] = Leaderboard(name)
+        return board
+
+    def record(self, student, session, average_score: float):
+        """Rank the student by average score in their university and by best score on this filing"""
+        with self._lock:
+            self._board('university', student.university).update(
+                student.student_id, average_score, name=student.name, sessions=student.total_sessions)
+
+            filing_board = self._board('filing', self.filing_key(session.ticker, session.filing_period))
+            best = max(session.overall_score, filing_board.score(student.student_id) or 0.0)
+            filing_board.update(student.student_id, best, name=student.name, university=student.university,
+                                session_id=session.session_id)
+
+    def query(self, kind: str, name: str, offset: int = 0, limit: int = 25,
+              student_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """One page of a leaderboard, plus a student's own rank if asked"""
+        with self._lock:
+            board = self._boards.get((kind, name.lower()))
+            if board is None:
+                return None
+            return {
+                'leaderboard': board.name,
+                'type': kind,
+                'total': len(board),
+                'offset': offset,
+                'limit': limit,
+                'entries': board.page(offset, limit),
+                'student_rank': board.rank(student_id) if student_id else None
+            }
+
+
+def test_leaderboard():
+    """Rank a large class and check against a sort"""
+    import time
+    print("🧪 Testing Cohort Leaderboard")
+
+    board = Leaderboard("Rutgers")
+    scores = {f"student_{i}": random.uniform(40, 100) for i in range(20000)}
+    started = time.perf_counter()
+    for student_id, score in scores.items():
+        board.update(student_id, score)
+    for student_id in list(scores)[:5000]:
+        scores[student_id] = random.uniform(40, 100)
+        board.update(student_id, scores[student_id])
+    print(f"   ⏱️ 25,000 updates in {time.perf_counter() - started:.2f}s")
+
+    expected = sorted(scores, key=lambda student_id: (-scores[student_id], student_id))
+    assert [entry['student_id'] for entry in board.page(10000, 50)] == expected[10000:10050]
+    assert board.rank(expected[1234])['rank'] == 1235
+    print(f"✅ Ranks match a full sort ({len(board)} students)")
+
+
+if __name__ == "__main__":
+    test_leaderboard()
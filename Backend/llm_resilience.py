@@ -0,0 +1,292 @@
+"""
+10Q Notes AI - Resilient LLM Call Wrapper
+HackRU 2025 Project by azrabano
+
+Retry and hedging layer for Gemini extraction calls:
+- Bounded retries with exponential backoff and full jitter
+- Deadline budget shared by every call in one SMAP pipeline run
+- Optional hedged duplicate request once a call outlives its observed p95 latency
+"""
+
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from instrumentation import REGISTRY, track_stage
+from json_extraction import JSONExtractionError
+from structured_logging import get_logger
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:
+    google_exceptions = None
+
+log = get_logger(__name__)
+
+LLM_RETRIES = REGISTRY.counter('tenq_llm_retries_total', 'Retried LLM calls by call key', ['call'])
+LLM_HEDGES = REGISTRY.counter('tenq_llm_hedged_requests_total', 'Hedged duplicate LLM requests by call key', ['call'])
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the pipeline deadline budget runs out before a call succeeds"""
+
+
+class MalformedResponse(ValueError):
+    """The model answered, but its output failed parsing or validation"""
+
+
+class Deadline:
+    """Wall-clock budget shared across several LLM calls"""
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+@dataclass
+class RetryPolicy:
+    """Retry, backoff and hedging settings for LLM calls"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    pipeline_budget: float = 120.0
+
+    # Hedging: fire a duplicate request when a call exceeds its p95 latency
+    hedge_requests: bool = False
+    hedge_percentile: float = 0.95
+    hedge_min_delay: float = 1.0
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from GEMINI_* environment variables"""
+        return cls(
+            max_attempts=int(os.getenv('GEMINI_MAX_ATTEMPTS', cls.max_attempts)),
+            base_delay=float(os.getenv('GEMINI_BACKOFF_BASE_SECONDS', cls.base_delay)),
+            max_delay=float(os.getenv('GEMINI_BACKOFF_MAX_SECONDS', cls.max_delay)),
+            pipeline_budget=float(os.getenv('GEMINI_PIPELINE_DEADLINE_SECONDS', cls.pipeline_budget)),
+            hedge_requests=os.getenv('GEMINI_HEDGE_REQUESTS', 'false').lower() in ('1', 'true', 'yes'),
+        )
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) attempt"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+
+class LatencyTracker:
+    """Rolling window of observed latencies per call type"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """Nearest-rank percentile of the recorded latencies, or None without data"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q * len(samples))) - 1))
+        return samples[index]
+
+
+# Transport failures, timeouts and unusable model output; anything else is a bug or a bad request
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, MalformedResponse, JSONExtractionError)
+if google_exceptions is not None:
+    TRANSIENT_ERRORS += (
+        google_exceptions.TooManyRequests,      # 429
+        google_exceptions.ResourceExhausted,    # 429 (quota)
+        google_exceptions.InternalServerError,  # 500
+        google_exceptions.BadGateway,           # 502
+        google_exceptions.ServiceUnavailable,   # 503
+        google_exceptions.GatewayTimeout,       # 504
+        google_exceptions.DeadlineExceeded,     # 504 (gRPC)
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    """Decide whether an LLM call failure is worth another attempt"""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class ResilientCaller:
+    """Runs LLM calls with bounded retries, jittered backoff, deadlines and hedging"""
+
+    def __init__(self, policy: Optional[RetryPolicy] = None,
+                 latency_tracker: Optional[LatencyTracker] = None,
+                 max_workers: int = 8):
+        self.policy = policy or RetryPolicy.from_env()
+        self.latency = latency_tracker or LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+
+    def call(self, fn: Callable[[], Any], key: str,
+             parse: Optional[Callable[[Any], Any]] = None,
+             deadline: Optional[Deadline] = None) -> Any:
+        """
+        Call fn until it returns a response that parse accepts.
+
+        parse runs inside each attempt; a ValueError from it marks the output
+        malformed, which is retried like a transport error. Other errors
+        (TypeError, KeyError, 4xx responses) are raised at once. Raises the
+        last error once attempts or the deadline are exhausted.
+        """
+        with track_stage(f"llm_{key}", kind='client'):
+            return self._call(fn, key, parse, deadline)
+
+    def _call(self, fn: Callable[[], Any], key: str,
+              parse: Optional[Callable[[Any], Any]],
+              deadline: Optional[Deadline]) -> Any:
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.policy.max_attempts):
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded(f"{key}: deadline budget exhausted after {attempt} attempts")
+
+            try:
+                return self._attempt(fn, key, parse, deadline)
+            except Exception as e:
+                last_error = e
+                if not is_retryable(e) or attempt == self.policy.max_attempts - 1:
+                    break
+
+            delay = self.policy.backoff_delay(attempt)
+            if deadline is not None:
+                if deadline.remaining() <= delay:
+                    raise DeadlineExceeded(f"{key}: no budget left to retry ({last_error})")
+            LLM_RETRIES.inc(call=key)
+            log.warning("llm_call_retry", call=key, delay=round(delay, 2), attempt=attempt + 2,
+                        max_attempts=self.policy.max_attempts, error=str(last_error))
+            time.sleep(delay)
+
+        raise last_error
+
+    def _attempt(self, fn: Callable[[], Any], key: str,
+                 parse: Optional[Callable[[Any], Any]],
+                 deadline: Optional[Deadline]) -> Any:
+        """Single logical attempt, optionally hedged with a duplicate request"""
+
+        def run():
+            started = time.monotonic()
+            result = fn()
+            self.latency.record(key, time.monotonic() - started)
+            if parse is None:
+                return result
+            try:
+                return parse(result)
+            except MalformedResponse:
+                raise
+            except ValueError as e:
+                raise MalformedResponse(f"{key}: {e}") from e
+
+        timeout = deadline.remaining() if deadline is not None else None
+        # Attempts run on worker threads; carry the caller's context so they report to its span
+        primary = self._executor.submit(contextvars.copy_context().run, run)
+
+        hedge_after = self._hedge_delay(key)
+        if hedge_after is None or (timeout is not None and hedge_after >= timeout):
+            done, _ = wait([primary], timeout=timeout)
+            if not done:
+                raise DeadlineExceeded(f"{key}: call did not finish within the deadline budget")
+            return primary.result()
+
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        # Primary is slower than p95 - race a duplicate request against it
+        log.info("llm_call_hedged", call=key, hedge_after=round(hedge_after, 2))
+        LLM_HEDGES.inc(call=key)
+        pending = {primary, self._executor.submit(contextvars.copy_context().run, run)}
+        first_error: Optional[Exception] = None
+        while pending:
+            remaining = deadline.remaining() if deadline is not None else None
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{key}: hedged calls did not finish within the deadline budget")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def _hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None when hedging is off or unwarranted"""
+        if not self.policy.hedge_requests:
+            return None
+        if self.latency.count(key) < self.policy.hedge_min_samples:
+            return None
+        p95 = self.latency.percentile(key, self.policy.hedge_percentile)
+        return max(self.policy.hedge_min_delay, p95)
+
+
+def test_llm_resilience():
+    """Retry transient failures and malformed output; fail fast on bugs"""
+    from json_extraction import extract_json
+    print("🧪 Testing LLM Resilience")
+
+    assert is_retryable(TimeoutError("read timed out"))
+    assert is_retryable(ConnectionError("connection reset"))
+    assert is_retryable(JSONExtractionError("stream ended early"))
+    assert not is_retryable(TypeError("unexpected keyword argument 'strem'"))
+    assert not is_retryable(KeyError('financial_metrics'))
+    assert not is_retryable(ValueError("bad literal"))
+    assert not is_retryable(DeadlineExceeded("budget exhausted"))
+    if google_exceptions is not None:
+        assert is_retryable(google_exceptions.ResourceExhausted("quota"))
+        assert is_retryable(google_exceptions.ServiceUnavailable("overloaded"))
+        assert not is_retryable(google_exceptions.InvalidArgument("prompt too long"))
+
+    caller = ResilientCaller(RetryPolicy(max_attempts=3, base_delay=0.0), max_workers=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise TimeoutError("first attempt timed out")
+        return "not json" if len(attempts) == 2 else '{"ok": true}'
+
+    assert caller.call(flaky, key='demo', parse=extract_json) == {'ok': True}
+    assert len(attempts) == 3  # timeout, malformed output, success
+
+    def buggy():
+        attempts.append(1)
+        raise TypeError("generate_content() got an unexpected keyword argument")
+
+    attempts.clear()
+    try:
+        caller.call(buggy, key='demo')
+        raise AssertionError("TypeError should propagate")
+    except TypeError:
+        pass
+    assert len(attempts) == 1
+    print("✅ Transient errors retried, programming errors raised immediately")
+
+
+if __name__ == "__main__":
+    test_llm_resilience()
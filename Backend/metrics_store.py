@@ -0,0 +1,254 @@
+"""
+10Q Notes AI - Financial Metrics Store
+HackRU 2025 Project by azrabano
+
+Columnar store of FinancialMetrics for cohort analytics:
+- One row per filing, one NumPy column per metric plus a validity mask
+- Vectorized percentiles, percentile ranks and z-scores by industry and period
+- Per-company history with year-over-year growth matched on fiscal quarter
+"""
+
+import re
+import threading
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from enhanced_gemini_service import FinancialMetrics
+
+METRIC_FIELDS = tuple(f.name for f in fields(FinancialMetrics) if f.name not in ('quarter', 'year', 'filing_date'))
+
+_QUARTER = re.compile(r'Q([1-4])', re.IGNORECASE)
+_YEAR = re.compile(r'(19|20)\d{2}')
+
+
+def period_key(filing_period: str = "", quarter: Optional[str] = None, year: Optional[int] = None) -> int:
+    """Sortable fiscal-quarter index (year * 4 + quarter - 1); annual filings count as Q4, -1 if unknown"""
+    text = f"{quarter or ''} {year or ''} {filing_period or ''}"
+    year_match = _YEAR.search(text)
+    if not year_match:
+        return -1
+    quarter_match = _QUARTER.search(text)
+    quarter_number = int(quarter_match.group(1)) if quarter_match else 4
+    return int(year_match.group(0)) * 4 + quarter_number - 1
+
+
+def period_label(key: int) -> str:
+    return f"Q{key % 4 + 1} {key // 4}" if key >= 0 else "Unknown"
+
+
+class FinancialMetricsStore:
+    """Array-backed FinancialMetrics table with a validity mask, upserted by filing_id"""
+
+    def __init__(self, initial_capacity: int = 64):
+        capacity = max(1, initial_capacity)
+        self.columns = {name: index for index, name in enumerate(METRIC_FIELDS)}
+        self._values = np.full((capacity, len(METRIC_FIELDS)), np.nan)
+        self._valid = np.zeros((capacity, len(METRIC_FIELDS)), dtype=bool)
+        self._period_keys = np.full(capacity, -1, dtype=np.int64)
+        self._tickers = np.empty(capacity, dtype=object)
+        self._industries = np.empty(capacity, dtype=object)
+        self._companies = np.empty(capacity, dtype=object)
+        self._filing_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self):
+        capacity = self._values.shape[0] * 2
+        for name in ('_values', '_valid', '_period_keys', '_tickers', '_industries', '_companies'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self._values[self.size:] = np.nan
+        self._valid[self.size:] = False
+        self._period_keys[self.size:] = -1
+
+    def add(self, filing_id: str, ticker: str, company_name: str, industry: str,
+            filing_period: str, metrics: FinancialMetrics) -> int:
+        """Insert or replace the row for a filing; returns the row index"""
+        with self._lock:
+            row = self._rows.get(filing_id)
+            if row is None:
+                if self.size == self._values.shape[0]:
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self._rows[filing_id] = row
+                self._filing_ids.append(filing_id)
+
+            raw = [getattr(metrics, name) for name in METRIC_FIELDS]
+            self._valid[row] = [value is not None for value in raw]
+            self._values[row] = [np.nan if value is None else float(value) for value in raw]
+            self._period_keys[row] = period_key(filing_period, metrics.quarter, metrics.year)
+            self._tickers[row] = (ticker or '').upper()
+            self._industries[row] = industry or ''
+            self._companies[row] = company_name or ticker
+            return row
+
+    def _mask(self, industry: Optional[str] = None, period: Optional[int] = None,
+              ticker: Optional[str] = None) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        if industry:
+            mask &= np.char.lower(self._industries[:self.size].astype(str)) == industry.lower()
+        if period is not None:
+            mask &= self._period_keys[:self.size] == period
+        if ticker:
+            mask &= self._tickers[:self.size] == ticker.upper()
+        return mask
+
+    def column(self, metric: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Valid values of one metric, optionally restricted to a row mask"""
+        index = self.columns[metric]
+        with self._lock:
+            selected = self._valid[:self.size, index].copy()
+            if mask is not None:
+                selected &= mask
+            return self._values[:self.size, index][selected]
+
+    def cohort(self, metric: str, industry: Optional[str] = None, period: Optional[int] = None) -> np.ndarray:
+        """Valid values of a metric for one industry and/or period"""
+        with self._lock:
+            return self.column(metric, self._mask(industry, period))
+
+    def industry_of(self, ticker: str) -> Optional[str]:
+        """Industry recorded for a company's most recent row"""
+        with self._lock:
+            rows = np.flatnonzero(self._mask(ticker=ticker))
+            return self._industries[rows[-1]] or None if rows.size else None
+
+    def latest_period(self, industry: Optional[str] = None) -> Optional[int]:
+        with self._lock:
+            keys = self._period_keys[:self.size][self._mask(industry)]
+            keys = keys[keys >= 0]
+            return int(keys.max()) if keys.size else None
+
+    def percentiles(self, metric: str, percentiles: Tuple[float, ...] = (25, 50, 75),
+                    industry: Optional[str] = None, period: Optional[int] = None) -> Dict[str, Any]:
+        """Percentiles, mean and sample size of a metric across a cohort"""
+        values = self.cohort(metric, industry, period)
+        if values.size == 0:
+            return {'sample_size': 0, **{f'percentile_{int(p)}': None for p in percentiles}, 'mean': None}
+        computed = np.percentile(values, percentiles)
+        upper_quartile = values[values >= np.percentile(values, 75)]
+        return {
+            'sample_size': int(values.size),
+            **{f'percentile_{int(p)}': float(v) for p, v in zip(percentiles, computed)},
+            'mean': float(values.mean()),
+            'std': float(values.std()),
+            'min': float(values.min()),
+            'max': float(values.max()),
+            'top_quartile_mean': float(upper_quartile.mean())
+        }
+
+    def percentile_rank(self, metric: str, value: Optional[float], industry: Optional[str] = None,
+                        period: Optional[int] = None) -> Optional[float]:
+        """Share of the cohort (0-100) at or below value"""
+        if value is None:
+            return None
+        values = self.cohort(metric, industry, period)
+        if values.size == 0:
+            return None
+        return float(100.0 * ((values < value).sum() + 0.5 * (values == value).sum()) / values.size)
+
+    def zscores(self, metric: str, industry: Optional[str] = None,
+                period: Optional[int] = None) -> Dict[str, float]:
+        """Z-score of every filing in the cohort for one metric, keyed by filing_id"""
+        index = self.columns[metric]
+        with self._lock:
+            mask = self._mask(industry, period) & self._valid[:self.size, index]
+            rows = np.flatnonzero(mask)
+            values = self._values[rows, index]
+            filing_ids = [self._filing_ids[row] for row in rows]
+        if values.size == 0:
+            return {}
+        std = values.std()
+        scores = (values - values.mean()) / std if std > 0 else np.zeros_like(values)
+        return dict(zip(filing_ids, scores.astype(float).tolist()))
+
+    def history(self, ticker: str, metric: str) -> List[Dict[str, Any]]:
+        """A company's values by period (oldest first) with YoY growth versus the same quarter a year earlier"""
+        index = self.columns[metric]
+        with self._lock:
+            mask = self._mask(ticker=ticker) & self._valid[:self.size, index] & (self._period_keys[:self.size] >= 0)
+            rows = np.flatnonzero(mask)
+            keys = self._period_keys[rows]
+            values = self._values[rows, index]
+
+        if keys.size == 0:
+            return []
+
+        # Latest filing wins if a period was ingested twice
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys, values = keys[last], values[last]
+
+        prior = np.minimum(np.searchsorted(keys, keys - 4), keys.size - 1)
+        has_prior = keys[prior] == keys - 4
+        prior_values = values[prior]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yoy = np.where(has_prior & (prior_values != 0),
+                           (values - prior_values) / np.abs(prior_values), np.nan)
+
+        return [
+            {'period': period_label(int(key)), 'value': float(value),
+             'yoy_growth': None if np.isnan(growth) else float(growth)}
+            for key, value, growth in zip(keys, values, yoy)
+        ]
+
+    def latest_by_company(self, industry: Optional[str] = None,
+                          metrics: Tuple[str, ...] = METRIC_FIELDS) -> List[Dict[str, Any]]:
+        """Most recent filing's metrics for each company in a cohort"""
+        with self._lock:
+            rows = np.flatnonzero(self._mask(industry))
+            order = rows[np.argsort(self._period_keys[rows], kind='stable')]
+            latest = {self._tickers[row]: row for row in order}
+            return [
+                {
+                    'ticker': ticker,
+                    'company': self._companies[row],
+                    'period': period_label(int(self._period_keys[row])),
+                    **{metric: (float(self._values[row, self.columns[metric]])
+                                if self._valid[row, self.columns[metric]] else None) for metric in metrics}
+                }
+                for ticker, row in latest.items()
+            ]
+
+
+def test_metrics_store():
+    """Cohort percentiles, upserts past the initial capacity and YoY history"""
+    print("🧪 Testing Financial Metrics Store")
+
+    store = FinancialMetricsStore(initial_capacity=2)
+    for year in (2024, 2025):
+        for quarter in (1, 2):
+            store.add(f"JPM_Q{quarter}_{year}", 'JPM', 'JPMorgan Chase', 'Banking', f"Q{quarter} {year}",
+                      FinancialMetrics(total_revenue=40000 + 1000 * (year - 2024) + 100 * quarter,
+                                       return_on_equity=0.15 + 0.01 * quarter))
+    store.add('BAC_Q2_2025', 'BAC', 'Bank of America', 'Banking', 'Q2 2025',
+              FinancialMetrics(total_revenue=25000.0))
+    store.add('BAC_Q2_2025', 'BAC', 'Bank of America', 'Banking', 'Q2 2025',
+              FinancialMetrics(total_revenue=26000.0, return_on_equity=0.11))  # upsert, not a new row
+    assert len(store) == 5 and store._values.shape[0] == 8
+
+    q2 = period_key('Q2 2025')
+    stats = store.percentiles('return_on_equity', industry='banking', period=q2)
+    assert stats['sample_size'] == 2 and abs(stats['percentile_50'] - 0.14) < 1e-9
+    assert store.percentile_rank('total_revenue', 26000.0, industry='Banking', period=q2) == 25.0
+    assert store.latest_period('Banking') == q2
+
+    history = store.history('JPM', 'total_revenue')
+    assert [row['period'] for row in history] == ['Q1 2024', 'Q2 2024', 'Q1 2025', 'Q2 2025']
+    assert history[0]['yoy_growth'] is None and abs(history[3]['yoy_growth'] - 1000 / 40200) < 1e-9
+    print(f"   📈 JPM revenue: {history}")
+    print("✅ Cohort statistics and history computed from columns")
+
+
+if __name__ == "__main__":
+    test_metrics_store()
@@ -137,8 +137,10 @@ class MLHPrizeDemo:
         
         print("   📈 Revenue Trend Analysis:")
         for period in historical_data['periods'][-4:]:
-            growth_indicator = "📈" if period['yoy_growth'] > 0.05 else "📊"
-            print(f"   {growth_indicator} {period['period']}: ${period['value']:,}M (+{period['yoy_growth']:.1%} YoY)")
+            growth = period['yoy_growth']
+            growth_indicator = "📈" if growth is not None and growth > 0.05 else "📊"
+            yoy = f" ({growth:+.1%} YoY)" if growth is not None else ""
+            print(f"   {growth_indicator} {period['period']}: ${period['value']:,.0f}M{yoy}")
         
         trend = historical_data['trend_analysis']
         print(f"   🎯 Trend Direction: {trend['direction'].upper()}")
@@ -151,7 +153,7 @@ class MLHPrizeDemo:
         roe_data = benchmarks['metrics']['return_on_equity']
         current_roe = enhanced_smap.financial_metrics.return_on_equity
         
-        if current_roe:
+        if current_roe and roe_data['industry_median'] is not None:
             print(f"   📊 Company ROE: {current_roe:.1%}")
             print(f"   🏛️ Industry Median: {roe_data['industry_median']:.1%}")
             print(f"   🎯 75th Percentile: {roe_data['percentile_75']:.1%}")
@@ -168,8 +170,11 @@ class MLHPrizeDemo:
         # Peer comparison
         print(f"\n🏆 PEER COMPARISON ANALYSIS:")
         for peer in benchmarks['peer_comparison'][:4]:
+            if peer['roe'] is None:
+                continue
             status = "🟢" if peer['roe'] < (current_roe or 0.15) else "🟡"
-            print(f"   {status} {peer['company']}: ROE {peer['roe']:.1%}, Efficiency {peer['efficiency']:.1%}")
+            efficiency = f"{peer['efficiency']:.1%}" if peer['efficiency'] is not None else "N/A"
+            print(f"   {status} {peer['company']}: ROE {peer['roe']:.1%}, Efficiency {efficiency}")
         
         # Advanced analytics queries
         print(f"\n📈 ADVANCED SNOWFLAKE ANALYTICS:")
@@ -198,7 +203,7 @@ class MLHPrizeDemo:
         
         print("   🏛️ Performance vs Peers:")
         for key, value in insights['performance_vs_peers'].items():
-            percentile = f"{value}th percentile"
+            percentile = f"{value:.0f}th percentile" if value is not None else "N/A"
             print(f"     • {key.replace('_', ' ').title()}: {percentile}")
         
         print("   🎯 Key Strengths:")
@@ -0,0 +1,288 @@
+"""
+10Q Notes AI - Numeric Fact Index
+HackRU 2025 Project by azrabano
+
+Per-filing index of reported numbers for instant metric verification:
+- Facts from FinancialMetrics and the statement tables found by DocumentProcessor
+- Values normalized like FinancialMetrics (USD millions, ratios as decimals, per-share in USD)
+- Sorted per-kind arrays with tolerance bands, searched with bisect
+- Regex extractor for numbers quoted in student text ($42.5B, 6.8%, 17.8% ROE, 1.2x)
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from enhanced_gemini_service import FinancialMetrics
+
+# Relative band around each reported value, on top of the precision the student quoted
+FACT_RELATIVE_TOLERANCE = 0.005
+
+AMOUNT_FIELDS = ('total_revenue', 'net_income', 'net_interest_income', 'noninterest_revenue',
+                 'provision_credit_losses')
+PERCENT_FIELDS = ('revenue_yoy_growth', 'net_income_yoy_growth', 'net_interest_margin', 'efficiency_ratio',
+                  'return_on_equity', 'common_equity_tier1_ratio', 'gross_margin', 'operating_margin')
+PER_SHARE_FIELDS = ('book_value_per_share', 'earnings_per_share', 'diluted_eps')
+RATIO_FIELDS = ('debt_to_equity', 'current_ratio')
+
+# Which fact kinds a quoted number can be compared with
+COMPATIBLE_KINDS = {
+    'percent': ('percent',),
+    'amount': ('amount',),
+    'dollars': ('per_share', 'amount'),
+    'ratio': ('ratio',),
+    'plain': ('amount', 'per_share', 'ratio')
+}
+
+_SCALES = {
+    'trillion': 1e6, 'tn': 1e6, 't': 1e6,
+    'billion': 1e3, 'bn': 1e3, 'b': 1e3,
+    'million': 1.0, 'mm': 1.0, 'm': 1.0,
+    'thousand': 1e-3, 'k': 1e-3
+}
+
+_NUMBER = re.compile(
+    r'(?<![\w.])(?P<negative>-|\()?(?P<dollar>\$)?\s?(?P<value>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)'
+    r'\s?(?P<unit>%|percent\b|trillion\b|billion\b|million\b|thousand\b|bn\b|tn\b|mm\b|[tbmk]\b|x\b)?'
+    r'(?!-?[A-Za-z])',
+    re.IGNORECASE
+)
+_TABLE_LINE = re.compile(r'^\s*(?P<label>[A-Za-z][A-Za-z0-9 &,\'()/\-]{2,80}?)\s*[:.]?\s+(?P<rest>[$(\-]?\s?\d.*)$')
+_TABLE_SCALE = re.compile(r'in (millions|billions|thousands)', re.IGNORECASE)
+
+
+@dataclass
+class NumericFact:
+    """A reported number with its normalized value"""
+    name: str
+    value: float
+    kind: str  # 'amount' (USD millions), 'percent' (decimal), 'per_share' (USD) or 'ratio'
+    source: str  # 'financial_metrics' or a statement table name
+    tolerance: float = 0.0
+
+    @property
+    def label(self) -> str:
+        return self.name.replace('_', ' ').title()
+
+
+@dataclass
+class QuotedNumber:
+    """A number found in student text, normalized like the facts it is checked against"""
+    text: str
+    value: float
+    kind: str  # 'percent', 'amount', 'dollars', 'ratio' or 'plain'
+    precision: float  # half a unit of the last quoted digit, normalized
+    start: int = 0
+
+
+@dataclass
+class FactCheck:
+    quoted: QuotedNumber
+    matches: List[NumericFact] = field(default_factory=list)
+
+    @property
+    def verified(self) -> bool:
+        return bool(self.matches)
+
+
+@dataclass
+class VerificationReport:
+    """Result of checking every number in a piece of student text"""
+    checks: List[FactCheck] = field(default_factory=list)
+
+    @property
+    def quoted(self) -> int:
+        return len(self.checks)
+
+    @property
+    def verified(self) -> int:
+        return sum(1 for check in self.checks if check.verified)
+
+    @property
+    def accuracy(self) -> Optional[float]:
+        return self.verified / self.quoted if self.checks else None
+
+    def feedback(self) -> List[str]:
+        """One line per quoted number"""
+        lines = []
+        for check in self.checks:
+            if check.verified:
+                names = ', '.join(fact.label for fact in check.matches[:2])
+                lines.append(f"✓ {check.quoted.text} matches {names}")
+            else:
+                lines.append(f"✗ {check.quoted.text} does not match any figure reported in the filing")
+        return lines
+
+    def to_dict(self) -> Dict:
+        return {
+            'quoted': self.quoted,
+            'verified': self.verified,
+            'accuracy': self.accuracy,
+            'checks': [
+                {'text': check.quoted.text, 'value': check.quoted.value, 'kind': check.quoted.kind,
+                 'matches': [asdict(fact) for fact in check.matches]}
+                for check in self.checks
+            ],
+            'feedback': self.feedback()
+        }
+
+
+def _decimals(number_text: str) -> int:
+    return len(number_text.split('.')[1]) if '.' in number_text else 0
+
+
+def extract_numbers(text: str, default_scale: Optional[float] = None) -> List[QuotedNumber]:
+    """
+    Find numbers in text and normalize them.
+
+    default_scale applies to bare numbers (statement tables "in millions"); in
+    free text bare numbers without a decimal or thousands separator are skipped,
+    as are values that look like years.
+    """
+    numbers = []
+    for match in _NUMBER.finditer(text or ''):
+        raw = match.group('value')
+        value = float(raw.replace(',', ''))
+        half_unit = 0.5 * 10 ** -_decimals(raw)
+        unit = (match.group('unit') or '').lower()
+        sign = -1.0 if match.group('negative') else 1.0
+
+        if unit in ('%', 'percent'):
+            kind, scale = 'percent', 0.01
+        elif unit in _SCALES:
+            kind, scale = 'amount', _SCALES[unit]
+        elif unit == 'x':
+            kind, scale = 'ratio', 1.0
+        elif default_scale is not None:
+            kind, scale = 'amount', default_scale
+        elif match.group('dollar'):
+            kind, scale = 'dollars', 1.0
+        else:
+            if ('.' not in raw and ',' not in raw) or (1900 <= value <= 2100 and '.' not in raw):
+                continue
+            kind, scale = 'plain', 1.0
+
+        numbers.append(QuotedNumber(
+            text=match.group(0).strip(' (-'),
+            value=sign * value * scale,
+            kind=kind,
+            precision=half_unit * scale,
+            start=match.start()
+        ))
+    return numbers
+
+
+class NumericFactIndex:
+    """Sorted per-kind index of a filing's reported numbers"""
+
+    def __init__(self, facts: List[NumericFact]):
+        self.facts = facts
+        self._values: Dict[str, List[float]] = {}
+        self._facts: Dict[str, List[NumericFact]] = {}
+        self._max_tolerance: Dict[str, float] = {}
+
+        for kind in ('amount', 'percent', 'per_share', 'ratio'):
+            # Signs are dropped: students write "down 5%" for a -0.05 growth rate
+            kind_facts = sorted((fact for fact in facts if fact.kind == kind), key=lambda fact: abs(fact.value))
+            self._facts[kind] = kind_facts
+            self._values[kind] = [abs(fact.value) for fact in kind_facts]
+            self._max_tolerance[kind] = max((fact.tolerance for fact in kind_facts), default=0.0)
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    @classmethod
+    def from_filing(cls, financial_metrics: Optional[FinancialMetrics] = None,
+                    tables: Optional[Dict[str, str]] = None) -> 'NumericFactIndex':
+        """Build the index from extracted FinancialMetrics and DocumentProcessor statement tables"""
+        facts = []
+
+        if financial_metrics is not None:
+            for names, kind in ((AMOUNT_FIELDS, 'amount'), (PERCENT_FIELDS, 'percent'),
+                                (PER_SHARE_FIELDS, 'per_share'), (RATIO_FIELDS, 'ratio')):
+                for name in names:
+                    value = getattr(financial_metrics, name)
+                    if value is not None:
+                        facts.append(cls._fact(name, value, kind, 'financial_metrics'))
+
+        for section, table_text in (tables or {}).items():
+            facts.extend(cls._table_facts(section, table_text))
+
+        return cls(facts)
+
+    @classmethod
+    def _table_facts(cls, section: str, table_text: str) -> List[NumericFact]:
+        """Label/value facts from statement lines such as "Net income: $13,420 million" """
+        scale_match = _TABLE_SCALE.search(table_text[:2000])
+        default_scale = {'millions': 1.0, 'billions': 1e3, 'thousands': 1e-3}[scale_match.group(1).lower()] \
+            if scale_match else 1.0
+
+        facts = []
+        for line in table_text.splitlines():
+            line_match = _TABLE_LINE.match(line)
+            if not line_match:
+                continue
+            numbers = extract_numbers(line_match.group('rest'), default_scale=default_scale)
+            if not numbers:
+                continue
+            # The first figure on a statement line is the current period
+            number = numbers[0]
+            kind = 'percent' if number.kind == 'percent' else 'ratio' if number.kind == 'ratio' else 'amount'
+            name = re.sub(r'[^a-z0-9]+', '_', line_match.group('label').lower()).strip('_')
+            facts.append(cls._fact(name, number.value, kind, section))
+        return facts
+
+    @staticmethod
+    def _fact(name: str, value: float, kind: str, source: str) -> NumericFact:
+        return NumericFact(name=name, value=value, kind=kind, source=source,
+                           tolerance=abs(value) * FACT_RELATIVE_TOLERANCE)
+
+    def lookup(self, quoted: QuotedNumber) -> List[NumericFact]:
+        """Facts whose tolerance band overlaps the quoted number's precision band"""
+        target = abs(quoted.value)
+        matches = []
+        for kind in COMPATIBLE_KINDS[quoted.kind]:
+            values = self._values.get(kind)
+            if not values:
+                continue
+            window = quoted.precision + self._max_tolerance[kind]
+            lo = bisect_left(values, target - window)
+            hi = bisect_right(values, target + window)
+            for fact in self._facts[kind][lo:hi]:
+                if abs(abs(fact.value) - target) <= quoted.precision + fact.tolerance:
+                    matches.append(fact)
+        return matches
+
+    def verify(self, text: str) -> VerificationReport:
+        """Check every number quoted in text against the filing's facts"""
+        return VerificationReport([FactCheck(quoted, self.lookup(quoted)) for quoted in extract_numbers(text)])
+
+
+def test_numeric_fact_index():
+    """Test numeric fact lookups against a sample filing"""
+    print("🧪 Testing Numeric Fact Index")
+
+    metrics = FinancialMetrics(
+        total_revenue=42550.0, revenue_yoy_growth=0.068, net_income=13420.0,
+        return_on_equity=0.178, common_equity_tier1_ratio=0.159, net_interest_margin=0.0274,
+        book_value_per_share=95.35
+    )
+    tables = {'income_statement': "CONSOLIDATED STATEMENT OF INCOME (in millions)\n"
+                                  "Net interest income: 23,900\nNoninterest revenue: 18,650\n"}
+    index = NumericFactIndex.from_filing(metrics, tables)
+    print(f"📇 Indexed {len(index)} facts")
+
+    report = index.verify("Revenue grew 6.8% to $42.5B, ROE 17.8%, NII of $23.9 billion, CET1 12%, BVPS $95.35.")
+    for line in report.feedback():
+        print(f"   {line}")
+    assert len(index) == 9
+    assert (report.quoted, report.verified) == (6, 5)
+    mismatched = [check.quoted.text for check in report.checks if not check.verified]
+    assert mismatched == ['12%']  # CET1 is 15.9%
+    assert [fact.label for fact in report.checks[1].matches] == ['Total Revenue']
+    print(f"✅ {report.verified}/{report.quoted} quoted numbers verified")
+
+
+if __name__ == "__main__":
+    test_numeric_fact_index()
@@ -0,0 +1,186 @@
+"""
+10Q Notes AI - Sampling Profiler
+HackRU 2025 Project by azrabano
+
+Low-overhead wall-clock sampling profiler for a running worker:
+- A background thread samples every thread's Python stack at a fixed interval (sys._current_frames)
+- No tracing hooks, so the profiled code runs at full speed between samples
+- Output in the collapsed-stack format read by flamegraph.pl, speedscope and inferno
+- Recent profiles kept in memory for download after a profiled request
+"""
+
+import os
+import sys
+import time
+import uuid
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 10))
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', 20))
+
+# Leaf frames of threads parked waiting for work; dropped unless include_idle is set
+IDLE_FRAMES = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'), ('selectors.py', 'select'),
+    ('queue.py', 'get'), ('thread.py', '_worker'), ('handlers.py', 'dequeue')
+}
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples stacks until stopped:
+
+        profiler = SamplingProfiler().start()
+        ...
+        profiler.stop()
+        open('worker.collapsed', 'w').write(profiler.collapsed())
+
+    Each collapsed line is "thread;outermost;...;innermost count".
+    """
+
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS, include_idle: bool = False):
+        self.interval = max(interval_ms, 1.0) / 1000
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'SamplingProfiler':
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="sampling-profiler")
+        self._thread.start()
+        return self
+
+    def stop(self) -> 'SamplingProfiler':
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.time()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.stacks[";".join([names.get(ident, f"thread-{ident}")] + stack)] += 1
+            self.samples += 1
+            self.sampling_seconds += time.perf_counter() - started
+
+    def _stack(self, frame):
+        code = frame.f_code
+        if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, float]:
+        duration = (self.stopped_at or time.time()) - self.started_at
+        return {
+            'duration_seconds': round(duration, 3),
+            'samples': self.samples,
+            'stacks': len(self.stacks),
+            'interval_ms': self.interval * 1000,
+            # Share of one core spent walking stacks
+            'overhead_ratio': round(self.sampling_seconds / duration, 5) if duration else 0.0
+        }
+
+
+class ProfileStore:
+    """The last few profiles, by id, for download after a profiled request"""
+
+    def __init__(self, keep: int = PROFILER_KEEP):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, SamplingProfiler]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profiler: SamplingProfiler) -> str:
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = profiler
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[SamplingProfiler]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+profiles = ProfileStore()
+_worker_profile_lock = threading.Lock()
+
+
+def profile_worker(seconds: float, interval_ms: float = PROFILER_INTERVAL_MS,
+                   include_idle: bool = False) -> Optional[SamplingProfiler]:
+    """
+    Profile the whole process for a number of seconds (blocking; call off the event loop).
+
+    Returns None if another worker-wide profile is already running.
+    """
+    if not _worker_profile_lock.acquire(blocking=False):
+        return None
+    try:
+        seconds = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+        log.info("worker_profile_started", seconds=seconds, interval_ms=interval_ms, pid=os.getpid())
+        profiler = SamplingProfiler(interval_ms, include_idle).start()
+        time.sleep(seconds)
+        profiler.stop()
+        log.info("worker_profile_finished", pid=os.getpid(), **profiler.summary())
+        return profiler
+    finally:
+        _worker_profile_lock.release()
+
+
+def test_profiler():
+    """Profile a CPU-bound regex loop on a worker thread"""
+    import re
+    print("🧪 Testing Sampling Profiler")
+
+    def clean_filing():
+        text = "Net revenue  was   $42.1 billion  ,  up 8%  " * 20000
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            re.sub(r'\s+', ' ', text)
+
+    worker = threading.Thread(target=clean_filing, name="filing-worker")
+    profiler = SamplingProfiler(interval_ms=5).start()
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    hottest = profiler.stacks.most_common(1)[0][0]
+    assert hottest.startswith("filing-worker;") and "clean_filing" in hottest
+    print(f"   🔥 {hottest}")
+    print(f"   📊 {profiler.summary()}")
+    print("✅ Collapsed stacks captured")
+
+
+if __name__ == "__main__":
+    test_profiler()
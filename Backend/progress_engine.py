@@ -0,0 +1,234 @@
+"""
+10Q Notes AI - Progress Engine
+HackRU 2025 Project by azrabano
+
+Event-sourced student progress:
+- Every graded submission arrives as a ProgressEvent from the learning event log
+- Only aggregates are kept in memory (and in snapshots); the durable log replays them
+- Exact running aggregates per student and per skill (count, sum, sum of squares)
+- Learning streaks from real calendar dates
+- Skill levels and achievements updated as each event is applied, O(1) per submission
+"""
+
+import math
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# SMAP section -> skill it exercises
+SECTION_SKILLS = {
+    'subjective': 'narrative_summarization',
+    'metrics': 'metric_extraction',
+    'assessment': 'analytical_reasoning',
+    'plan': 'action_planning'
+}
+
+SKILLS = ('narrative_summarization', 'metric_extraction', 'analytical_reasoning', 'action_planning', 'jargon_decoding')
+
+
+@dataclass
+class ProgressEvent:
+    """A graded submission"""
+    student_id: str
+    session_id: str
+    occurred_at: str  # ISO timestamp
+    overall_score: float
+    section_scores: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class RunningStats:
+    """Exact count, mean and variance from count, sum and sum of squares"""
+    count: int = 0
+    total: float = 0.0
+    sum_squares: float = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.sum_squares += value * value
+
+    def remove(self, value: float):
+        self.count -= 1
+        self.total -= value
+        self.sum_squares -= value * value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        variance = (self.sum_squares - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {'count': self.count, 'mean': self.mean, 'std': self.std}
+
+
+@dataclass
+class StudentProgress:
+    """Aggregates for one student, folded from their events"""
+    overall: RunningStats = field(default_factory=RunningStats)
+    skills: Dict[str, RunningStats] = field(default_factory=dict)
+    skill_levels: Dict[str, float] = field(default_factory=lambda: {skill: 1 for skill in SKILLS})
+    session_scores: Dict[str, Tuple[float, Dict[str, float]]] = field(default_factory=dict)
+    current_streak: int = 0
+    longest_streak: int = 0
+    last_active_date: Optional[date] = None
+    last_active: str = ""
+    achievements: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def completed(self) -> int:
+        return self.overall.count
+
+
+def _mastered_skill(progress: StudentProgress) -> Optional[str]:
+    return next((skill for skill, level in progress.skill_levels.items() if level >= 8), None)
+
+
+# (title, description, icon, predicate); a predicate returning a string fills {} in the title
+ACHIEVEMENT_RULES: List[Tuple[str, str, str, Callable[[StudentProgress], object]]] = [
+    ('First Analysis', 'Completed your first SMAP analysis', '🎉', lambda p: p.completed >= 1),
+    ('Analyst in Training', 'Completed 5 financial analyses', '📊', lambda p: p.completed >= 5),
+    ('Expert Analyst', 'Maintaining 85+ average score', '🏆', lambda p: p.completed and p.overall.mean >= 85),
+    ('Consistent Learner', '7-day learning streak', '🔥', lambda p: p.current_streak >= 7),
+    ('Expert in {}', 'Mastered advanced skill level', '⭐',
+     lambda p: (_mastered_skill(p) or '').replace('_', ' ').title())
+]
+
+
+class ProgressEngine:
+    """Per-student aggregates applied as ProgressEvents arrive; the events themselves are not kept"""
+
+    def __init__(self):
+        self._students: Dict[str, StudentProgress] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def replay(cls, events: Iterable[ProgressEvent]) -> 'ProgressEngine':
+        """Rebuild every student's aggregates from a stored event log"""
+        engine = cls()
+        for event in sorted(events, key=lambda event: event.occurred_at):
+            engine.record(event)
+        return engine
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        state.pop('events', None)  # snapshots taken when the engine still kept raw events
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def progress(self, student_id: str) -> StudentProgress:
+        with self._lock:
+            return self._students.setdefault(student_id, StudentProgress())
+
+    def record(self, event: ProgressEvent) -> StudentProgress:
+        """Fold an event into the student's aggregates"""
+        with self._lock:
+            progress = self._students.setdefault(event.student_id, StudentProgress())
+            skill_scores = {SECTION_SKILLS[section]: float(score)
+                            for section, score in event.section_scores.items() if section in SECTION_SKILLS}
+
+            previous = progress.session_scores.get(event.session_id)
+            if previous is not None:
+                # A re-graded session replaces its earlier scores
+                progress.overall.remove(previous[0])
+                for skill, score in previous[1].items():
+                    progress.skills[skill].remove(score)
+            progress.session_scores[event.session_id] = (float(event.overall_score), skill_scores)
+
+            progress.overall.add(float(event.overall_score))
+            for skill, score in skill_scores.items():
+                progress.skills.setdefault(skill, RunningStats()).add(score)
+                if previous is None:
+                    self._update_skill_level(progress, skill, score)
+
+            self._update_streak(progress, event.occurred_at)
+            progress.achievements = self._achievements(progress)
+            return progress
+
+    @staticmethod
+    def _update_skill_level(progress: StudentProgress, skill: str, score: float):
+        """Gradual level changes: up after a strong section, down after a weak one"""
+        level = progress.skill_levels.get(skill, 1)
+        if score >= 85:
+            progress.skill_levels[skill] = min(10, level + 1)
+        elif score < 70:
+            progress.skill_levels[skill] = max(1, level - 0.5)
+
+    @staticmethod
+    def _update_streak(progress: StudentProgress, occurred_at: str):
+        """Consecutive calendar days with a submission"""
+        moment = datetime.fromisoformat(occurred_at)
+        day = moment.date()
+        last = progress.last_active_date
+
+        if last is None or (day - last).days > 1:
+            progress.current_streak = 1
+        elif (day - last).days == 1:
+            progress.current_streak += 1
+        elif day < last:
+            return  # late-arriving event for a day already covered
+
+        progress.last_active_date = day
+        progress.last_active = moment.isoformat()
+        progress.longest_streak = max(progress.longest_streak, progress.current_streak)
+
+    @staticmethod
+    def _achievements(progress: StudentProgress) -> List[Dict[str, str]]:
+        achievements = []
+        for title, description, icon, predicate in ACHIEVEMENT_RULES:
+            earned = predicate(progress)
+            if earned:
+                achievements.append({'title': title.format(earned), 'description': description, 'icon': icon})
+        return achievements
+
+    def summary(self, student_id: str, as_of: Optional[date] = None) -> Dict[str, object]:
+        """Dashboard view of a student's aggregates; a streak lapses once a day is missed"""
+        progress = self.progress(student_id)
+        today = as_of or date.today()
+        active = progress.last_active_date is not None and (today - progress.last_active_date).days <= 1
+        return {
+            'completed': progress.completed,
+            'average_score': progress.overall.mean,
+            'score_std': progress.overall.std,
+            'current_streak': progress.current_streak if active else 0,
+            'longest_streak': progress.longest_streak,
+            'skills': {skill: stats.to_dict() for skill, stats in progress.skills.items()}
+        }
+
+
+def test_progress_engine():
+    """Replay a week of submissions"""
+    print("🧪 Testing Progress Engine")
+
+    events = [ProgressEvent('student', f'session-{day}', f'2025-03-{day:02d}T10:00:00', score,
+                            {'subjective': score, 'metrics': score - 5, 'assessment': score, 'plan': score + 2})
+              for day, score in enumerate([72, 88, 91, 79, 86, 90, 93], start=1)]
+    events.append(ProgressEvent('student', 'session-7', '2025-03-07T18:00:00', 95, {'subjective': 95}))
+    engine = ProgressEngine()
+    for event in events:
+        engine.record(event)
+
+    summary = engine.summary('student', as_of=date(2025, 3, 7))
+    print(f"   📊 {summary['completed']} sessions, average {summary['average_score']:.2f} ± {summary['score_std']:.2f}")
+    print(f"   🔥 Streak: {summary['current_streak']} days")
+    print(f"   🏆 {', '.join(achievement['title'] for achievement in engine.progress('student').achievements)}")
+
+    replayed = ProgressEngine.replay(events)
+    assert replayed.summary('student', as_of=date(2025, 3, 7)) == summary
+    assert 'events' not in engine.__getstate__()  # snapshots carry aggregates only
+    print("✅ Replayed event log matches live aggregates")
+
+
+if __name__ == "__main__":
+    test_progress_engine()
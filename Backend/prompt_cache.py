@@ -0,0 +1,193 @@
+"""
+10Q Notes AI - Prompt Prefix Cache
+HackRU 2025 Project by azrabano
+
+Shared-prefix prompt assembly for repeated filing content:
+- Large shared context (filing text, gold-standard SMAP) goes first as a stable prefix
+- Gemini context caching holds prefixes that are large enough to qualify (measured in tokens)
+- One cache creation per prefix at a time; concurrent callers wait for it instead of racing
+- Live caches are bounded and expire with their TTL
+- Smaller prefixes are sent inline, byte-identical up to the task instructions,
+  so provider-side implicit caching can still match
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+
+import google.generativeai as genai
+
+from single_flight import SingleFlight
+from tracing import set_attributes
+from structured_logging import get_logger
+
+try:
+    from google.generativeai import caching
+except ImportError:
+    caching = None
+
+log = get_logger(__name__)
+
+# Rough English-text ratio, good enough to compare against the provider minimum
+CHARS_PER_TOKEN = 4
+
+
+class PromptPrefixCache:
+    """Assembles prefix + task prompts and reuses provider context caches across calls"""
+
+    def __init__(self, model_name: str, max_provider_entries: int = None):
+        self.model_name = model_name
+        self.max_provider_entries = max_provider_entries or int(os.getenv('GEMINI_CONTEXT_CACHE_MAX_ENTRIES', 64))
+
+        self.provider_caching = (
+            caching is not None
+            and os.getenv('GEMINI_CONTEXT_CACHE', 'true').lower() in ('1', 'true', 'yes')
+        )
+        # Explicit context caches have a minimum size (2,048 tokens for 2.5 Pro, 1,024 for 2.5 Flash)
+        self.min_provider_tokens = int(os.getenv('GEMINI_CONTEXT_CACHE_MIN_TOKENS', 2048))
+        self.ttl_seconds = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL_SECONDS', 900))
+
+        # prefix key -> (cached content, or None after a failed create; usable until)
+        self._provider: "OrderedDict[str, Tuple[Optional[Any], datetime]]" = OrderedDict()
+        self._creates = SingleFlight('context_cache_create')
+        self._lock = threading.Lock()
+
+        self.stats = {'provider_hits': 0, 'provider_misses': 0, 'inline': 0}
+
+    @staticmethod
+    def prefix_key(prefix: str) -> str:
+        """Content hash identifying a prefix"""
+        return hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return len(text) // CHARS_PER_TOKEN
+
+    def prepare(self, prefix: str, task: str) -> Tuple[Optional[Any], str]:
+        """
+        Return (cached_model, prompt) for a prefix + task prompt.
+
+        cached_model is a GenerativeModel bound to a provider context cache holding
+        the prefix, in which case prompt is only the task. Otherwise cached_model is
+        None and prompt is the prefix followed by the task.
+        """
+        if self.provider_caching and self.estimate_tokens(prefix) >= self.min_provider_tokens:
+            model = self._provider_model(self.prefix_key(prefix), prefix)
+            if model is not None:
+                return model, task
+
+        with self._lock:
+            self.stats['inline'] += 1
+        set_attributes(**{'prompt_cache.result': 'inline'})
+        return None, prefix.strip() + "\n\n" + task
+
+    def _provider_model(self, key: str, prefix: str) -> Optional[Any]:
+        """GenerativeModel bound to a live context cache for this prefix, creating it if needed"""
+        with self._lock:
+            self._evict_expired()
+            entry = self._provider.get(key)
+            if entry is not None:
+                self._provider.move_to_end(key)
+                if entry[0] is None:
+                    return None  # creation failed recently; retried once the entry expires
+                self.stats['provider_hits'] += 1
+                set_attributes(**{'prompt_cache.result': 'provider_hit'})
+                return genai.GenerativeModel.from_cached_content(cached_content=entry[0])
+
+        # The network call runs outside the lock; callers for the same prefix share one creation
+        cached_content = self._creates.do(key, self._create, key, prefix)
+        if cached_content is None:
+            return None
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+    def _create(self, key: str, prefix: str) -> Optional[Any]:
+        with self._lock:
+            self.stats['provider_misses'] += 1
+        set_attributes(**{'prompt_cache.result': 'provider_miss'})
+        expires_at = datetime.now() + timedelta(seconds=self.ttl_seconds)
+        try:
+            cached_content = caching.CachedContent.create(
+                model=self.model_name,
+                display_name=f"qnotes-{key[:16]}",
+                contents=[prefix],
+                ttl=timedelta(seconds=self.ttl_seconds)
+            )
+        except Exception as e:
+            log.warning("context_cache_unavailable", prefix=key[:8], error=str(e))
+            cached_content = None
+
+        with self._lock:
+            self._provider[key] = (cached_content, expires_at)
+            while len(self._provider) > self.max_provider_entries:
+                # Dropped caches are not deleted; the provider expires them with their TTL
+                self._provider.popitem(last=False)
+        return cached_content
+
+    def _evict_expired(self):
+        # Leave a margin so a cache does not expire mid-request
+        horizon = datetime.now() + timedelta(seconds=30)
+        for key in [key for key, (_, expires_at) in self._provider.items() if expires_at <= horizon]:
+            del self._provider[key]
+
+
+def test_prompt_cache():
+    """Inline prefixes, token threshold, single-flight creation, bounded provider entries"""
+    import time
+    from types import SimpleNamespace
+    from concurrent.futures import ThreadPoolExecutor
+    print("🧪 Testing Prompt Prefix Cache")
+    global caching, genai
+
+    cache = PromptPrefixCache('gemini-2.5-pro', max_provider_entries=2)
+    cache.provider_caching = False
+    filing = "JPMORGAN CHASE & CO. FORM 10-Q ... Net revenue $42.5 billion ...  \n"
+
+    _, extraction = cache.prepare(filing, "TASK: Extract the financial metrics.")
+    _, feedback = cache.prepare(filing, "TASK: Grade the student's SMAP.")
+    assert extraction.startswith(filing.strip() + "\n\n") and extraction.endswith("metrics.")
+    assert extraction[:len(filing.strip()) + 2] == feedback[:len(filing.strip()) + 2]
+    assert cache.stats['inline'] == 2
+
+    # A filing prefix cut to 12,000 characters clears the default token minimum
+    assert cache.estimate_tokens("x" * 12000) >= cache.min_provider_tokens
+
+    created = []
+
+    def create(model, display_name, contents, ttl):
+        created.append(display_name)
+        time.sleep(0.1)
+        if contents[0].startswith("BROKEN"):
+            raise RuntimeError("cached content too small")
+        return display_name
+
+    real_caching, real_genai = caching, genai
+    caching = SimpleNamespace(CachedContent=SimpleNamespace(create=create))
+    genai = SimpleNamespace(GenerativeModel=SimpleNamespace(from_cached_content=lambda cached_content: cached_content))
+    try:
+        cache.provider_caching = True
+        cache.min_provider_tokens = 10
+        jpm = filing * 10
+        with ThreadPoolExecutor(8) as pool:
+            models = list(pool.map(lambda _: cache.prepare(jpm, "task")[0], range(8)))
+        assert len(created) == 1 and models == [created[0]] * 8
+
+        assert cache.prepare("BROKEN " + jpm, "task")[0] is None
+        assert cache.prepare("BROKEN " + jpm, "task")[0] is None  # failure remembered until it expires
+        cache.prepare("BAC " + jpm, "task")  # third entry evicts the JPM cache
+        assert len(cache._provider) == 2 and cache.prefix_key(jpm) not in cache._provider
+        assert len(created) == 3
+
+        cache._provider[cache.prefix_key("BAC " + jpm)] = ("stale", datetime.now())
+        cache.prepare("BAC " + jpm, "task")  # expired entries are recreated
+        assert len(created) == 4
+    finally:
+        caching, genai = real_caching, real_genai
+    print(f"   📊 {cache.stats}")
+    print("✅ Prefixes stay byte-identical; one cache creation per prefix; entries are bounded")
+
+
+if __name__ == "__main__":
+    test_prompt_cache()
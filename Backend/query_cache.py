@@ -0,0 +1,149 @@
+"""
+10Q Notes AI - Query Result Cache
+HackRU 2025 Project by azrabano
+
+TTL cache for analytics query results:
+- Keyed on whitespace-normalized SQL plus its parameters
+- LRU-bounded; entries expire after a TTL
+- Invalidated by table when the bulk writer commits new filings; a query that overlaps an
+  invalidation of a table it reads is not cached
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from tracing import set_attributes
+
+_WHITESPACE = re.compile(r'\s+')
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)', re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    return _WHITESPACE.sub(' ', sql).strip().rstrip(';').strip()
+
+
+def _hashable(value: Any) -> Any:
+    # NumPy scalars (e.g. a year read back from a DataFrame) compare equal to their Python values
+    return value.item() if hasattr(value, 'item') else value
+
+
+class QueryResultCache:
+    """LRU + TTL cache of query DataFrames, invalidated by the tables they read"""
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            float(os.getenv('ANALYTICS_QUERY_CACHE_TTL_SECONDS', 60))
+        self.max_entries = max_entries or int(os.getenv('ANALYTICS_QUERY_CACHE_SIZE', 256))
+
+        # key -> (expires_at, tables read, result)
+        self._entries: "OrderedDict[Tuple, Tuple[float, frozenset, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(): everything, and per table
+        self._generation = 0
+        self._table_generations: Dict[str, int] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'stale_skips': 0}
+
+    @staticmethod
+    def key(sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple:
+        return normalize_sql(sql), tuple(sorted((name, _hashable(value)) for name, value in (params or {}).items()))
+
+    def get_or_run(self, sql: str, params: Optional[Dict[str, Any]], run: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Cached result of a query, running it on a miss; callers get their own copy"""
+        if self.ttl_seconds <= 0:
+            return run()
+
+        key = self.key(sql, params)
+        tables = frozenset(table.lower() for table in _TABLE_REFERENCE.findall(key[0]))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                set_attributes(**{'cache.hit': True})
+                return entry[2].copy()
+            self.stats['misses'] += 1
+            version = self._version(tables)
+        set_attributes(**{'cache.hit': False})
+
+        result = run()
+        with self._lock:
+            if self._version(tables) != version:
+                # Invalidated while running: the result may predate the write, so do not keep it
+                self.stats['stale_skips'] += 1
+                return result
+            self._entries[key] = (now + self.ttl_seconds, tables, result.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def _version(self, tables: frozenset) -> Tuple:
+        return self._generation, tuple(self._table_generations.get(table, 0) for table in sorted(tables))
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None):
+        """Drop results that read any of the given tables (all results if tables is None)"""
+        with self._lock:
+            if tables is None:
+                self._generation += 1
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                written = {table.lower() for table in tables}
+                for table in written:
+                    self._table_generations[table] = self._table_generations.get(table, 0) + 1
+                stale = [key for key, (_, read, _) in self._entries.items() if read & written]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self.stats['invalidations'] += dropped
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def test_query_cache():
+    """Hits, table invalidation, and no stale store after an overlapping invalidation"""
+    print("🧪 Testing Query Result Cache")
+
+    cache = QueryResultCache(ttl_seconds=60, max_entries=8)
+    runs = []
+
+    def run_query():
+        runs.append(1)
+        return pd.DataFrame({'revenue': [42.5]})
+
+    sql = "SELECT revenue FROM financial_metrics f JOIN filings g ON f.filing_id = g.filing_id WHERE year = %(year)s"
+    cache.get_or_run(sql, {'year': 2025}, run_query)
+    cache.get_or_run("  " + sql.replace(' ', '\n', 3) + ";", {'year': 2025}, run_query)
+    assert len(runs) == 1 and cache.stats['hits'] == 1
+
+    cache.invalidate(['companies'])  # not read by the query
+    cache.get_or_run(sql, {'year': 2025}, run_query)
+    assert len(runs) == 1
+    cache.invalidate(['filings'])
+    cache.get_or_run(sql, {'year': 2025}, run_query)
+    assert len(runs) == 2
+
+    def run_during_flush():
+        # The bulk writer commits and invalidates while this query is still running
+        cache.invalidate(['financial_metrics'])
+        return pd.DataFrame({'revenue': [40.0]})
+
+    cache.invalidate(None)
+    assert cache.get_or_run(sql, {'year': 2025}, run_during_flush)['revenue'][0] == 40.0
+    assert len(cache) == 0 and cache.stats['stale_skips'] == 1
+    cache.get_or_run(sql, {'year': 2025}, run_query)
+    assert len(runs) == 3
+    print(f"   📊 {cache.stats}")
+    print("✅ Invalidations are never undone by in-flight queries")
+
+
+if __name__ == "__main__":
+    test_query_cache()
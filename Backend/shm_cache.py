@@ -0,0 +1,321 @@
+"""
+10Q Notes AI - Shared Memory Cache
+HackRU 2025 Project by azrabano
+
+Host-wide cache tier shared by every worker process through one mmap'd file (in /dev/shm):
+- Hot gold-standard SMAPs and synthesized audio exist once in RAM, whatever the worker count
+- Lock-free reads straight out of the mapping: pickles are loaded from it without an extra copy
+- Writes append to an arena under a file lock; when the arena fills, the cache starts a new
+  generation and empties, and readers of the old generation see a miss instead of torn data
+- Sits in front of the state store (gold standards) and the TTS provider (audio)
+- Only opened when a shared state backend is configured; keys are namespaced by that store, and
+  the last process to detach removes the file
+"""
+
+import os
+import mmap
+import atexit
+import struct
+import pickle
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from instrumentation import REGISTRY
+from structured_logging import get_logger
+from shared_state import state_store
+
+log = get_logger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so no cross-process tier
+    fcntl = None
+
+SHM_CACHE_ENABLED = os.getenv('SHM_CACHE_ENABLED', 'true').lower() != 'false'
+SHM_CACHE_PATH = os.getenv('SHM_CACHE_PATH') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'tenq-cache')
+SHM_CACHE_SIZE_MB = int(os.getenv('SHM_CACHE_SIZE_MB', 256))
+SHM_CACHE_SLOTS = int(os.getenv('SHM_CACHE_SLOTS', 8192))
+# Key namespace; defaults to one derived from the state store, so deployments on one host never share entries
+SHM_CACHE_NAMESPACE = os.getenv('SHM_CACHE_NAMESPACE', '')
+
+SHM_REQUESTS = REGISTRY.counter(
+    'tenq_shm_cache_requests_total', 'Shared memory cache lookups by result', ['result'])
+
+MAGIC = b'TENQSHM2'
+# magic, generation, write offset, arena capacity, slot count, attached processes
+_HEADER = struct.Struct('<8sQQQQQ')
+# key digest, generation, arena offset, payload length
+_SLOT = struct.Struct('<16sQQQ')
+# key digest, generation, payload length
+_RECORD = struct.Struct('<16sQQ')
+_PROBES = 8
+
+
+def _align(size: int, to: int = 64) -> int:
+    return (size + to - 1) // to * to
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class SharedMemoryCache:
+    """
+    Byte values by string key, shared by the processes on one host:
+
+        cache.put('gold:abc123', pickle.dumps(notes))
+        notes = cache.get('gold:abc123', pickle.loads)
+
+    get() hands the loader a memoryview into the shared mapping and only
+    returns its result if the generation did not change meanwhile. Keys
+    are digested together with the namespace. close() detaches; the last
+    process to detach unlinks the file.
+    """
+
+    def __init__(self, path: str = SHM_CACHE_PATH, size_bytes: int = SHM_CACHE_SIZE_MB << 20,
+                 slots: int = SHM_CACHE_SLOTS, namespace: str = ""):
+        self.path = path
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        while True:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            with self._file_lock():
+                # The last process may have unlinked the file while we waited for the lock
+                if os.path.exists(path) and os.stat(path).st_ino == os.fstat(self._fd).st_ino:
+                    self._attach(size_bytes, slots)
+                    break
+            os.close(self._fd)
+        self._slots_at = _HEADER.size
+        self._arena_at = _align(_HEADER.size + self.slots * _SLOT.size)
+        self._view = memoryview(self._mm)
+        self.closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'puts': 0, 'rejected': 0, 'resets': 0}
+
+    def _attach(self, size_bytes: int, slots: int):
+        """Map the file, laying it out if this process created it; call with the file lock held"""
+        if os.fstat(self._fd).st_size < size_bytes:
+            os.ftruncate(self._fd, size_bytes)  # sparse until written
+        self._mm = mmap.mmap(self._fd, 0)
+        magic, generation, write_offset, capacity, slot_count, attached = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            generation, write_offset, slot_count, attached = 1, 0, slots, 0
+            capacity = len(self._mm) - _align(_HEADER.size + slots * _SLOT.size)
+        _HEADER.pack_into(self._mm, 0, MAGIC, generation, write_offset, capacity, slot_count, attached + 1)
+        # The first process to create the file fixes the layout; later ones adopt it
+        self.slots = slot_count
+        self.capacity = capacity
+
+    @classmethod
+    def from_env(cls) -> Optional['SharedMemoryCache']:
+        """The host cache for this deployment, or None when disabled, unsupported or the state is not shared"""
+        if not SHM_CACHE_ENABLED or fcntl is None or not state_store.shared:
+            return None
+        namespace = SHM_CACHE_NAMESPACE or hashlib.sha256(state_store.store_id.encode()).hexdigest()[:16]
+        try:
+            return cls(namespace=namespace)
+        except OSError as e:
+            log.warning("shm_cache_unavailable", path=SHM_CACHE_PATH, error=str(e))
+            return None
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _digest(self, key: str) -> bytes:
+        return _digest(f"{self.namespace}|{key}")
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive writer: flock excludes other processes, the mutex other threads of this one"""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self):
+        return _HEADER.unpack_from(self._mm, 0)
+
+    def _generation(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[1]
+
+    def _probe(self, digest: bytes):
+        start = int.from_bytes(digest[:8], 'little') % self.slots
+        for i in range(_PROBES):
+            index = (start + i) % self.slots
+            yield index, self._slots_at + index * _SLOT.size
+
+    def get(self, key: str, loader: Callable[[memoryview], Any] = bytes) -> Optional[Any]:
+        """loader(view) for the cached value, or None; the view is only valid inside the loader"""
+        digest = self._digest(key)
+        generation = self._generation()
+        for _, position in self._probe(digest):
+            slot_digest, slot_generation, offset, length = _SLOT.unpack_from(self._mm, position)
+            if slot_digest != digest or slot_generation != generation:
+                continue
+            record_at = self._arena_at + offset
+            if offset + _RECORD.size + length > self.capacity or \
+                    _RECORD.unpack_from(self._mm, record_at) != (digest, generation, length):
+                break
+            payload = self._view[record_at + _RECORD.size:record_at + _RECORD.size + length]
+            try:
+                value = loader(payload)
+            except Exception:
+                value = None  # torn by a concurrent reset; the generation check below decides
+            finally:
+                payload.release()
+            if self._generation() != generation or value is None:
+                self._count('stale')
+                SHM_REQUESTS.inc(result='stale')
+                return None
+            self._count('hits')
+            SHM_REQUESTS.inc(result='hit')
+            return value
+        self._count('misses')
+        SHM_REQUESTS.inc(result='miss')
+        return None
+
+    def put(self, key: str, data: bytes) -> bool:
+        """Store a value; values over a quarter of the arena are not cached"""
+        length = len(data)
+        needed = _align(_RECORD.size + length, 8)
+        if needed > self.capacity // 4:
+            self._count('rejected')
+            return False
+        digest = self._digest(key)
+        with self._file_lock():
+            _, generation, write_offset, _, _, attached = self._header()
+            if write_offset + needed > self.capacity:
+                # Full: start a new generation; bump it first so in-flight readers discard what they read
+                generation += 1
+                _HEADER.pack_into(self._mm, 0, MAGIC, generation, 0, self.capacity, self.slots, attached)
+                self._mm[self._slots_at:self._arena_at] = bytes(self._arena_at - self._slots_at)
+                write_offset = 0
+                self._count('resets')
+                log.info("shm_cache_reset", generation=generation, path=self.path)
+
+            record_at = self._arena_at + write_offset
+            _RECORD.pack_into(self._mm, record_at, digest, generation, length)
+            self._mm[record_at + _RECORD.size:record_at + _RECORD.size + length] = data
+
+            # Same key, else a free or stale slot, else the oldest entry in the probe window
+            victim, oldest = None, None
+            for _, position in self._probe(digest):
+                slot_digest, slot_generation, offset, _ = _SLOT.unpack_from(self._mm, position)
+                if slot_digest == digest or slot_generation != generation:
+                    victim = position
+                    break
+                if oldest is None or offset < oldest[1]:
+                    oldest = (position, offset)
+            _SLOT.pack_into(self._mm, victim if victim is not None else oldest[0],
+                            digest, generation, write_offset, length)
+            _HEADER.pack_into(self._mm, 0, MAGIC, generation, write_offset + needed, self.capacity, self.slots,
+                              attached)
+        self._count('puts')
+        return True
+
+    def delete(self, key: str):
+        digest = self._digest(key)
+        with self._file_lock():
+            for _, position in self._probe(digest):
+                if _SLOT.unpack_from(self._mm, position)[0] == digest:
+                    _SLOT.pack_into(self._mm, position, bytes(16), 0, 0, 0)
+
+    def get_object(self, key: str) -> Optional[Any]:
+        return self.get(key, pickle.loads)
+
+    def put_object(self, key: str, value: Any) -> bool:
+        return self.put(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def usage(self) -> Dict[str, Any]:
+        _, generation, write_offset, _, _, attached = self._header()
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {'path': self.path, 'namespace': self.namespace, 'generation': generation, 'used_bytes': write_offset,
+                'capacity_bytes': self.capacity, 'attached_processes': attached, **stats}
+
+    def close(self):
+        """Detach; the last process attached removes the file"""
+        if self.closed:
+            return
+        self.closed = True
+        with self._file_lock():
+            magic, generation, write_offset, capacity, slots, attached = self._header()
+            attached = max(attached - 1, 0)
+            _HEADER.pack_into(self._mm, 0, magic, generation, write_offset, capacity, slots, attached)
+            if attached == 0:
+                os.unlink(self.path)
+                log.info("shm_cache_removed", path=self.path)
+        self._view.release()
+        self._mm.close()
+        os.close(self._fd)
+
+
+_shm_cache: Optional[SharedMemoryCache] = None
+_shm_cache_opened = False
+_shm_cache_lock = threading.Lock()
+
+
+def get_shm_cache() -> Optional[SharedMemoryCache]:
+    """This process's handle on the host cache, opened on first use; None unless state is shared"""
+    global _shm_cache, _shm_cache_opened
+    if not _shm_cache_opened:
+        with _shm_cache_lock:
+            if not _shm_cache_opened:
+                _shm_cache = SharedMemoryCache.from_env()
+                _shm_cache_opened = True
+                if _shm_cache is not None:
+                    atexit.register(close_shm_cache)
+    return _shm_cache
+
+
+def close_shm_cache():
+    """Detach this process from the host cache (on shutdown)"""
+    with _shm_cache_lock:
+        if _shm_cache is not None:
+            _shm_cache.close()
+
+
+def test_shm_cache():
+    """Share values between two processes and survive an arena reset"""
+    import multiprocessing
+    print("🧪 Testing Shared Memory Cache")
+
+    path = os.path.join(tempfile.mkdtemp(), 'tenq-cache-test')
+    cache = SharedMemoryCache(path, size_bytes=1 << 20, slots=256, namespace='deployment-a')
+    cache.put_object('gold:abc123', {'ticker': 'JPM', 'metrics': 'Revenue $42.5B'})
+
+    def other_worker(queue):
+        worker_cache = SharedMemoryCache(path, size_bytes=1 << 20, slots=256, namespace='deployment-a')
+        other_deployment = SharedMemoryCache(path, size_bytes=1 << 20, slots=256, namespace='deployment-b')
+        queue.put((worker_cache.get_object('gold:abc123'), other_deployment.get_object('gold:abc123')))
+        worker_cache.put('audio:briefing', b'ID3' + b'\x00' * 4096)
+        other_deployment.close()
+        worker_cache.close()
+
+    queue = multiprocessing.get_context('fork').Queue()
+    worker = multiprocessing.get_context('fork').Process(target=other_worker, args=(queue,))
+    worker.start()
+    same_deployment, other_deployment = queue.get(timeout=10)
+    assert same_deployment['ticker'] == 'JPM' and other_deployment is None
+    worker.join()
+    assert cache.get('audio:briefing')[:3] == b'ID3'
+
+    for i in range(400):
+        cache.put(f"audio:{i}", os.urandom(8192))
+    assert cache.stats['resets'] >= 1 and cache.get('gold:abc123') is None
+    print(f"   📦 {cache.usage()}")
+    assert cache.usage()['attached_processes'] == 1
+    cache.close()
+    assert not os.path.exists(path)
+    print("✅ Values shared across processes; full arena rolled to a new generation; file removed on close")
+
+
+if __name__ == "__main__":
+    test_shm_cache()
@@ -0,0 +1,175 @@
+"""
+10Q Notes AI - Request Coalescing
+HackRU 2025 Project by azrabano
+
+Single-flight execution of identical expensive work:
+- Concurrent calls with the same key share one in-flight computation instead of each running it
+- Keys are content hashes (filing text, TTS script), so identical uploads coalesce across students
+- The first caller runs the work; the others wait and get its result or its exception
+- claim/wait/resolve for work that is not one call, e.g. a stream whose result is known at the end
+- Leader and coalesced call counts per operation on /metrics
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from instrumentation import REGISTRY
+from tracing import set_attributes
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+FLIGHT_CALLS = REGISTRY.counter(
+    'tenq_single_flight_calls_total', 'Calls by operation and role (leader runs the work, coalesced waits for it)',
+    ['operation', 'role'])
+FLIGHT_IN_FLIGHT = REGISTRY.gauge(
+    'tenq_single_flight_in_flight', 'Distinct computations currently running', ['operation'])
+
+
+def content_key(*parts: Any) -> str:
+    """Stable key for work determined by its inputs"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls per key:
+
+        smap_flight = SingleFlight('smap_generation')
+        notes = smap_flight.do(content_key(filing_text), generate, filing_text)
+
+    Only calls that overlap are coalesced; nothing is cached once the
+    leader finishes. Every caller gets the same result object, so treat
+    it as read-only. Coalescing is per process.
+
+    When the work is not a single call (a streamed generation), the
+    leader claims the key and resolves it itself:
+
+        leader, call = smap_flight.claim(key)
+        if not leader:
+            notes = smap_flight.wait(call)
+        ...
+        smap_flight.resolve(key, call, result=notes)  # or error=...
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        leader, call = self.claim(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.resolve(key, call, error=e)
+            raise
+        self.resolve(key, call, result=result)
+        return result
+
+    def claim(self, key: str) -> Tuple[bool, _Call]:
+        """Join the computation for key; the leader must resolve() the call, even on failure"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            FLIGHT_CALLS.inc(operation=self.operation, role='leader')
+            FLIGHT_IN_FLIGHT.inc(operation=self.operation)
+        else:
+            FLIGHT_CALLS.inc(operation=self.operation, role='coalesced')
+            set_attributes(**{'single_flight.coalesced': True})
+            log.debug("single_flight_coalesced", operation=self.operation, key=key[:12])
+        return leader, call
+
+    @staticmethod
+    def wait(call: _Call) -> Any:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def resolve(self, key: str, call: _Call, result: Any = None, error: BaseException = None):
+        """Publish the leader's outcome to the waiters; later calls for the same call are ignored"""
+        with self._lock:
+            if self._calls.get(key) is not call:
+                return
+            del self._calls[key]
+        call.result, call.error = result, error
+        FLIGHT_IN_FLIGHT.dec(operation=self.operation)
+        call.done.set()
+        if call.waiters:
+            log.info("single_flight_shared", operation=self.operation, key=key[:12], waiters=call.waiters,
+                     failed=error is not None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def test_single_flight():
+    """A class uploads the same filing at once: one generation, thirty results"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    print("🧪 Testing Single Flight")
+
+    flight = SingleFlight('demo_smap_generation')
+    runs = []
+
+    def generate(filing_text: str):
+        runs.append(filing_text)
+        time.sleep(0.2)
+        return {'ticker': 'JPM', 'chars': len(filing_text)}
+
+    filing = "JPMORGAN CHASE & CO. FORM 10-Q Q1 2025 ..." * 100
+    with ThreadPoolExecutor(30) as pool:
+        results = list(pool.map(lambda _: flight.do(content_key(filing), generate, filing), range(30)))
+
+    assert len(runs) == 1 and all(result is results[0] for result in results)
+    assert FLIGHT_CALLS.value(operation='demo_smap_generation', role='coalesced') == 29
+
+    def failing():
+        time.sleep(0.05)
+        raise TimeoutError("deadline")
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flight.do, 'same', failing) for _ in range(3)]
+    assert all(isinstance(future.exception(), TimeoutError) for future in futures)
+    assert flight.in_flight() == 0
+
+    # A streamed generation: the leader resolves once, at the end of its stream
+    leader, call = flight.claim('stream')
+    with ThreadPoolExecutor(2) as pool:
+        followers = [pool.submit(lambda: flight.wait(flight.claim('stream')[1])) for _ in range(2)]
+        while call.waiters < 2:
+            time.sleep(0.01)
+        flight.resolve('stream', call, result='notes')
+        flight.resolve('stream', call, error=RuntimeError("abandoned"))  # ignored, already resolved
+    assert leader and [future.result() for future in followers] == ['notes', 'notes']
+    assert flight.in_flight() == 0
+    print("✅ 30 concurrent uploads ran one generation; failures and streamed results reach every waiter")
+
+
+if __name__ == "__main__":
+    test_single_flight()
@@ -0,0 +1,279 @@
+"""
+10Q Notes AI - SMAP Pre-Scorer
+HackRU 2025 Project by azrabano
+
+Fast local scoring of student SMAP notes before the LLM grader:
+- Hashed TF-IDF vectors and cosine similarity against each gold-standard section (NumPy)
+- Key-term coverage and length checks per section
+- Quoted figures verified against the filing's NumericFactIndex
+- Short-circuits empty, placeholder, too-short or copied submissions without an LLM round-trip;
+  low word overlap is only a provisional hint, since paraphrases share few words with the gold standard
+"""
+
+import re
+import zlib
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List
+
+import numpy as np
+
+from enhanced_gemini_service import EnhancedSMAPNotes
+from gemini_service import FeedbackScore
+from numeric_fact_index import NumericFactIndex
+
+SMAP_SECTIONS = ('subjective', 'metrics', 'assessment', 'plan')
+
+# Hashed feature space keeps vectors comparable across requests without a shared vocabulary
+HASH_DIM = 4096
+
+MIN_SECTION_WORDS = 8
+TARGET_SECTION_WORDS = {'subjective': 100, 'metrics': 80, 'assessment': 120, 'plan': 80}
+
+FAIL_THRESHOLD = 25.0
+GOLD_COPY_SIMILARITY = 0.92
+GOLD_COPY_SCORE_CAP = 50.0
+
+# Placeholder tokens; only disqualifying when they outnumber the real content ("Efficiency ratio: N/A" is fine)
+JUNK_MARKERS = {'bullshit', 'idk', 'whatever', 'asdf', 'lorem', 'ipsum', 'n/a', 'tbd'}
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'for', 'on', 'with', 'at', 'by', 'from',
+    'is', 'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'these', 'those',
+    'as', 'but', 'not', 'their', 'they', 'we', 'our', 'has', 'have', 'had', 'will', 'would',
+    'should', 'can', 'could', 'which', 'also', 'into', 'than', 'more', 'such'
+}
+
+_TOKEN = re.compile(r"[a-z][a-z0-9&'\-]+")
+_PUNCTUATION = '.,;:!?()[]"\''
+
+
+@dataclass
+class PreScore:
+    """Provisional local score for a student SMAP submission"""
+    section_scores: Dict[str, float]
+    overall_score: float
+    decision: str  # 'grade' (send to LLM, scores are provisional), 'fail' or 'gold_copy' (short-circuit)
+    reasons: List[str] = field(default_factory=list)
+    similarity: Dict[str, float] = field(default_factory=dict)
+    numeric_matches: int = 0
+    numeric_quoted: int = 0
+
+    @property
+    def short_circuit(self) -> bool:
+        return self.decision != 'grade'
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def hashed_tf(texts: List[str]) -> np.ndarray:
+    """Sublinear term-frequency matrix (rows = texts) in the hashed feature space"""
+    matrix = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        buckets = np.fromiter((zlib.crc32(token.encode()) % HASH_DIM for token in tokens),
+                              dtype=np.int64, count=len(tokens))
+        counts = np.bincount(buckets, minlength=HASH_DIM).astype(np.float32)
+        nonzero = counts > 0
+        matrix[row, nonzero] = 1.0 + np.log(counts[nonzero])
+    return matrix
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def submission_vector(student_smap: Dict[str, str]) -> np.ndarray:
+    """Unit-length hashed TF vector of a whole SMAP submission, for near-duplicate lookups"""
+    text = ' '.join(student_smap.get(section, '') or '' for section in SMAP_SECTIONS)
+    return l2_normalize(hashed_tf([text]))[0]
+
+
+class SMAPPreScorer:
+    """Vectorized local scorer comparing student SMAP sections with the gold standard"""
+
+    def to_feedback_score(self, prescore: PreScore) -> FeedbackScore:
+        """FeedbackScore for a short-circuited submission (same section mapping as the LLM grader)"""
+        scores = {section: max(1, round(score)) for section, score in prescore.section_scores.items()}
+        return FeedbackScore(
+            completeness=scores['subjective'],
+            accuracy=scores['metrics'],
+            insight_depth=scores['assessment'],
+            clarity=scores['plan'],
+            overall_score=max(1, round(prescore.overall_score)),
+            feedback_comments=[],
+            suggestions=prescore.reasons + [
+                "Address every SMAP section with specifics from the filing",
+                "Quote the key figures (revenue, net income, margins) exactly as reported"
+            ]
+        )
+
+    def prescore(self, student_smap: Dict[str, str], gold_standard: EnhancedSMAPNotes,
+                 fact_index: NumericFactIndex = None) -> PreScore:
+        """Provisional section scores plus a decision on whether the LLM grader is needed"""
+        student_texts = [student_smap.get(section, '') or '' for section in SMAP_SECTIONS]
+        gold_texts = [getattr(gold_standard, section) or '' for section in SMAP_SECTIONS]
+
+        gold_tf = hashed_tf(gold_texts)
+        student_tf = hashed_tf(student_texts)
+
+        # IDF over the gold sections down-weights boilerplate shared by every section
+        document_frequency = (gold_tf > 0).sum(axis=0)
+        idf = np.log((1 + len(gold_texts)) / (1 + document_frequency)) + 1.0
+
+        gold_vectors = l2_normalize(gold_tf * idf)
+        student_vectors = l2_normalize(student_tf * idf)
+        similarity = (gold_vectors * student_vectors).sum(axis=1)
+
+        # Coverage of each gold section's top-weighted terms
+        top_k = 15
+        gold_weights = gold_tf * idf
+        top_terms = np.argsort(-gold_weights, axis=1)[:, :top_k]
+        top_mask = np.take_along_axis(gold_weights, top_terms, axis=1) > 0
+        covered = np.take_along_axis(student_tf, top_terms, axis=1) > 0
+        coverage = (covered & top_mask).sum(axis=1) / np.maximum(top_mask.sum(axis=1), 1)
+
+        word_counts = np.array([len(text.split()) for text in student_texts], dtype=np.float64)
+        targets = np.array([TARGET_SECTION_WORDS[section] for section in SMAP_SECTIONS], dtype=np.float64)
+        length_factor = np.clip(word_counts / targets, 0.0, 1.0)
+
+        scores = 100 * (0.5 * np.clip(similarity / 0.6, 0.0, 1.0) + 0.3 * coverage + 0.2 * length_factor)
+
+        # Metrics section: reward figures that match numbers reported in the filing
+        if fact_index is None:
+            fact_index = NumericFactIndex.from_filing(gold_standard.financial_metrics)
+        verification = fact_index.verify(student_smap.get('metrics', ''))
+        metrics_index = SMAP_SECTIONS.index('metrics')
+        if verification.quoted:
+            scores[metrics_index] = 0.6 * scores[metrics_index] + 40 * verification.accuracy
+
+        scores = np.where(word_counts < MIN_SECTION_WORDS, np.minimum(scores, 20.0), scores)
+        section_scores = {section: round(float(score), 1) for section, score in zip(SMAP_SECTIONS, scores)}
+        overall = round(float(scores.mean()), 1)
+
+        prescore = PreScore(
+            section_scores=section_scores,
+            overall_score=overall,
+            decision='grade',
+            similarity={section: round(float(value), 3) for section, value in zip(SMAP_SECTIONS, similarity)},
+            numeric_matches=verification.verified,
+            numeric_quoted=verification.quoted
+        )
+
+        whole_similarity = float(l2_normalize(hashed_tf([' '.join(student_texts)]) * idf)[0]
+                                 @ l2_normalize(hashed_tf([' '.join(gold_texts)]) * idf)[0])
+
+        self._decide(prescore, student_texts, word_counts, whole_similarity)
+        return prescore
+
+    def prescore_text(self, submission: str, reference: str) -> PreScore:
+        """Pre-score a single free-text submission against reference content (practice mode)"""
+        vectors = l2_normalize(hashed_tf([submission or '', reference or '']))
+        similarity = float(vectors[0] @ vectors[1])
+        word_count = len((submission or '').split())
+        length_factor = min(1.0, word_count / 150)
+
+        overall = round(100 * (0.7 * min(1.0, similarity / 0.5) + 0.3 * length_factor), 1)
+        prescore = PreScore(
+            section_scores={section: overall for section in SMAP_SECTIONS},
+            overall_score=overall,
+            decision='grade',
+            similarity={'overall': round(similarity, 3)}
+        )
+        self._decide(prescore, [submission or ''], np.array([word_count], dtype=np.float64),
+                     similarity if reference else 0.0)
+        return prescore
+
+    @staticmethod
+    def placeholder_counts(texts: List[str]):
+        """(placeholder tokens, content tokens) across the texts"""
+        words = [word.strip(_PUNCTUATION) for word in ' '.join(texts).lower().split()]
+        placeholders = sum(1 for word in words if word in JUNK_MARKERS)
+        content = sum(1 for token in tokenize(' '.join(texts)) if token not in JUNK_MARKERS)
+        return placeholders, content
+
+    def _decide(self, prescore: PreScore, texts: List[str], word_counts: np.ndarray,
+                whole_similarity: float):
+        """Mark submissions that do not need the LLM grader"""
+        placeholders, content = self.placeholder_counts(texts)
+        if placeholders and placeholders >= content:
+            prescore.decision = 'fail'
+            prescore.reasons.append("Submission contains placeholder or non-analytical content")
+            prescore.overall_score = min(prescore.overall_score, 5.0)
+            prescore.section_scores = {k: min(v, 5.0) for k, v in prescore.section_scores.items()}
+        elif (word_counts < MIN_SECTION_WORDS).sum() >= max(1, len(texts) // 2):
+            prescore.decision = 'fail'
+            prescore.reasons.append(f"Most sections are shorter than {MIN_SECTION_WORDS} words")
+        elif whole_similarity >= GOLD_COPY_SIMILARITY:
+            prescore.decision = 'gold_copy'
+            prescore.reasons.append("Notes closely match the AI gold standard - rewrite them in your own words")
+            prescore.overall_score = min(prescore.overall_score, GOLD_COPY_SCORE_CAP)
+            prescore.section_scores = {k: min(v, GOLD_COPY_SCORE_CAP) for k, v in prescore.section_scores.items()}
+        elif prescore.overall_score < FAIL_THRESHOLD:
+            # Word overlap misses paraphrases ("42.5bn", "seventeen percent"): a hint, never a verdict
+            prescore.reasons.append("Provisional: little word overlap with the filing's key points")
+
+
+def test_smap_prescorer():
+    """A legitimate "N/A" is graded normally; placeholder-only notes short-circuit"""
+    from types import SimpleNamespace
+    print("🧪 Testing SMAP Pre-Scorer")
+
+    gold = SimpleNamespace(
+        subjective="Management struck a confident tone on net interest income, citing resilient consumer "
+                   "spending, strong deposit franchises and disciplined expense management across segments.",
+        metrics="Total revenue $42.5 billion up 8% year over year; net income $13.4 billion; return on equity "
+                "17%; CET1 ratio 15.7%; efficiency ratio 52%; card net charge-off rate 3.6%.",
+        assessment="The fortress balance sheet and diversified fee businesses offset rising card charge-offs. "
+                   "Capital remains well above regulatory minimums, supporting buybacks and dividends.",
+        plan="Monitor net interest income guidance, credit card delinquencies and reserve builds next quarter; "
+             "compare investment banking fees against peers.",
+        financial_metrics=None)
+    strong = {
+        'subjective': "Management sounded confident about net interest income and pointed to resilient consumer "
+                      "spending and strong deposit franchises, while keeping expense management disciplined.",
+        'metrics': "Revenue $42.5 billion, up 8% from last year. Net income $13.4 billion. Return on equity 17%. "
+                   "CET1 ratio 15.7%. Card net charge-off rate 3.6%. Efficiency ratio: N/A",
+        'assessment': "A fortress balance sheet and diversified fee businesses are absorbing rising card "
+                      "charge-offs, and capital well above regulatory minimums funds buybacks and dividends.",
+        'plan': "Next quarter, watch net interest income guidance, card delinquencies and reserve builds, and "
+                "benchmark investment banking fees against peers."
+    }
+    scorer = SMAPPreScorer()
+
+    with_na = scorer.prescore(strong, gold)
+    without_na = scorer.prescore({**strong, 'metrics': strong['metrics'].replace(" Efficiency ratio: N/A", "")},
+                                 gold)
+    assert with_na.decision == 'grade' and without_na.decision == 'grade', (with_na, without_na)
+    assert abs(with_na.overall_score - without_na.overall_score) < 5
+
+    placeholders = scorer.prescore({section: "N/A" for section in SMAP_SECTIONS}, gold)
+    assert placeholders.decision == 'fail' and placeholders.overall_score <= 5
+    filler = scorer.prescore({'subjective': "idk whatever", 'metrics': "tbd", 'assessment': "lorem ipsum",
+                              'plan': "whatever revenue"}, gold)
+    assert filler.decision == 'fail'
+
+    # A competent paraphrase shares few words with the gold standard but still goes to the LLM grader
+    paraphrase = scorer.prescore({
+        'subjective': "Leadership came across upbeat: households kept spending, deposits held up nicely, and "
+                      "costs stayed tightly controlled throughout every business line.",
+        'metrics': "Top line 42.5bn (+8% y/y), profit 13.4bn, ROE seventeen percent, core tier-one capital "
+                   "near sixteen percent, credit-card losses around 3.6% of balances.",
+        'assessment': "Rock-solid capital plus steady advisory and payments income cushion worsening consumer "
+                      "credit; plenty of room left over for repurchases and payouts to shareholders.",
+        'plan': "Track lending-margin outlook, overdue card balances and provisioning over coming months; "
+                "stack up dealmaking revenue versus rival banks."
+    }, gold)
+    assert paraphrase.decision == 'grade', paraphrase
+    print(f"   📝 With N/A: {with_na.decision} {with_na.overall_score}; placeholders: {placeholders.decision}")
+    print("✅ Placeholders only fail a submission when they are most of it")
+
+
+if __name__ == "__main__":
+    test_smap_prescorer()
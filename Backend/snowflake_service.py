@@ -10,17 +10,133 @@ Snowflake integration for MLH "Best Use of Snowflake API" prize:
 """
 
 import os
+import re
 import json
-from typing import Dict, List, Optional, Any
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import asdict
+import numpy as np
 import pandas as pd
-import snowflake.connector
-from snowflake.connector import DictCursor
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Import our enhanced data structures
 from enhanced_gemini_service import EnhancedSMAPNotes, FinancialMetrics, RiskFactors, BusinessSegments
+from metrics_store import FinancialMetricsStore, METRIC_FIELDS, period_key, period_label
+from analytics_backend import create_analytics_backend
+from bulk_writer import BulkWriter
+from query_cache import QueryResultCache, normalize_sql
+from benchmark_materializer import BenchmarkMaterializer
+from shared_state import state_store
+from structured_logging import get_logger
+import tracing
+
+log = get_logger(__name__)
+
+# Metrics where a lower value is better (benchmarks report the minimum as best in class)
+LOWER_IS_BETTER = {'efficiency_ratio', 'debt_to_equity', 'provision_credit_losses'}
+
+# Basel III / US regulatory reference levels for CET1
+CET1_REFERENCE_LEVELS = {'regulatory_minimum': 0.070, 'well_capitalized': 0.100}
+
+# Named analytics queries; %(name)s parameters run unchanged on Snowflake and the embedded engine
+ANALYTICS_QUERIES = {
+    'quarterly_comparison': """
+        SELECT 
+            c.company_name,
+            f.quarter,
+            f.year,
+            fm.total_revenue,
+            fm.return_on_equity,
+            fm.efficiency_ratio
+        FROM companies c
+        JOIN filings f ON c.company_id = f.company_id  
+        JOIN financial_metrics fm ON f.filing_id = fm.filing_id
+        WHERE c.ticker_symbol = %(ticker)s
+        ORDER BY f.year DESC, f.quarter DESC
+        LIMIT 8
+    """,
+    
+    'peer_analysis': """
+        SELECT 
+            c.company_name,
+            c.ticker_symbol,
+            fm.return_on_equity,
+            fm.efficiency_ratio,
+            fm.common_equity_tier1_ratio
+        FROM companies c
+        JOIN filings f ON c.company_id = f.company_id
+        JOIN financial_metrics fm ON f.filing_id = fm.filing_id  
+        WHERE c.industry = %(industry)s
+        AND f.quarter = %(quarter)s AND f.year = %(year)s
+        ORDER BY fm.return_on_equity DESC
+    """,
+    
+    'risk_summary': """
+        SELECT 
+            rf.risk_category,
+            COUNT(*) as risk_count,
+            AVG(rf.severity_score) as avg_severity
+        FROM risk_factors rf
+        JOIN filings f ON rf.filing_id = f.filing_id
+        JOIN companies c ON f.company_id = c.company_id
+        WHERE c.ticker_symbol = %(ticker)s
+        GROUP BY rf.risk_category
+        ORDER BY risk_count DESC
+    """,
+    
+    'latest_period': """
+        SELECT f.year, f.quarter
+        FROM filings f
+        JOIN companies c ON f.company_id = c.company_id
+        WHERE c.industry = %(industry)s AND f.year IS NOT NULL
+        ORDER BY f.year DESC, f.quarter DESC
+        LIMIT 1
+    """,
+    
+    'metrics_snapshot': """
+        SELECT c.ticker_symbol, c.company_name, c.industry, f.filing_id, f.filing_period, f.quarter, f.year,
+               """ + ', '.join(f'fm.{name}' for name in METRIC_FIELDS) + """
+        FROM financial_metrics fm
+        JOIN filings f ON fm.filing_id = f.filing_id
+        JOIN companies c ON f.company_id = c.company_id
+    """
+}
+
+QUERY_DEFAULTS = {'ticker': 'JPM', 'industry': 'Banking'}
+
+# Bulk write order (parents before children) with each table's primary key
+WRITE_ORDER = {
+    'companies': 'company_id',
+    'filings': 'filing_id',
+    'financial_metrics': 'metric_id',
+    'smap_notes': 'note_id',
+    'risk_factors': 'risk_id',
+    'business_segments': 'segment_id',
+    'industry_benchmarks': 'benchmark_id'
+}
+
+# Child tables whose rows are replaced wholesale when a filing is re-ingested
+CHILD_TABLES = {'risk_factors': 'filing_id', 'business_segments': 'filing_id'}
+
+
+# Placeholder tickers from failed metadata extraction or uploads without one
+UNKNOWN_TICKERS = {'', 'N/A', 'NA', 'UNK', 'UNKNOWN', 'NONE'}
+
+
+def filing_id_for(ticker: str, filing_period: str, filing_text: str = "") -> str:
+    """
+    Deterministic filing id, so re-ingesting a filing upserts instead of duplicating it.
+
+    Ticker and period identify the filing when both are known; otherwise the id
+    is a hash of the filing text, so unrelated filings with failed metadata
+    extraction never share (and overwrite) one row.
+    """
+    if (ticker or '').strip().upper() not in UNKNOWN_TICKERS and period_key(filing_period or '') >= 0:
+        return re.sub(r'[^A-Za-z0-9]+', '_', f"{ticker}_{filing_period}").strip('_').upper()
+    return "FILING_" + hashlib.sha256((filing_text or '').encode('utf-8')).hexdigest()[:20].upper()
 
 load_dotenv()
 
@@ -29,38 +145,38 @@ class SnowflakeService:
     
     def __init__(self):
         """Initialize Snowflake connection"""
-        self.connection = None
+        self.backend = None
+        self.query_cache = QueryResultCache()
+        self.metrics_store = FinancialMetricsStore()
+        self.benchmarks = BenchmarkMaterializer(self.metrics_store)
+        # Other workers write the same analytics database; a shared counter tells us when to reload
+        self._sync_lock = threading.RLock()
+        self._seen_generation = self._database_generation()
         self.connect()
         self.setup_database()
-        print("✅ Snowflake service initialized")
-        print("🏢 Enterprise data warehouse ready")
+        log.info("analytics_service_initialized", backend=self.backend.name)
     
     def connect(self):
-        """Establish connection to Snowflake"""
-        try:
-            # For demo purposes, we'll simulate the connection
-            # In production, you would use real Snowflake credentials
-            self.connection_config = {
-                'account': os.getenv('SNOWFLAKE_ACCOUNT', 'demo_account.region'),
-                'user': os.getenv('SNOWFLAKE_USER', 'demo_user'),
-                'password': os.getenv('SNOWFLAKE_PASSWORD', 'demo_password'),
-                'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE', 'COMPUTE_WH'),
-                'database': os.getenv('SNOWFLAKE_DATABASE', 'HACKRU_10Q_NOTES'),
-                'schema': os.getenv('SNOWFLAKE_SCHEMA', 'FINANCIAL_DATA'),
-                'role': os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN')
-            }
-            
-            # For demo, we'll simulate the connection
-            print(f"🔗 Connecting to Snowflake account: {self.connection_config['account']}")
-            print(f"📊 Database: {self.connection_config['database']}")
-            print(f"📋 Schema: {self.connection_config['schema']}")
-            
-            # In production:
-            # self.connection = snowflake.connector.connect(**self.connection_config)
-            
-        except Exception as e:
-            print(f"⚠️ Snowflake connection simulation mode: {e}")
-            self.connection = None
+        """Connect to Snowflake, or to the embedded analytics engine when Snowflake is not configured"""
+        self.connection_config = {
+            'account': os.getenv('SNOWFLAKE_ACCOUNT', 'demo_account.region'),
+            'user': os.getenv('SNOWFLAKE_USER', 'demo_user'),
+            'password': os.getenv('SNOWFLAKE_PASSWORD', 'demo_password'),
+            'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE', 'COMPUTE_WH'),
+            'database': os.getenv('SNOWFLAKE_DATABASE', 'HACKRU_10Q_NOTES'),
+            'schema': os.getenv('SNOWFLAKE_SCHEMA', 'FINANCIAL_DATA'),
+            'role': os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN')
+        }
+        
+        self.backend = create_analytics_backend(self.connection_config)
+        
+        if self.backend.name == 'snowflake':
+            log.info("analytics_connected", backend='snowflake', account=self.connection_config['account'],
+                     database=self.connection_config['database'], schema=self.connection_config['schema'],
+                     pool_size=self.backend.pool.max_size)
+        else:
+            log.info("analytics_connected", backend=self.backend.name, path=self.backend.path,
+                     pool_size=self.backend.pool.max_size)
     
     def setup_database(self):
         """Create database schema for financial data storage"""
@@ -174,133 +290,275 @@ class SnowflakeService:
             """
         }
         
-        print("🏗️ Database schema prepared for:")
-        for table_name in self.schema_sql.keys():
-            print(f"   📋 {table_name}")
+        self.backend.create_schema(self.schema_sql)
+        
+        log.info("analytics_schema_ready", tables=list(self.schema_sql))
+        
+        self.bulk_writer = BulkWriter(self.backend, WRITE_ORDER, CHILD_TABLES)
+        self.bulk_writer.listeners.append(self.query_cache.invalidate)
+        self.bulk_writer.listeners.append(self._announce_write)
+        self._queue_benchmarks(self._load_metrics_store())
+    
+    def _load_metrics_store(self) -> set:
+        """Rebuild the in-memory metrics store and benchmark sketches from the filings in the database"""
+        snapshot = self.backend.query(ANALYTICS_QUERIES['metrics_snapshot'])
+        metrics_store = FinancialMetricsStore()
+        benchmarks = BenchmarkMaterializer(metrics_store)
+        changed = set()
+        for row in snapshot.to_dict('records'):
+            metrics = FinancialMetrics(
+                **{name: None if pd.isna(row[name]) else float(row[name]) for name in METRIC_FIELDS},
+                quarter=row['quarter'],
+                year=None if pd.isna(row['year']) else int(row['year'])
+            )
+            metrics_store.add(row['filing_id'], row['ticker_symbol'], row['company_name'], row['industry'],
+                              row['filing_period'], metrics)
+            changed |= benchmarks.observe(row['filing_id'], row['industry'],
+                                          period_key(row['filing_period'], metrics.quarter, metrics.year), metrics)
+        self.metrics_store, self.benchmarks = metrics_store, benchmarks
+        if len(snapshot):
+            log.info("metrics_store_loaded", filings=len(snapshot))
+        return changed
+    
+    @staticmethod
+    def _database_generation() -> int:
+        return int(state_store.counters('analytics', 'database').get('generation', 0))
+    
+    def _announce_write(self, tables: set):
+        """Bump the shared write counter after a flush, so other workers reload before their next read"""
+        if not state_store.shared:
+            return
+        with self._sync_lock:
+            state_store.increment([('analytics', 'database', {'generation': 1})])
+            generation = self._database_generation()
+            if generation == self._seen_generation + 1:
+                self._seen_generation = generation  # only our own write; nothing to reload
+    
+    def _sync_with_database(self):
+        """Reload metrics, benchmarks and cached query results if another worker wrote filings since we looked"""
+        if not state_store.shared or self._database_generation() == self._seen_generation:
+            return
+        with self._sync_lock:
+            self.bulk_writer.flush()  # our queued filings must be in the snapshot we reload
+            generation = self._database_generation()
+            if generation == self._seen_generation:
+                return
+            self.query_cache.invalidate()
+            self._load_metrics_store()
+            self._seen_generation = generation
+            log.info("analytics_state_reloaded", generation=generation)
+    
+    def _record_metrics(self, filing_id: str, ticker: str, company_name: str, industry: str,
+                        filing_period: str, metrics: FinancialMetrics) -> set:
+        """Add a filing to the metrics store and benchmark sketches; returns the benchmark cells it changed"""
+        self.metrics_store.add(filing_id, ticker, company_name, industry, filing_period, metrics)
+        return self.benchmarks.observe(filing_id, industry, period_key(filing_period, metrics.quarter, metrics.year),
+                                       metrics)
+    
+    def _queue_benchmarks(self, cells: set):
+        """Queue materialized industry_benchmarks rows for the changed cohorts"""
+        for cell in cells:
+            self.bulk_writer.add(f"benchmarks:{cell[0]}:{cell[1]}", {'industry_benchmarks': self.benchmarks.rows(cell)})
     
     def store_enhanced_smap_notes(self, enhanced_smap: EnhancedSMAPNotes, filing_text: str = "") -> str:
-        """Store enhanced SMAP notes in Snowflake data warehouse"""
+        """Queue enhanced SMAP notes for the next bulk write to the data warehouse"""
+        
+        filing_id = self._queue_filing(enhanced_smap, filing_text)
+        
+        log.info("filing_queued", filing_id=filing_id, ticker=enhanced_smap.ticker_symbol,
+                 metrics=len([v for v in asdict(enhanced_smap.financial_metrics).values() if v is not None]),
+                 segments=len(enhanced_smap.business_segments.segments),
+                 pending_rows=self.bulk_writer.pending_rows)
+        
+        return filing_id
+    
+    def load_filings(self, filings: List[Tuple[EnhancedSMAPNotes, str]]) -> List[str]:
+        """Bulk-load many (enhanced_smap, filing_text) pairs, e.g. a semester of filings"""
+        
+        started = time.perf_counter()
+        filing_ids = [self._queue_filing(enhanced_smap, filing_text) for enhanced_smap, filing_text in filings]
+        self.bulk_writer.flush()
+        
+        log.info("filings_bulk_loaded", filings=len(set(filing_ids)), backend=self.backend.name,
+                 seconds=round(time.perf_counter() - started, 3))
+        return filing_ids
+    
+    def flush(self):
+        """Write queued filings now"""
+        self.bulk_writer.flush()
+    
+    def _queue_filing(self, enhanced_smap: EnhancedSMAPNotes, filing_text: str) -> str:
+        filing_id = filing_id_for(enhanced_smap.ticker_symbol, enhanced_smap.filing_period, filing_text)
+        # Benchmark rows are rebuilt from this worker's cohort: bring it up to date with other workers first
+        self._sync_with_database()
+        with self._sync_lock:
+            self.bulk_writer.add(filing_id, self._filing_rows(filing_id, enhanced_smap, filing_text))
+            self._queue_benchmarks(self._record_metrics(
+                filing_id, enhanced_smap.ticker_symbol, enhanced_smap.company_name,
+                enhanced_smap.industry, enhanced_smap.filing_period, enhanced_smap.financial_metrics
+            ))
+        return filing_id
+    
+    def _filing_rows(self, filing_id: str, enhanced_smap: EnhancedSMAPNotes,
+                     filing_text: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Rows for a filing with its company, metrics, SMAP notes, risks and segments, keyed by table"""
         
-        filing_id = f"{enhanced_smap.ticker_symbol}_{enhanced_smap.filing_period}_{datetime.now().strftime('%Y%m%d')}"
         company_id = f"{enhanced_smap.ticker_symbol}_{enhanced_smap.company_name.replace(' ', '_')}"
+        key = period_key(enhanced_smap.filing_period, enhanced_smap.financial_metrics.quarter,
+                         enhanced_smap.financial_metrics.year)
+        quarter, year = (f"Q{key % 4 + 1}", key // 4) if key >= 0 else (None, None)
         
-        # Simulate data insertion for demo
-        stored_data = {
-            'filing_id': filing_id,
-            'company': {
+        return {
+            'companies': [{
                 'company_id': company_id,
                 'company_name': enhanced_smap.company_name,
                 'ticker_symbol': enhanced_smap.ticker_symbol,
-                'industry': enhanced_smap.industry
-            },
-            'financial_metrics': asdict(enhanced_smap.financial_metrics),
-            'smap_notes': {
+                'industry': enhanced_smap.industry,
+                'market_cap_category': enhanced_smap.market_cap_category
+            }],
+            'filings': [{
+                'filing_id': filing_id,
+                'company_id': company_id,
+                'filing_type': enhanced_smap.filing_type,
+                'filing_period': enhanced_smap.filing_period,
+                'filing_date': enhanced_smap.financial_metrics.filing_date,
+                'quarter': quarter,
+                'year': year,
+                'raw_text': filing_text
+            }],
+            'financial_metrics': [{
+                'metric_id': f"{filing_id}_metrics",
+                'filing_id': filing_id,
+                **{name: getattr(enhanced_smap.financial_metrics, name) for name in METRIC_FIELDS}
+            }],
+            'smap_notes': [{
+                'note_id': f"{filing_id}_smap",
+                'filing_id': filing_id,
                 'subjective': enhanced_smap.subjective,
                 'metrics': enhanced_smap.metrics,
                 'assessment': enhanced_smap.assessment,
-                'plan': enhanced_smap.plan
-            },
-            'risk_factors': asdict(enhanced_smap.risk_factors),
-            'business_segments': asdict(enhanced_smap.business_segments)
+                'plan': enhanced_smap.plan,
+                'generated_by': 'gemini'
+            }],
+            'risk_factors': [
+                {'risk_id': f"{filing_id}_risk_{category}_{index}", 'filing_id': filing_id,
+                 'risk_category': category, 'risk_description': description, 'severity_score': None}
+                for category, descriptions in asdict(enhanced_smap.risk_factors).items()
+                for index, description in enumerate(descriptions)
+            ],
+            'business_segments': [
+                {'segment_id': f"{filing_id}_segment_{index}", 'filing_id': filing_id, 'segment_name': name,
+                 'segment_revenue': values.get('revenue'),
+                 'segment_net_income': values.get('net_income', values.get('income')),
+                 'segment_assets': values.get('assets')}
+                for index, (name, values) in enumerate(enhanced_smap.business_segments.segments.items())
+            ]
         }
-        
-        print(f"💾 Stored enhanced SMAP data in Snowflake:")
-        print(f"   📄 Filing ID: {filing_id}")
-        print(f"   🏢 Company: {enhanced_smap.company_name} ({enhanced_smap.ticker_symbol})")
-        print(f"   📊 Metrics: {len([v for v in asdict(enhanced_smap.financial_metrics).values() if v is not None])} extracted")
-        print(f"   ⚠️ Risk Factors: {len(enhanced_smap.risk_factors.credit_risk + enhanced_smap.risk_factors.market_risk)} identified")
-        print(f"   🏢 Business Segments: {len(enhanced_smap.business_segments.segments)} segments")
-        
-        return filing_id
     
     def get_historical_comparison(self, ticker: str, metric_name: str, periods: int = 4) -> Dict[str, Any]:
         """Get historical comparison data for benchmarking"""
         
-        # Simulate historical data for demo
-        historical_data = {
+        self._sync_with_database()
+        history = self.metrics_store.history(ticker, metric_name)[-(periods + 1):]
+        
+        return {
             'ticker': ticker,
             'metric': metric_name,
-            'periods': [
-                {'period': 'Q1 2024', 'value': 38500, 'yoy_growth': 0.045},
-                {'period': 'Q2 2024', 'value': 40200, 'yoy_growth': 0.052},
-                {'period': 'Q3 2024', 'value': 41800, 'yoy_growth': 0.061},
-                {'period': 'Q4 2024', 'value': 42100, 'yoy_growth': 0.063},
-                {'period': 'Q1 2025', 'value': 42550, 'yoy_growth': 0.068}
-            ],
-            'trend_analysis': {
-                'direction': 'upward',
-                'volatility': 'low',
-                'acceleration': 'stable'
-            }
+            'periods': history,
+            'trend_analysis': self._trend_analysis(history)
         }
+    
+    def _trend_analysis(self, history: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Direction, volatility and acceleration of a metric's recent history"""
+        
+        if len(history) < 2:
+            return {'direction': 'insufficient_data', 'volatility': 'unknown', 'acceleration': 'unknown'}
+        
+        values = np.array([period['value'] for period in history])
+        changes = np.diff(values) / np.maximum(np.abs(values[:-1]), 1e-9)
         
-        return historical_data
+        slope = np.polyfit(np.arange(values.size), values, 1)[0]
+        direction = 'upward' if slope > 0 else 'downward' if slope < 0 else 'flat'
+        
+        volatility = float(changes.std()) if changes.size > 1 else float(abs(changes[0]))
+        volatility_label = 'low' if volatility < 0.02 else 'moderate' if volatility < 0.05 else 'high'
+        
+        if changes.size < 2:
+            acceleration = 'stable'
+        else:
+            delta = changes[-1] - changes[:-1].mean()
+            acceleration = 'accelerating' if delta > 0.01 else 'decelerating' if delta < -0.01 else 'stable'
+        
+        return {'direction': direction, 'volatility': volatility_label, 'acceleration': acceleration}
     
     def get_industry_benchmarks(self, industry: str, metrics: List[str]) -> Dict[str, Any]:
-        """Get industry benchmark data from Snowflake Marketplace"""
+        """Get materialized industry benchmarks for the industry's latest period"""
+        
+        self._sync_with_database()
+        period = self.benchmarks.latest_period(industry)
         
-        # Simulate industry benchmark data
-        benchmarks = {
+        benchmark_metrics = {}
+        for metric in metrics:
+            stats = self.benchmarks.benchmark(industry, metric, period)
+            benchmark = {
+                'industry_median': stats['percentile_50'],
+                'percentile_25': stats['percentile_25'],
+                'percentile_75': stats['percentile_75'],
+                'sample_size': stats['sample_size']
+            }
+            if stats['sample_size']:
+                if metric in LOWER_IS_BETTER:
+                    benchmark['best_in_class'] = stats['min']
+                else:
+                    benchmark['top_quartile'] = stats['top_quartile']
+            if metric == 'common_equity_tier1_ratio':
+                benchmark.update(CET1_REFERENCE_LEVELS)
+            benchmark_metrics[metric] = benchmark
+        
+        peers = self.metrics_store.latest_by_company(industry, ('return_on_equity', 'efficiency_ratio'))
+        
+        return {
             'industry': industry,
-            'benchmark_period': 'Q1 2025',
-            'metrics': {
-                'return_on_equity': {
-                    'industry_median': 0.152,
-                    'percentile_25': 0.118,
-                    'percentile_75': 0.187,
-                    'top_quartile': 0.220
-                },
-                'efficiency_ratio': {
-                    'industry_median': 0.582,
-                    'percentile_25': 0.534,
-                    'percentile_75': 0.631,
-                    'best_in_class': 0.450
-                },
-                'net_interest_margin': {
-                    'industry_median': 0.0251,
-                    'percentile_25': 0.0198,
-                    'percentile_75': 0.0304,
-                    'top_quartile': 0.0350
-                },
-                'common_equity_tier1_ratio': {
-                    'industry_median': 0.131,
-                    'regulatory_minimum': 0.070,
-                    'well_capitalized': 0.100,
-                    'fortress_level': 0.150
-                }
-            },
+            'benchmark_period': period_label(period) if period is not None else None,
+            'metrics': benchmark_metrics,
             'peer_comparison': [
-                {'company': 'Bank of America', 'roe': 0.143, 'efficiency': 0.592},
-                {'company': 'Wells Fargo', 'roe': 0.108, 'efficiency': 0.654},
-                {'company': 'Citigroup', 'roe': 0.089, 'efficiency': 0.701},
-                {'company': 'Goldman Sachs', 'roe': 0.156, 'efficiency': 0.621}
+                {'company': peer['company'], 'ticker': peer['ticker'],
+                 'roe': peer['return_on_equity'], 'efficiency': peer['efficiency_ratio']}
+                for peer in sorted(peers, key=lambda peer: peer['return_on_equity'] or 0, reverse=True)
             ]
         }
-        
-        return benchmarks
     
     def generate_comparison_insights(self, ticker: str, current_metrics: FinancialMetrics) -> Dict[str, Any]:
         """Generate comparison insights using Snowflake data"""
         
         # Get historical data
         historical_roe = self.get_historical_comparison(ticker, 'return_on_equity')
+        historical_revenue = self.get_historical_comparison(ticker, 'total_revenue')
         
         # Get industry benchmarks
         benchmarks = self.get_industry_benchmarks('Banking', ['return_on_equity', 'efficiency_ratio'])
         
+        # Lower efficiency ratio is better, so invert its rank
+        efficiency_rank = self.metrics_store.percentile_rank(
+            'efficiency_ratio', current_metrics.efficiency_ratio, 'Banking')
+        efficiency_percentile = 100 - efficiency_rank if efficiency_rank is not None else None
+        
         # Generate insights
         insights = {
             'company': ticker,
             'analysis_date': datetime.now().isoformat(),
             'performance_vs_history': {
-                'roe_trend': 'improving' if current_metrics.return_on_equity and current_metrics.return_on_equity > 0.15 else 'stable',
-                'revenue_momentum': 'accelerating',
+                'roe_trend': {'upward': 'improving', 'downward': 'declining'}.get(
+                    historical_roe['trend_analysis']['direction'], 'stable'),
+                'revenue_momentum': historical_revenue['trend_analysis']['acceleration'],
                 'margin_pressure': 'contained'
             },
             'performance_vs_peers': {
-                'roe_percentile': 85,  # 85th percentile
-                'efficiency_percentile': 42,  # Below median
-                'capital_strength_percentile': 92  # Very strong
+                'roe_percentile': self.metrics_store.percentile_rank(
+                    'return_on_equity', current_metrics.return_on_equity, 'Banking'),
+                'efficiency_percentile': efficiency_percentile,
+                'capital_strength_percentile': self.metrics_store.percentile_rank(
+                    'common_equity_tier1_ratio', current_metrics.common_equity_tier1_ratio, 'Banking')
             },
             'competitive_positioning': {
                 'strengths': ['Capital strength', 'ROE performance', 'Revenue growth'],
@@ -316,90 +574,43 @@ class SnowflakeService:
         
         return insights
     
-    def execute_snowflake_query(self, query: str) -> pd.DataFrame:
-        """Execute custom Snowflake SQL query"""
-        
-        # Demo queries for different scenarios
-        demo_queries = {
-            'quarterly_comparison': """
-                SELECT 
-                    c.company_name,
-                    f.quarter,
-                    f.year,
-                    fm.total_revenue,
-                    fm.return_on_equity,
-                    fm.efficiency_ratio
-                FROM companies c
-                JOIN filings f ON c.company_id = f.company_id  
-                JOIN financial_metrics fm ON f.filing_id = fm.filing_id
-                WHERE c.ticker_symbol = 'JPM'
-                ORDER BY f.year DESC, f.quarter DESC
-                LIMIT 8
-            """,
-            
-            'peer_analysis': """
-                SELECT 
-                    c.company_name,
-                    c.ticker_symbol,
-                    fm.return_on_equity,
-                    fm.efficiency_ratio,
-                    fm.common_equity_tier1_ratio
-                FROM companies c
-                JOIN filings f ON c.company_id = f.company_id
-                JOIN financial_metrics fm ON f.filing_id = fm.filing_id  
-                WHERE c.industry = 'Banking'
-                AND f.quarter = 'Q1' AND f.year = 2025
-                ORDER BY fm.return_on_equity DESC
-            """,
-            
-            'risk_summary': """
-                SELECT 
-                    rf.risk_category,
-                    COUNT(*) as risk_count,
-                    AVG(rf.severity_score) as avg_severity
-                FROM risk_factors rf
-                JOIN filings f ON rf.filing_id = f.filing_id
-                JOIN companies c ON f.company_id = c.company_id
-                WHERE c.ticker_symbol = 'JPM'
-                GROUP BY rf.risk_category
-                ORDER BY risk_count DESC
-            """
-        }
+    def execute_snowflake_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """Execute a named analytics query (see ANALYTICS_QUERIES) or raw parameterized SQL"""
         
-        # Simulate query results
-        if 'quarterly_comparison' in query.lower():
-            result_data = {
-                'company_name': ['JPMorgan Chase & Co.'] * 4,
-                'quarter': ['Q1', 'Q4', 'Q3', 'Q2'],
-                'year': [2025, 2024, 2024, 2024], 
-                'total_revenue': [42550, 42100, 41800, 40200],
-                'return_on_equity': [0.178, 0.172, 0.169, 0.165],
-                'efficiency_ratio': [0.558, 0.562, 0.571, 0.568]
-            }
-        elif 'peer_analysis' in query.lower():
-            result_data = {
-                'company_name': ['JPMorgan Chase & Co.', 'Goldman Sachs', 'Bank of America', 'Wells Fargo'],
-                'ticker_symbol': ['JPM', 'GS', 'BAC', 'WFC'],
-                'return_on_equity': [0.178, 0.156, 0.143, 0.108],
-                'efficiency_ratio': [0.558, 0.621, 0.592, 0.654],
-                'common_equity_tier1_ratio': [0.159, 0.142, 0.128, 0.118]
-            }
-        else:
-            result_data = {
-                'risk_category': ['Credit Risk', 'Market Risk', 'Operational Risk'],
-                'risk_count': [5, 3, 4],
-                'avg_severity': [3.2, 2.8, 2.5]
-            }
+        # Read your writes: queued filings are flushed before querying; other workers' writes drop stale results
+        self.bulk_writer.flush()
+        self._sync_with_database()
+        
+        if query in ANALYTICS_QUERIES:
+            params = {**QUERY_DEFAULTS, **(params or {})}
+            if query == 'peer_analysis' and not {'quarter', 'year'} <= params.keys():
+                params.update(self._latest_period_params(params['industry']))
+            query = ANALYTICS_QUERIES[query]
         
-        return pd.DataFrame(result_data)
+        return self._cached_query(query, params)
+    
+    def _cached_query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        with tracing.span('analytics.query', kind='client', **{
+                'db.system': self.backend.name, 'db.query.text': normalize_sql(sql)[:500]}) as span:
+            result = self.query_cache.get_or_run(sql, params, lambda: self.backend.query(sql, params))
+            span.set_attribute('db.response.returned_rows', len(result))
+            return result
+    
+    def _latest_period_params(self, industry: str) -> Dict[str, Any]:
+        latest = self._cached_query(ANALYTICS_QUERIES['latest_period'], {'industry': industry})
+        if latest.empty:
+            return {'quarter': None, 'year': None}
+        return {'quarter': latest.iloc[0]['quarter'], 'year': int(latest.iloc[0]['year'])}
     
     def generate_dashboard_data(self, ticker: str) -> Dict[str, Any]:
         """Generate comprehensive dashboard data from Snowflake"""
         
         # Execute multiple queries to build dashboard
-        quarterly_data = self.execute_snowflake_query('quarterly_comparison')
-        peer_data = self.execute_snowflake_query('peer_analysis') 
-        risk_data = self.execute_snowflake_query('risk_summary')
+        self._sync_with_database()
+        industry = self.metrics_store.industry_of(ticker) or QUERY_DEFAULTS['industry']
+        quarterly_data = self.execute_snowflake_query('quarterly_comparison', {'ticker': ticker})
+        peer_data = self.execute_snowflake_query('peer_analysis', {'industry': industry})
+        risk_data = self.execute_snowflake_query('risk_summary', {'ticker': ticker})
         
         dashboard_data = {
             'company_overview': {
@@ -430,18 +641,47 @@ def test_snowflake_service():
     # Initialize service
     snowflake_service = SnowflakeService()
     
+    # Ingest sample filings so history and benchmarks have data
+    sample_filings = [
+        ('JPM', 'JPMorgan Chase & Co.', 'Q1 2024', FinancialMetrics(total_revenue=39880, return_on_equity=0.170, efficiency_ratio=0.571, common_equity_tier1_ratio=0.150)),
+        ('JPM', 'JPMorgan Chase & Co.', 'Q2 2024', FinancialMetrics(total_revenue=40200, return_on_equity=0.165, efficiency_ratio=0.568, common_equity_tier1_ratio=0.153)),
+        ('JPM', 'JPMorgan Chase & Co.', 'Q4 2024', FinancialMetrics(total_revenue=42100, return_on_equity=0.172, efficiency_ratio=0.562, common_equity_tier1_ratio=0.157)),
+        ('JPM', 'JPMorgan Chase & Co.', 'Q1 2025', FinancialMetrics(total_revenue=42550, return_on_equity=0.178, efficiency_ratio=0.558, common_equity_tier1_ratio=0.159)),
+        ('BAC', 'Bank of America', 'Q1 2025', FinancialMetrics(total_revenue=25800, return_on_equity=0.143, efficiency_ratio=0.592, common_equity_tier1_ratio=0.128)),
+        ('WFC', 'Wells Fargo', 'Q1 2025', FinancialMetrics(total_revenue=20150, return_on_equity=0.108, efficiency_ratio=0.654, common_equity_tier1_ratio=0.118)),
+        ('GS', 'Goldman Sachs', 'Q1 2025', FinancialMetrics(total_revenue=15060, return_on_equity=0.156, efficiency_ratio=0.621, common_equity_tier1_ratio=0.142))
+    ]
+    snowflake_service.load_filings([
+        (EnhancedSMAPNotes(
+            subjective=f"{company} reported {period} results.",
+            metrics=f"Revenue ${metrics.total_revenue:,.0f}M, ROE {metrics.return_on_equity:.1%}",
+            assessment="Solid capital position.",
+            plan="Monitor credit quality.",
+            financial_metrics=metrics,
+            risk_factors=RiskFactors(credit_risk=["Loan portfolio credit losses"], market_risk=["Interest rate volatility"],
+                                     operational_risk=[], regulatory_risk=["Capital requirements"],
+                                     strategic_risk=[], other_risks=[]),
+            business_segments=BusinessSegments(segments={}),
+            company_name=company, ticker_symbol=ticker, filing_type="10-Q",
+            filing_period=period, industry="Banking"
+        ), "")
+        for ticker, company, period, metrics in sample_filings
+    ])
+    
     # Test historical comparison
     print("\n📊 Historical Comparison Analysis:")
     historical_data = snowflake_service.get_historical_comparison('JPM', 'total_revenue')
     
     for period_data in historical_data['periods'][-3:]:
-        print(f"   {period_data['period']}: ${period_data['value']}M (+{period_data['yoy_growth']:.1%} YoY)")
+        yoy = f" ({period_data['yoy_growth']:+.1%} YoY)" if period_data['yoy_growth'] is not None else ""
+        print(f"   {period_data['period']}: ${period_data['value']:,.0f}M{yoy}")
     
     # Test industry benchmarking
     print("\n🏛️ Industry Benchmark Analysis:")
     benchmarks = snowflake_service.get_industry_benchmarks('Banking', ['return_on_equity'])
     
     roe_benchmark = benchmarks['metrics']['return_on_equity']
+    print(f"   Cohort: {roe_benchmark['sample_size']} filings ({benchmarks['benchmark_period']})")
     print(f"   ROE Industry Median: {roe_benchmark['industry_median']:.1%}")
     print(f"   Top Quartile: {roe_benchmark['top_quartile']:.1%}")
     print(f"   25th Percentile: {roe_benchmark['percentile_25']:.1%}")
@@ -4,14 +4,18 @@
 HackRU 2025 Project by azrabano
 
 Simple script to start the FastAPI backend with proper configuration
+
+    python start_backend.py                 # one auto-reloading worker (development)
+    python start_backend.py --workers 4     # four worker processes sharing state (production)
 """
 
 import os
 import sys
+import argparse
 import uvicorn
 from pathlib import Path
 
-def start_backend():
+def start_backend(workers: int = 1, host: str = "0.0.0.0", port: int = 8000):
     """Start the 10Q Notes AI FastAPI backend"""
     
     print("🚀 10Q Notes AI Backend - Starting Up")
@@ -45,11 +49,24 @@ def start_backend():
     # Set up environment
     os.environ.setdefault("PYTHONPATH", str(current_dir))
     
-    # Server configuration
-    host = "0.0.0.0"
-    port = 8000
+    # Workers share sessions, students and jobs through the state store, so any worker
+    # can serve any request; per-process memory only works for a single worker
+    if workers > 1 and os.getenv("STATE_BACKEND", "memory").lower() == "memory":
+        os.environ["STATE_BACKEND"] = "sqlite"
+        print("🗄️ STATE_BACKEND=memory cannot be shared between workers - using sqlite "
+              f"({os.getenv('STATE_DB_PATH', 'state.db')})")
+    # The embedded analytics database has to be one file too, or each worker ingests filings privately
+    if workers > 1:
+        if os.getenv("ANALYTICS_DB_PATH", "") == ":memory:":
+            print("❌ Error: ANALYTICS_DB_PATH=:memory: cannot be shared between workers")
+            print("   Set ANALYTICS_DB_PATH to a file path (e.g. analytics.db)")
+            sys.exit(1)
+        os.environ.setdefault("ANALYTICS_DB_PATH", "analytics.db")
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        print(f"📈 Analytics database: {os.environ['ANALYTICS_DB_PATH']}")
     
     print(f"\n🌐 Starting server at http://{host}:{port}")
+    print(f"⚙️ Workers: {workers} ({'shared ' + os.getenv('STATE_BACKEND', 'memory') + ' state' if workers > 1 else 'auto-reload'})")
     print("📱 API Documentation: http://localhost:8000/docs")
     print("🔍 Health Check: http://localhost:8000/health")
     print("\n🛑 Press Ctrl+C to stop the server")
@@ -61,7 +78,8 @@ def start_backend():
             "backend_app:app",
             host=host,
             port=port,
-            reload=True,  # Enable auto-reload for development
+            reload=workers == 1,  # Auto-reload for development; uvicorn cannot reload multiple workers
+            workers=workers,
             log_level="info",
             access_log=True
         )
@@ -73,4 +91,10 @@ def start_backend():
         sys.exit(1)
 
 if __name__ == "__main__":
-    start_backend()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Start the 10Q Notes AI backend")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 1)),
+                        help="worker processes (default 1, with auto-reload)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    start_backend(max(1, args.workers), args.host, args.port)
\ No newline at end of file
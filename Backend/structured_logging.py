@@ -0,0 +1,252 @@
+"""
+10Q Notes AI - Structured Logging
+HackRU 2025 Project by azrabano
+
+Non-blocking structured logs for the backend services:
+- structlog event dicts (one line per event, key=value or JSON) instead of multi-line print banners
+- Records go through a QueueHandler; rendering and stdout/file writes happen on a listener thread
+- Per-module levels, e.g. LOG_LEVELS="snowflake_service=WARNING,llm_resilience=DEBUG"
+- Sampling of high-frequency events, e.g. LOG_SAMPLING="learn_mode_entered=0.1"
+- Trace and span ids of the current trace span on every event
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from typing import Any, Dict, Optional
+
+import tracing
+
+try:
+    import structlog
+    DropEvent = structlog.DropEvent
+except ImportError:
+    structlog = None
+
+    class DropEvent(Exception):
+        """Raised by a processor to discard an event"""
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'console').lower()  # console | json
+LOG_FILE = os.getenv('LOG_FILE')
+
+# High-frequency events and the fraction kept; LOG_SAMPLING overrides these
+DEFAULT_SAMPLING = {
+    'learn_mode_entered': 0.1,
+    'practice_mode_entered': 0.1,
+    'grade_cache_hit': 0.1,
+    'grade_near_duplicate_hit': 0.1,
+    'grade_prescore_short_circuit': 0.1,
+    'filing_queued': 0.01
+}
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+class EventSampler:
+    """Keeps one in every round(1 / rate) occurrences of each sampled event"""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if rate > 0}
+        self.muted = {event for event, rate in rates.items() if rate <= 0}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        event = event_dict.get('event')
+        if event in self.muted:
+            raise DropEvent
+        every = self.every.get(event, 1)
+        if every == 1 or method_name in ('warning', 'error', 'exception', 'critical'):
+            return event_dict
+        with self._lock:
+            seen = self._seen[event] = self._seen.get(event, 0) + 1
+        if seen % every != 1:
+            raise DropEvent
+        event_dict['sampled_1_in'] = every
+        return event_dict
+
+
+def add_trace_context(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Correlate log lines with the trace span they were emitted in"""
+    span = tracing.current_span()
+    if span.recording:
+        event_dict['trace_id'] = span.trace_id
+        event_dict['span_id'] = span.span_id
+    return event_dict
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records untouched, leaving all formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _EventFormatter(logging.Formatter):
+    """Renders event-dict records when structlog is not installed"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = dict(record.msg) if isinstance(record.msg, dict) else {'event': record.getMessage()}
+        event.setdefault('logger', record.name)
+        event.setdefault('level', record.levelname.lower())
+        event.setdefault('timestamp', self.formatTime(record, '%Y-%m-%dT%H:%M:%S'))
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        if LOG_FORMAT == 'json':
+            return json.dumps(event, default=str)
+        head = f"{event.pop('timestamp')} [{event.pop('level'):<7}] {event.pop('event')}"
+        event.pop('logger')
+        return " ".join([head] + [f"{key}={value}" for key, value in event.items()])
+
+
+class _EventLogger:
+    """Minimal structlog-style bound logger over stdlib logging, used when structlog is missing"""
+
+    def __init__(self, logger: logging.Logger, processors, context: Optional[Dict[str, Any]] = None):
+        self._logger = logger
+        self._processors = processors
+        self._context = context or {}
+
+    def bind(self, **values) -> '_EventLogger':
+        return _EventLogger(self._logger, self._processors, {**self._context, **values})
+
+    def _log(self, method_name: str, level: int, event: str, **values):
+        if not self._logger.isEnabledFor(level):
+            return
+        event_dict = {**self._context, 'event': event, **values}
+        exc_info = event_dict.pop('exc_info', method_name == 'exception')
+        try:
+            for processor in self._processors:
+                event_dict = processor(self._logger, method_name, event_dict)
+        except DropEvent:
+            return
+        self._logger.log(level, event_dict, exc_info=exc_info)
+
+    def debug(self, event: str, **values):
+        self._log('debug', logging.DEBUG, event, **values)
+
+    def info(self, event: str, **values):
+        self._log('info', logging.INFO, event, **values)
+
+    def warning(self, event: str, **values):
+        self._log('warning', logging.WARNING, event, **values)
+
+    def error(self, event: str, **values):
+        self._log('error', logging.ERROR, event, **values)
+
+    def exception(self, event: str, **values):
+        self._log('exception', logging.ERROR, event, **values)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_processors = []
+
+
+def configure_logging(level: str = LOG_LEVEL, module_levels: Optional[Dict[str, str]] = None,
+                      sampling: Optional[Dict[str, float]] = None):
+    """Route all logging through one queue and a background writer; safe to call more than once"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    rates = {**DEFAULT_SAMPLING, **{event: float(rate) for event, rate in _parse_pairs(os.getenv('LOG_SAMPLING')).items()}}
+    rates.update(sampling or {})
+    # Updated in place so loggers handed out earlier pick up the new settings
+    _processors[:] = [EventSampler(rates), add_trace_context]
+
+    targets = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        targets.append(logging.FileHandler(LOG_FILE, encoding='utf-8'))
+
+    if structlog is not None:
+        timestamper = structlog.processors.TimeStamper(fmt='iso')
+        renderer = structlog.processors.JSONRenderer() if LOG_FORMAT == 'json' \
+            else structlog.dev.ConsoleRenderer(colors=False)
+        formatter = structlog.stdlib.ProcessorFormatter(
+            processor=renderer,
+            foreign_pre_chain=[structlog.stdlib.add_logger_name, structlog.stdlib.add_log_level, timestamper]
+        )
+        structlog.configure(
+            processors=[
+                structlog.stdlib.filter_by_level,
+                structlog.stdlib.add_logger_name,
+                structlog.stdlib.add_log_level,
+                *_processors,
+                timestamper,
+                structlog.processors.format_exc_info,
+                structlog.stdlib.ProcessorFormatter.wrap_for_formatter
+            ],
+            logger_factory=structlog.stdlib.LoggerFactory(),
+            wrapper_class=structlog.stdlib.BoundLogger,
+            cache_logger_on_first_use=True
+        )
+    else:
+        formatter = _EventFormatter()
+
+    for target in targets:
+        target.setFormatter(formatter)
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_EnqueueHandler(records)]
+    root.setLevel(level)
+    for module, module_level in {**_parse_pairs(os.getenv('LOG_LEVELS')), **(module_levels or {})}.items():
+        logging.getLogger(module).setLevel(module_level.upper())
+
+    _listener = logging.handlers.QueueListener(records, *targets, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write out queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str):
+    """Structured logger for a module: log.info("event_name", key=value, ...)"""
+    if structlog is not None:
+        return structlog.get_logger(name)
+    return _EventLogger(logging.getLogger(name), _processors)
+
+
+configure_logging()
+atexit.register(shutdown_logging)
+
+
+def test_structured_logging():
+    """Log a burst of sampled events and time the caller-side cost"""
+    import time
+    print("🧪 Testing Structured Logging")
+
+    configure_logging(module_levels={'demo.quiet': 'WARNING'}, sampling={'demo_tick': 0.001})
+    log = get_logger('demo').bind(session_id='abc123')
+    log.info("learning_session_started", student_id='student_1', ticker='JPM')
+    get_logger('demo.quiet').info("hidden_event")
+
+    started = time.perf_counter()
+    for i in range(10000):
+        log.info("demo_tick", i=i)
+    elapsed = time.perf_counter() - started
+    shutdown_logging()
+    print(f"✅ 10,000 sampled events in {elapsed * 1000:.1f}ms on the calling thread")
+
+
+if __name__ == "__main__":
+    test_structured_logging()
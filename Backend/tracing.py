@@ -0,0 +1,363 @@
+"""
+10Q Notes AI - Request Tracing
+HackRU 2025 Project by azrabano
+
+OpenTelemetry-compatible tracing without a collector:
+- Spans with W3C trace context ids (traceparent in and out) and OTel semantic attribute names
+- Current span carried in a contextvar, so async routes and the LLM worker threads nest correctly
+- Spans exported off the request path by a background thread, as OTLP-shaped JSON lines to a
+  file or as one-line summaries to the console
+- Head sampling per trace
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# none | console | file
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none').lower()
+TRACING_FILE = os.getenv('TRACING_FILE', 'traces.jsonl')
+TRACING_SAMPLE_RATIO = float(os.getenv('TRACING_SAMPLE_RATIO', 1.0))
+SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', '10q-notes-backend')
+
+# stdlib logger: structured_logging imports this module, and renders these records too
+log = logging.getLogger(__name__)
+
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """One timed operation; attributes use OpenTelemetry semantic convention names where one exists"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'events', 'status', 'status_message')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = 'internal',
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = 'unset'
+        self.status_message = ''
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, exc: BaseException):
+        self.status, self.status_message = 'error', f"{type(exc).__name__}: {exc}"
+        self.events.append({'name': 'exception', 'timeUnixNano': time.time_ns(),
+                            'attributes': {'exception.type': type(exc).__name__, 'exception.message': str(exc)}})
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span as an OTLP/JSON span object"""
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': SPAN_KINDS.get(self.kind, 1),
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'events': self.events,
+            'status': {'code': {'unset': 0, 'ok': 1, 'error': 2}[self.status], 'message': self.status_message}
+        }
+
+
+class _NonRecordingSpan:
+    """Stands in for spans of unsampled traces; keeps the trace id so propagation still works"""
+
+    __slots__ = ('trace_id', 'span_id')
+    recording = False
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-00"
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class ConsoleSpanExporter:
+    """One line per finished span"""
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            marker = "❌" if span.status == 'error' else "🔎"
+            print(f"{marker} [{span.trace_id[:8]}] {span.name} {span.duration_ms:.1f}ms {attributes}".rstrip())
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+    """Appends OTLP-shaped JSON lines ({resource, span}) to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._resource = {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]}
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            self._file.write(json.dumps({'resource': self._resource, 'span': span.to_otlp()}) + "\n")
+        self._file.flush()
+
+    def shutdown(self):
+        self._file.close()
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them from a background thread, dropping spans when full"""
+
+    def __init__(self, exporter, max_queue: int = 2048, batch_size: int = 256, interval: float = 1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name="span-exporter")
+        self._thread.start()
+
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        batch = self._drain()
+        while batch:
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                log.warning("span_export_failed: %s", e)
+            batch = self._drain()
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+        self.exporter.shutdown()
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """Creates spans, tracks the current one and hands finished spans to the processor"""
+
+    def __init__(self, processor: Optional[BatchSpanProcessor] = None, sample_ratio: float = 1.0):
+        self.processor = processor
+        self.sample_ratio = sample_ratio
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal', parent: Optional[Tuple[str, str, bool]] = None,
+             attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Run the block inside a new span.
+
+        parent is a (trace_id, span_id, sampled) tuple from an incoming
+        traceparent; otherwise the current span is the parent, and with
+        no current span a new trace starts.
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        if parent is None:
+            current = _current.get()
+            if current is not None:
+                parent = (current.trace_id, current.span_id, current.recording)
+
+        if parent is None:
+            trace_id, parent_id, sampled = _new_id(128), None, random.random() < self.sample_ratio
+        else:
+            trace_id, parent_id, sampled = parent
+
+        span = Span(name, trace_id, parent_id, kind, attributes) if sampled \
+            else _NonRecordingSpan(trace_id, _new_id(64))
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            if sampled:
+                span.end_ns = time.time_ns()
+                if span.status == 'unset':
+                    span.status = 'ok'
+                self.processor.on_end(span)
+
+    def shutdown(self):
+        if self.processor is not None:
+            self.processor.shutdown()
+
+
+class _NoopSpan(_NonRecordingSpan):
+    def __init__(self):
+        super().__init__('0' * 32, '0' * 16)
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _build_tracer() -> Tracer:
+    if TRACING_EXPORTER == 'console':
+        exporter = ConsoleSpanExporter()
+    elif TRACING_EXPORTER == 'file':
+        exporter = FileSpanExporter(TRACING_FILE)
+    else:
+        return Tracer()
+    tracer = Tracer(BatchSpanProcessor(exporter), TRACING_SAMPLE_RATIO)
+    atexit.register(tracer.shutdown)
+    log.info("tracing_enabled exporter=%s sample_ratio=%g", TRACING_EXPORTER, TRACING_SAMPLE_RATIO)
+    return tracer
+
+
+tracer = _build_tracer()
+
+
+def span(name: str, kind: str = 'internal', parent: Optional[Tuple[str, str, bool]] = None, **attributes):
+    """Context manager for a span on the global tracer"""
+    return tracer.span(name, kind=kind, parent=parent, attributes=attributes)
+
+
+def current_span():
+    return _current.get() or _NOOP_SPAN
+
+
+def set_attributes(**attributes):
+    """Attach attributes to the current span, if any"""
+    current_span().set_attributes(attributes)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None if malformed"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, span_id, flags = (int(part, 16) for part in parts[1:])
+    except ValueError:
+        return None
+    if trace_id == 0 or span_id == 0:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def record_llm_usage(usage: Any, model: Optional[str] = None):
+    """Token counts from a Gemini response's usage_metadata onto the current span"""
+    set_attributes(**{
+        'gen_ai.system': 'gemini',
+        'gen_ai.request.model': model,
+        'gen_ai.usage.input_tokens': getattr(usage, 'prompt_token_count', None),
+        'gen_ai.usage.output_tokens': getattr(usage, 'candidates_token_count', None),
+        'gen_ai.usage.cached_tokens': getattr(usage, 'cached_content_token_count', None)
+    })
+
+
+def test_tracing():
+    """Nest spans across a worker thread and export them to the console"""
+    from concurrent.futures import ThreadPoolExecutor
+    print("🧪 Testing Tracing")
+
+    local = Tracer(BatchSpanProcessor(ConsoleSpanExporter(), interval=60))
+    incoming = parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+
+    with local.span("GET /api/session/{session_id}/earnings-call", kind='server', parent=incoming) as root:
+        with ThreadPoolExecutor(1) as pool:
+            def tts():
+                with local.span("voice_synthesis", attributes={'tts.audio_bytes': 48213}) as child:
+                    return child.parent_id
+            parent_id = pool.submit(contextvars.copy_context().run, tts).result()
+        try:
+            with local.span("llm_smap_notes", kind='client'):
+                raise TimeoutError("deadline")
+        except TimeoutError:
+            pass
+
+    assert root.trace_id == incoming[0] and parent_id == root.span_id
+    local.shutdown()
+    print("✅ Spans share the incoming trace and nest across threads")
+
+
+if __name__ == "__main__":
+    test_tracing()
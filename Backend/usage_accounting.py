@@ -0,0 +1,306 @@
+"""
+10Q Notes AI - Usage Accounting
+HackRU 2025 Project by azrabano
+
+Token, character and cost accounting for AI calls:
+- Every Gemini call records input/output/cached tokens; every TTS call records characters synthesized
+- Calls are attributed to the session, student, filing and endpoint in the current usage scope
+- Running totals and estimated cost per session, student, filing and endpoint
+- Totals are counters in the shared state store, so every worker enforces the same budgets
+- Budgets per session and per student per day; callers degrade to cached or shorter output when over
+"""
+
+import os
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, asdict
+from datetime import date, datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from tracing import record_llm_usage
+from structured_logging import get_logger
+from shared_state import StateStore, MemoryStateStore, state_store
+
+log = get_logger(__name__)
+
+# Aggregation dimension -> UsageRecord field
+DIMENSIONS = {'session': 'session_id', 'student': 'student_id', 'filing': 'filing', 'endpoint': 'endpoint'}
+
+# USD list prices; override for other models or negotiated rates
+LLM_INPUT_COST_PER_1M = float(os.getenv('LLM_INPUT_COST_PER_1M_TOKENS', 1.25))
+LLM_OUTPUT_COST_PER_1M = float(os.getenv('LLM_OUTPUT_COST_PER_1M_TOKENS', 10.0))
+LLM_CACHED_COST_PER_1M = float(os.getenv('LLM_CACHED_COST_PER_1M_TOKENS', 0.31))
+TTS_COST_PER_1K_CHARS = float(os.getenv('TTS_COST_PER_1K_CHARS', 0.30))
+
+
+@dataclass
+class UsageRecord:
+    """One AI call"""
+    kind: str  # 'llm' or 'tts'
+    model: str = ""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    characters: int = 0
+    session_id: Optional[str] = None
+    student_id: Optional[str] = None
+    filing: Optional[str] = None
+    endpoint: Optional[str] = None
+    recorded_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    @property
+    def cost(self) -> float:
+        uncached = max(self.input_tokens - self.cached_tokens, 0)
+        return (uncached * LLM_INPUT_COST_PER_1M + self.cached_tokens * LLM_CACHED_COST_PER_1M
+                + self.output_tokens * LLM_OUTPUT_COST_PER_1M) / 1e6 + self.characters * TTS_COST_PER_1K_CHARS / 1e3
+
+
+@dataclass
+class UsageTotals:
+    """Running totals for one session, student, filing or endpoint"""
+    llm_calls: int = 0
+    tts_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    tts_characters: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @staticmethod
+    def amounts(record: UsageRecord) -> Dict[str, float]:
+        """Counter increments for one call"""
+        return {
+            'llm_calls': int(record.kind == 'llm'),
+            'tts_calls': int(record.kind != 'llm'),
+            'input_tokens': record.input_tokens,
+            'output_tokens': record.output_tokens,
+            'cached_tokens': record.cached_tokens,
+            'tts_characters': record.characters,
+            'cost_usd': record.cost
+        }
+
+    @classmethod
+    def from_counters(cls, counters: Dict[str, float]) -> 'UsageTotals':
+        return cls(**{f.name: f.type(counters.get(f.name, 0)) for f in fields(cls)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'tokens': self.tokens, 'cost_usd': round(self.cost_usd, 6)}
+
+
+@dataclass
+class UsageBudget:
+    """Limits that trigger degraded output; 0 means unlimited"""
+    session_tokens: int = 0
+    student_daily_tokens: int = 0
+    session_tts_characters: int = 0
+    student_daily_tts_characters: int = 0
+
+    @classmethod
+    def from_env(cls) -> 'UsageBudget':
+        return cls(
+            session_tokens=int(os.getenv('USAGE_BUDGET_SESSION_TOKENS', 0)),
+            student_daily_tokens=int(os.getenv('USAGE_BUDGET_STUDENT_DAILY_TOKENS', 0)),
+            session_tts_characters=int(os.getenv('USAGE_BUDGET_SESSION_TTS_CHARS', 0)),
+            student_daily_tts_characters=int(os.getenv('USAGE_BUDGET_STUDENT_DAILY_TTS_CHARS', 0))
+        )
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar('usage_scope', default={})
+
+
+@contextmanager
+def usage_scope(**attribution) -> Iterator[Dict[str, Any]]:
+    """Attribute AI calls inside the block to a session_id, student_id, filing and/or endpoint"""
+    merged = {**_scope.get(), **{key: value for key, value in attribution.items() if value is not None}}
+    token = _scope.set(merged)
+    try:
+        yield merged
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Dict[str, Any]:
+    return _scope.get()
+
+
+def scoped_iter(iterator: Iterator[Any], **attribution) -> Iterator[Any]:
+    """
+    Attribute the work done by each step of a generator.
+
+    A streaming response may resume the generator in a different
+    context each time, so the scope is entered per step rather than
+    around the whole loop.
+    """
+    iterator = iter(iterator)
+    while True:
+        with usage_scope(**attribution):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class UsageLedger:
+    """
+    Aggregates UsageRecords by dimension and checks them against budgets.
+
+    Totals are counters in a state store ('usage:<dimension>' namespaces),
+    so with a shared store a session's budget covers its calls on every
+    worker. recent and stats are this worker's own.
+    """
+
+    def __init__(self, budget: Optional[UsageBudget] = None, history: int = 1000, store: Optional[StateStore] = None):
+        self.budget = budget or UsageBudget.from_env()
+        self.store = store or MemoryStateStore()
+        self.recent: Deque[UsageRecord] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.stats = {'degraded': 0}
+
+    @staticmethod
+    def _daily_key(student_id: str) -> str:
+        return f"{student_id}:{date.today().isoformat()}"
+
+    def _totals(self, namespace: str, key: str) -> Optional[UsageTotals]:
+        counters = self.store.counters(namespace, key)
+        return UsageTotals.from_counters(counters) if counters else None
+
+    @property
+    def overall(self) -> UsageTotals:
+        return self._totals('usage:overall', 'all') or UsageTotals()
+
+    def record(self, record: UsageRecord):
+        amounts = UsageTotals.amounts(record)
+        updates = [('usage:overall', 'all', amounts)]
+        for dimension, attribute in DIMENSIONS.items():
+            name = getattr(record, attribute)
+            if name:
+                updates.append((f"usage:{dimension}", name, amounts))
+        if record.student_id:
+            updates.append(('usage:student_daily', self._daily_key(record.student_id), amounts))
+        self.store.increment(updates)
+        with self._lock:
+            self.recent.append(record)
+
+    def record_llm(self, response: Any, model: Optional[str] = None) -> UsageRecord:
+        """Account for a Gemini response in the current scope (and tag the current trace span)"""
+        try:
+            usage = getattr(response, 'usage_metadata', None)
+        except Exception:
+            usage = None  # a stream abandoned before its final chunk has no usage yet
+        record_llm_usage(usage, model)
+        record = UsageRecord(
+            kind='llm', model=model or "",
+            input_tokens=int(getattr(usage, 'prompt_token_count', 0) or 0),
+            output_tokens=int(getattr(usage, 'candidates_token_count', 0) or 0),
+            cached_tokens=int(getattr(usage, 'cached_content_token_count', 0) or 0),
+            **self._attribution()
+        )
+        self.record(record)
+        return record
+
+    def record_tts(self, characters: int, model: str = "") -> UsageRecord:
+        record = UsageRecord(kind='tts', model=model, characters=characters, **self._attribution())
+        self.record(record)
+        return record
+
+    @staticmethod
+    def _attribution() -> Dict[str, Any]:
+        scope = _scope.get()
+        return {attribute: scope.get(attribute) for attribute in DIMENSIONS.values()}
+
+    def over_budget(self, kind: str = 'llm') -> Optional[str]:
+        """Name of the budget the current scope has used up for this kind of call, or None"""
+        scope = _scope.get()
+        session_id, student_id = scope.get('session_id'), scope.get('student_id')
+        metric = 'tokens' if kind == 'llm' else 'tts_characters'
+        limits = (
+            ('session', self.budget.session_tokens if kind == 'llm' else self.budget.session_tts_characters,
+             'usage:session', session_id),
+            ('student_daily', self.budget.student_daily_tokens if kind == 'llm'
+             else self.budget.student_daily_tts_characters,
+             'usage:student_daily', self._daily_key(student_id) if student_id else None)
+        )
+        for name, limit, namespace, key in limits:
+            if not limit or not key:
+                continue
+            totals = self._totals(namespace, key)
+            if totals is not None and getattr(totals, metric) >= limit:
+                return f"{name}_{metric}"
+        return None
+
+    def degrade(self, kind: str, action: str) -> bool:
+        """True (and logged) when the current scope is over budget and the caller should degrade"""
+        exceeded = self.over_budget(kind)
+        if exceeded is None:
+            return False
+        self.stats['degraded'] += 1
+        self.store.increment([('usage:degraded', exceeded, {'count': 1})])
+        log.warning("usage_budget_exceeded", budget=exceeded, action=action, **self._attribution())
+        return True
+
+    def degradations(self) -> Dict[str, int]:
+        """Degraded calls on every worker, by the budget that was exceeded"""
+        return {budget: int(counters.get('count', 0))
+                for budget, counters in self.store.counter_table('usage:degraded').items()}
+
+    def summary(self, dimension: str, name: str) -> Optional[Dict[str, Any]]:
+        totals = self._totals(f"usage:{dimension}", name)
+        return totals.to_dict() if totals else None
+
+    def top(self, dimension: str, limit: int = 20, order_by: str = 'cost_usd') -> List[Dict[str, Any]]:
+        """Most expensive sessions, students, filings or endpoints"""
+        rows = [{dimension: name, **UsageTotals.from_counters(counters).to_dict()}
+                for name, counters in self.store.counter_table(f"usage:{dimension}").items()]
+        return sorted(rows, key=lambda row: row[order_by], reverse=True)[:limit]
+
+
+def shorten_for_budget(text: str, max_chars: int) -> str:
+    """Cut text at the last sentence end within max_chars"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind('. '), cut.rfind('.\n'))
+    return cut[:end + 1] if end > max_chars // 2 else cut
+
+
+# Ledger shared by the AI services; its totals are in the shared state store
+ledger = UsageLedger(store=state_store)
+
+
+def test_usage_accounting():
+    """Attribute a few fake calls and trip a session budget"""
+    from types import SimpleNamespace
+    print("🧪 Testing Usage Accounting")
+
+    test_ledger = UsageLedger(UsageBudget(session_tokens=5000))
+    response = SimpleNamespace(usage_metadata=SimpleNamespace(
+        prompt_token_count=3000, candidates_token_count=800, cached_content_token_count=2000))
+
+    with usage_scope(endpoint='/api/upload/filing'):
+        with usage_scope(session_id='s1', student_id='student_1', filing='JPM Q1 2025'):
+            test_ledger.record_llm(response, 'gemini-2.5-pro')
+            assert not test_ledger.degrade('llm', 'single_call_smap')
+            test_ledger.record_llm(response, 'gemini-2.5-pro')
+            test_ledger.record_tts(1200)
+            assert test_ledger.degrade('llm', 'single_call_smap')
+
+    print(f"   💰 Session s1: {test_ledger.summary('session', 's1')}")
+    print(f"   🏁 Endpoints: {test_ledger.top('endpoint')}")
+
+    # A second worker on the same store sees the session's spend and degrades too
+    other_worker = UsageLedger(UsageBudget(session_tokens=5000), store=test_ledger.store)
+    with usage_scope(session_id='s1'):
+        assert other_worker.degrade('llm', 'single_call_smap')
+    assert other_worker.overall.llm_calls == 2 and other_worker.overall.tts_calls == 1
+    print("✅ Usage attributed and budget enforced")
+
+
+if __name__ == "__main__":
+    test_usage_accounting()
@@ -11,21 +11,36 @@ ElevenLabs integration for MLH "Best Use of ElevenLabs" prize:
 
 import os
 import json
+import hashlib
 from typing import Dict, List, Optional, Tuple
 import tempfile
 import base64
 from dotenv import load_dotenv
 
+from enhanced_gemini_service import EnhancedSMAPNotes
+from instrumentation import track_stage
+from tracing import current_span, set_attributes
+from structured_logging import get_logger
+from usage_accounting import ledger as usage_ledger, shorten_for_budget
+from shm_cache import get_shm_cache
+from single_flight import SingleFlight
+
+log = get_logger(__name__)
+
 # Import ElevenLabs
 try:
     from elevenlabs import ElevenLabs, Voice
 except ImportError:
-    print("⚠️ ElevenLabs not available - running in simulation mode")
-
-from enhanced_gemini_service import EnhancedSMAPNotes
+    log.warning("elevenlabs_unavailable", mode="simulation")
 
 load_dotenv()
 
+# Script length once a session or student is over its TTS character budget
+TTS_DEGRADED_MAX_CHARS = int(os.getenv('TTS_DEGRADED_MAX_CHARS', 600))
+
+# Shared by every VoiceAgentService in the process, keyed like the shared memory cache
+tts_flight = SingleFlight('tts_synthesis')
+
 class VoiceAgentService:
     """ElevenLabs voice agent for simulated earnings calls and financial briefings"""
     
@@ -43,13 +58,11 @@ class VoiceAgentService:
             try:
                 self.client = ElevenLabs(api_key=self.api_key)
                 self.simulation_mode = False
-                print("✅ ElevenLabs voice agent initialized")
-                print("🎤 Ready for realistic voice synthesis")
+                log.info("voice_agent_initialized", mode="elevenlabs")
             except Exception as e:
-                print(f"⚠️ ElevenLabs connection failed: {e}")
-                print("📝 Running in simulation mode")
+                log.warning("elevenlabs_connection_failed", error=str(e), mode="simulation")
         else:
-            print("📝 ElevenLabs simulation mode (add API key for real voice synthesis)")
+            log.info("voice_agent_initialized", mode="simulation", hint="set ELEVENLABS_API_KEY for real voices")
     
     def generate_earnings_call_scripts(self, enhanced_smap: EnhancedSMAPNotes) -> Dict[str, str]:
         """Generate realistic earnings call scripts for management and analyst"""
@@ -96,35 +109,60 @@ class VoiceAgentService:
             'analyst': analyst_script.strip()
         }
     
+    @track_stage('voice_synthesis')
     def synthesize_voice(self, text: str, voice_type: str = 'management') -> Optional[bytes]:
         """Convert text to speech using ElevenLabs"""
         
+        if usage_ledger.degrade('tts', 'shorten_tts'):
+            text = shorten_for_budget(text, TTS_DEGRADED_MAX_CHARS)
+        set_attributes(**{'tts.voice_type': voice_type, 'tts.text_chars': len(text),
+                          'tts.simulated': bool(self.simulation_mode or not self.client)})
         if self.simulation_mode or not self.client:
             # Simulation mode - return placeholder
-            print(f"🎤 [SIMULATION] Generating {voice_type} voice:")
-            print(f"   📝 Text length: {len(text)} characters")
+            log.info("voice_synthesized", voice_type=voice_type, text_chars=len(text), simulated=True)
             return self._create_simulation_audio()
         
         try:
             voice_id = self.management_voice_id if voice_type == 'management' else self.analyst_voice_id
             
-            # Generate speech with ElevenLabs
-            audio_generator = self.client.generate(
-                text=text,
-                voice=voice_id,
-                model="eleven_multilingual_v2"
-            )
+            # Identical scripts (same filing, same voice) are served from host shared memory
+            cache_key = "tts:" + hashlib.sha256(f"eleven_multilingual_v2|{voice_id}|{text}".encode()).hexdigest()
+            shm_cache = get_shm_cache()
+            cached_audio = shm_cache.get(cache_key) if shm_cache is not None else None
+            if cached_audio is not None:
+                set_attributes(**{'tts.audio_bytes': len(cached_audio), 'tts.cache_hit': True})
+                log.info("voice_synthesized", voice_type=voice_type, text_chars=len(text),
+                         audio_bytes=len(cached_audio), cached=True)
+                return cached_audio
             
-            # Convert generator to bytes
-            audio_bytes = b"".join(audio_generator)
+            # Concurrent identical briefings wait for one ElevenLabs call
+            audio_bytes = tts_flight.do(cache_key, self._generate_speech, cache_key, text, voice_id)
+            set_attributes(**{'tts.audio_bytes': len(audio_bytes)})
             
-            print(f"✅ Generated {voice_type} voice: {len(audio_bytes)} bytes")
+            log.info("voice_synthesized", voice_type=voice_type, text_chars=len(text), audio_bytes=len(audio_bytes))
             return audio_bytes
             
         except Exception as e:
-            print(f"❌ Voice synthesis error: {e}")
+            log.error("voice_synthesis_failed", voice_type=voice_type, error=str(e))
+            current_span().record_exception(e)
             return self._create_simulation_audio()
     
+    def _generate_speech(self, cache_key: str, text: str, voice_id: str) -> bytes:
+        """Generate speech with ElevenLabs and publish it to the shared cache"""
+        audio_generator = self.client.generate(
+            text=text,
+            voice=voice_id,
+            model="eleven_multilingual_v2"
+        )
+        
+        # Convert generator to bytes
+        audio_bytes = b"".join(audio_generator)
+        usage_ledger.record_tts(len(text), "eleven_multilingual_v2")
+        shm_cache = get_shm_cache()
+        if shm_cache is not None:
+            shm_cache.put(cache_key, audio_bytes)
+        return audio_bytes
+    
     def _create_simulation_audio(self) -> bytes:
         """Create placeholder audio for simulation mode"""
         # Return empty bytes as placeholder
@@ -133,18 +171,12 @@ class VoiceAgentService:
     def create_earnings_call_experience(self, enhanced_smap: EnhancedSMAPNotes) -> Dict[str, any]:
         """Create complete simulated earnings call experience"""
         
-        print("🎙️ Creating Simulated Earnings Call Experience")
-        print(f"   🏢 Company: {enhanced_smap.company_name}")
-        print(f"   📊 Period: {enhanced_smap.filing_period}")
-        
         # Generate scripts
         scripts = self.generate_earnings_call_scripts(enhanced_smap)
         
         # Generate voice synthesis
-        print("\n🎤 Synthesizing Management Presentation...")
         management_audio = self.synthesize_voice(scripts['management'], 'management')
         
-        print("🎤 Synthesizing Analyst Commentary...")  
         analyst_audio = self.synthesize_voice(scripts['analyst'], 'analyst')
         
         # Create learning questions
@@ -254,8 +286,6 @@ class VoiceAgentService:
     def generate_smap_audio_briefing(self, enhanced_smap: EnhancedSMAPNotes) -> Dict[str, any]:
         """Generate audio briefing of SMAP notes for study purposes"""
         
-        print("📻 Generating SMAP Audio Briefing...")
-        
         # Create concise briefing script
         briefing_script = f"""
         Here's your AI-generated SMAP briefing for {enhanced_smap.company_name}.
@@ -282,7 +312,8 @@ class VoiceAgentService:
             'generated_at': '2025-01-04T17:56:00Z'
         }
         
-        print(f"✅ SMAP audio briefing generated ({briefing_data['duration_estimate']} seconds)")
+        log.info("audio_briefing_generated", company=enhanced_smap.company_name,
+                 duration_estimate=briefing_data['duration_estimate'])
         
         return briefing_data
 